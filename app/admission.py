@@ -0,0 +1,233 @@
+"""
+Admission control in front of graph runs.
+
+Each traffic class ("interactive", "bulk") has its own budget: at most
+max_running graph runs at once, and a queue of admitted runs waiting for a
+slot that may not be expected to wait longer than max_wait seconds. The wait
+is estimated from the runs queued ahead, the number of slots and the recent
+latency of a run: the sum of each graph node's smoothed (EWMA) duration.
+
+admit() decides up front, before any work is done: it either returns a Grant
+or raises Overloaded with a Retry-After of roughly how long until the queue is
+short enough again. A rejected client can come back later instead of waiting
+behind work it would time out on. The runs that are admitted keep a stable
+latency, since the queue in front of them is bounded.
+
+Only runs that execute the graph are admitted. /execute coalesces first, and
+a ticket that follows an identical one in flight just waits for the leader,
+so it takes no slot and is never refused.
+
+``async with grant:`` waits for a slot and frees it afterwards. Slots are
+handed between threads, so inline requests (server loop) and background jobs
+(worker loop) share one budget.
+"""
+import asyncio
+import math
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, Tuple
+
+from app import settings
+from app.metrics import metrics
+
+# Nodes on a run's critical path whose durations make up its estimated latency.
+RUN_NODES = ("plan_node", "run_agents_node", "merge_results_node")
+
+_admissions = metrics.counter("it_agent_admissions_total", "Graph runs admitted or rejected (429)", ("priority", "outcome"))
+
+
+class Overloaded(Exception):
+    """Raised by admit() when the class's estimated queue wait is over budget."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Budget:
+    def __init__(self, max_running: int, max_wait: float):
+        self.max_running = max(1, max_running)
+        self.max_wait = max_wait
+        self.running = 0
+        # Admitted but not running yet (waiting for a slot, or queued as a background job).
+        self.pending = 0
+        self.waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.admitted = 0
+        self.rejected = 0
+
+
+class Grant:
+    """
+    An admitted run. ``async with`` it around the run; cancel() if it never starts.
+    """
+
+    def __init__(self, controller: "AdmissionController", priority: str):
+        self._controller = controller
+        self.priority = priority
+        self._state = "pending"
+
+    async def __aenter__(self) -> "Grant":
+        await self._controller._acquire(self)
+        self._state = "running"
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._state = "done"
+        self._controller._release(self.priority)
+
+    def cancel(self) -> None:
+        if self._state == "pending":
+            self._state = "done"
+            self._controller._drop_pending(self.priority)
+
+
+class _Unlimited(Grant):
+    """The grant handed out while admission control is off."""
+
+    def __init__(self):
+        self.priority = None
+
+    async def __aenter__(self) -> "Grant":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    def cancel(self) -> None:
+        pass
+
+
+_UNLIMITED = _Unlimited()
+
+
+class AdmissionController:
+    def __init__(self, budgets: Dict[str, Tuple[int, float]], default_run_seconds: float = 10.0, smoothing: float = 0.2):
+        self._budgets = {priority: _Budget(*budget) for priority, budget in budgets.items()}
+        self.default_run_seconds = default_run_seconds
+        self.smoothing = smoothing
+        self._node_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # --- latency model ---
+
+    def observe_node(self, node: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._node_seconds.get(node)
+            self._node_seconds[node] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+
+    def run_seconds(self) -> float:
+        """
+        Estimated duration of one graph run, from the recent node latencies.
+        """
+        observed = [self._node_seconds[node] for node in RUN_NODES if node in self._node_seconds]
+        return sum(observed) if observed else self.default_run_seconds
+
+    def _wait_seconds(self, budget: _Budget, queued: int) -> float:
+        # Runs queued ahead drain max_running at a time, one run duration per wave.
+        return math.ceil(queued / budget.max_running) * self.run_seconds()
+
+    # --- admission ---
+
+    def admit(self, priority: str) -> Grant:
+        """
+        Admits a run of the given class, or raises Overloaded.
+        """
+        if not settings.ADMISSION_ENABLED:
+            return _UNLIMITED
+        priority = priority if priority in self._budgets else "bulk"
+        budget = self._budgets[priority]
+        with self._lock:
+            ahead = budget.running + budget.pending - budget.max_running + 1
+            wait = self._wait_seconds(budget, ahead) if ahead > 0 else 0.0
+            if wait > budget.max_wait:
+                budget.rejected += 1
+                _admissions.inc(priority=priority, outcome="rejected")
+                retry_after = max(1, math.ceil(wait - budget.max_wait))
+                raise Overloaded(
+                    f"Too much {priority} work in flight: estimated wait {wait:.1f}s exceeds {budget.max_wait:g}s",
+                    retry_after,
+                )
+            budget.pending += 1
+            budget.admitted += 1
+        _admissions.inc(priority=priority, outcome="admitted")
+        return Grant(self, priority)
+
+    async def _acquire(self, grant: Grant) -> None:
+        budget = self._budgets[grant.priority]
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            budget.pending -= 1
+            if budget.running < budget.max_running:
+                budget.running += 1
+                return
+            future = loop.create_future()
+            budget.waiters.append((loop, future))
+        try:
+            # A releasing run hands its slot over by resolving the future.
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in budget.waiters:
+                    budget.waiters.remove((loop, future))
+                    future = None
+            if future is not None:
+                # The slot was handed over as this waiter was cancelled: pass it on.
+                self._release(grant.priority)
+            raise
+
+    def _release(self, priority: str) -> None:
+        budget = self._budgets[priority]
+        with self._lock:
+            while budget.waiters:
+                loop, future = budget.waiters.popleft()
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_hand_over, future)
+                    return
+            budget.running -= 1
+
+    def _drop_pending(self, priority: str) -> None:
+        with self._lock:
+            self._budgets[priority].pending -= 1
+
+    # --- reporting ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            classes = {}
+            for priority, budget in self._budgets.items():
+                ahead = budget.running + budget.pending - budget.max_running + 1
+                wait = self._wait_seconds(budget, ahead) if ahead > 0 else 0.0
+                classes[priority] = {
+                    "running": budget.running,
+                    "queued": budget.pending + len(budget.waiters),
+                    "max_running": budget.max_running,
+                    "max_wait_seconds": budget.max_wait,
+                    "estimated_wait_seconds": round(wait, 3),
+                    "accepting": wait <= budget.max_wait,
+                    "admitted": budget.admitted,
+                    "rejected": budget.rejected,
+                }
+            return {
+                "enabled": settings.ADMISSION_ENABLED,
+                "estimated_run_seconds": round(self.run_seconds(), 3),
+                "node_seconds": {node: round(seconds, 3) for node, seconds in self._node_seconds.items()},
+                "classes": classes,
+            }
+
+
+def _hand_over(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController(
+        {
+            "interactive": (settings.ADMISSION_INTERACTIVE_MAX_RUNNING, settings.ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS),
+            "bulk": (settings.ADMISSION_BULK_MAX_RUNNING, settings.ADMISSION_BULK_MAX_WAIT_SECONDS),
+        },
+        default_run_seconds=settings.ADMISSION_DEFAULT_RUN_SECONDS,
+        smoothing=settings.ADMISSION_LATENCY_SMOOTHING,
+    )
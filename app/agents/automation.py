@@ -1,19 +1,48 @@
-from openai import OpenAI
-from typing import Dict
-import os
-from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
+from typing import Dict, Optional
 import json
 
-load_dotenv()
+from app import settings
+from app.agents.script_lint import get_script_linter
+from app.llm import acomplete_tiered, complete_tiered, get_async_client, get_client
+from app.llm.prompts import PromptBuilder
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+INSTRUCTIONS = """
+You are an AI assistant specializing in generating automation scripts.
+
+Generate a script to automate the IT task in the request.  If the task is related to Windows, provide a Powershell script.  If the task is related to Linux, provide a Bash script. If the task is related to Azure, provide an Azure CLI script.
+
+Assume that the scripts will be executed in an environment where the appropriate command line tools (e.g., 'pwsh', 'bash', 'az') are available.  Do not include any preamble or comments unless they are essential to the script's operation.  The script's syntax is checked after you return it.
+
+Provide the output in JSON format with the following keys:
+- language: The scripting language ("powershell", "bash", or "azurecli").
+- code: The generated script.
+
+Example:
+
+Request: "Create a user in Linux with username 'testuser' and password 'password123'."
+
+Output:
+{"language": "bash", "code": "useradd -m testuser -p password123"}
+
+Request: "Create Azure CLI commands to lock RDP (3389) on my three production VMs to 10.0.0.0/24"
+
+Output:
+{"language": "azurecli", "code": "az network nsg rule create --resource-group myResourceGroup --nsg-name myNetworkSecurityGroup --name RDP --priority 1001 --destination-port-ranges 3389 --source-address-prefixes 10.0.0.0/24 --access Allow --protocol Tcp --direction Inbound"}
+"""
 
 class AutomationAgent:
     """
-    Generates and syntax-checks PowerShell/Bash/Azure CLI scripts using LLM.
+    Generates PowerShell/Bash/Azure CLI scripts using LLM and syntax-checks them locally.
     """
-    def __init__(self, llm_client: OpenAI):
+    # Generates scripts but never runs them, so it may run before a plan is approved.
+    speculative_safe = True
+    # Answers without these go to the next model tier (see app.llm.tiers).
+    output_shape = {"language": str, "code": str}
+
+    def __init__(self, llm_client: Optional[OpenAI] = None, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
 
     def run(self, request: str) -> Dict:
         """
@@ -25,49 +54,41 @@ class AutomationAgent:
         Returns:
             Dict: A dictionary containing the script, language, and syntax check result.
         """
-        prompt = f"""
-        You are an AI assistant specializing in generating automation scripts.
-        
-        Generate a script to automate the following IT task.  If the task is related to Windows, provide a Powershell script.  If the task is related to Linux, provide a Bash script. If the task is related to Azure, provide an Azure CLI script.
-        
-        Also, check the syntax of the generated script.  Assume that the scripts will be executed in an environment where the appropriate command line tools (e.g., 'pwsh', 'bash', 'az') are available.  Do not include any preamble or comments unless they are essential to the script's operation.
-        
-        Provide the output in JSON format with the following keys:
-        - language: The scripting language ("powershell", "bash", or "azurecli").
-        - code: The generated script.
-        - lint_passed: A boolean indicating whether the syntax check passed.  A simple LLM cannot actually perform syntax checking, so always set this to true.
-        
-        Example:
-        
-        Request: "Create a user in Linux with username 'testuser' and password 'password123'."
-        
-        Output:
-        {{
-            "language": "bash",
-            "code": "useradd -m testuser -p password123",
-            "lint_passed": true
-        }}
-
-        Request: "Create Azure CLI commands to lock RDP (3389) on my three production VMs to 10.0.0.0/24"
-        
-        Output:
-        {{
-            "language": "azurecli",
-            "code": "az network nsg rule create --resource-group myResourceGroup --nsg-name myNetworkSecurityGroup --name RDP --priority 1001 --destination-port-ranges 3389 --source-address-prefixes 10.0.0.0/24 --access Allow --protocol Tcp --direction Inbound",
-            "lint_passed": true
-        }}
-        
-        
-        Request: "{request}"
-        
-        Output:
+        content = complete_tiered(
+            self.llm_client or get_client(),
+            agent="automation",
+            shape=self.output_shape,
+            messages=self._build_messages(request),
+            response_format={"type": "json_object"}
+        )
+        script = json.loads(content)
+        if settings.SCRIPT_LINT_ENABLED:
+            return self._with_lint(script, get_script_linter().lint(script.get("language"), script.get("code") or ""))
+        return script
+
+    async def arun(self, request: str) -> Dict:
+        """
+        Async variant of run() that does not block the event loop.
         """
-        response = self.llm_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
+        client = self.async_llm_client or get_async_client()
+        content = await acomplete_tiered(
+            client,
+            agent="automation",
+            shape=self.output_shape,
+            messages=self._build_messages(request),
             response_format={"type": "json_object"}
         )
-        return json.loads(response.choices[0].message.content)
+        script = json.loads(content)
+        if settings.SCRIPT_LINT_ENABLED:
+            return self._with_lint(script, await get_script_linter().alint(script.get("language"), script.get("code") or ""))
+        return script
+
+    @staticmethod
+    def _with_lint(script: Dict, lint: Dict) -> Dict:
+        """
+        Attaches the local syntax check; lint_passed is None when no checker was available.
+        """
+        return {**script, "lint_passed": lint["passed"], "lint": lint}
 
+    def _build_messages(self, request: str):
+        return PromptBuilder("automation", INSTRUCTIONS).add_text("Request", request).build()
@@ -1,48 +1,117 @@
-import os
 import json
 import uuid
-import time
-from dotenv import load_dotenv
-from typing import Dict, Any
-from openai import OpenAI
+from typing import Dict, Any, Optional
+from openai import OpenAI, AsyncOpenAI
 
-load_dotenv()
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from app import settings
+from app.llm import acomplete_tiered, complete_tiered, get_async_client, get_client
+from app.llm.prompts import PromptBuilder
+from app.agents.fast_planner import FastPlanner, get_fast_planner
+
+MERGE_MODES = ("local", "narrative")
+
+PLAN_INSTRUCTIONS = """
+You are an AI assistant that analyzes IT requests and creates an execution plan.
+Analyze the IT request and determine the necessary steps and agents required to fulfill the request.
+
+Agents available:
+    DiagnosticAgent: Performs root-cause analysis and provides ranked fixes
+    AutomationAgent: Generates and syntax-checks PowerShell/Bash/Azure CLI scripts
+    WriterAgent: Transforms results into structured content (email, SOP, summary)
+
+Output the plan in JSON with the following keys:
+    "agents": A list of agent names (e.g., ["DiagnosticAgent", "AutomationAgent", "WriterAgent"]).
+    "steps": A list of step descriptions (e.g., ["Generate NSG rules", "Pause for approval", "Generate rollback script"]).
+    "summary": A short summary sentence.
+If approval is required, include a step such as "Pause and await approval" in the steps.
+"""
+
+MERGE_INSTRUCTIONS = """
+You are an AI assistant that merges the outputs from multiple agents into a single, coherent response.
+
+Combine the agent outputs into the following structure, in JSON format:
+{"status": "completed", "diagnosis": {...}, "script": {...}, "email_draft": "..."}
+"""
+
+# Final result key -> (agent output key, field to extract or None for the whole output)
+MERGE_SCHEMA = {
+    "diagnosis": ("diagnostic", None),
+    "script": ("automation", None),
+    "email_draft": ("writer", "email_draft"),
+}
+
+def merge_agent_outputs(agent_outputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the final result from the agent outputs using MERGE_SCHEMA, without an LLM call.
+    """
+    merged: Dict[str, Any] = {"status": "completed"}
+    for key, (agent_key, field) in MERGE_SCHEMA.items():
+        output = agent_outputs.get(agent_key)
+        if field is not None and isinstance(output, dict):
+            output = output.get(field)
+        merged[key] = output
+    return merged
 
 class CoordinatorAgent:
-    def __init__(self, client: OpenAI):
+    # LLM plans without these go to the next model tier (see app.llm.tiers).
+    plan_shape = {"agents": list}
+
+    def __init__(self, client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None, fast_planner: Optional[FastPlanner] = None):
         self.client = client
+        self.async_client = async_client
+        self.fast_planner = fast_planner
 
     def plan(self, request: str, require_approval: bool = False) -> Dict[str, Any]:
         """
-        Generates an execution plan based on the input request using LLM.
+        Generates an execution plan for the request: locally when the fast
+        planner is confident (see app.agents.fast_planner), else using the LLM.
         """
-        prompt = f"""
-        You are an AI assistant that analyzes IT requests and creates an execution plan.
-        Analyze the following IT request and determine the necessary steps and agents required to fulfill the request.
-
-        Agents available:
-            DiagnosticAgent: Performs root-cause analysis and provides ranked fixes 
-            AutomationAgent: Generates and syntax-checks PowerShell/Bash/Azure CLI scripts 
-            WriterAgent: Transforms results into structured content (email, SOP, summary) 
-
-        Request: "{request}"
-        Require approval before execution: {require_approval}
-
-        Output the plan in JSON with the following keys:
-            "agents": A list of agent names (e.g., ["DiagnosticAgent", "AutomationAgent", "WriterAgent"]).
-            "steps": A list of step descriptions (e.g., ["Generate NSG rules", "Pause for approval", "Generate rollback script"]).
-            "summary": A short summary sentence.
-        If approval is required, include a step such as "Pause and await approval" in the steps.
+        planner = self.fast_planner or get_fast_planner()
+        fast_plan = planner.plan(request, require_approval)
+        if fast_plan is not None:
+            return self._complete_plan(fast_plan, require_approval)
+        content = complete_tiered(
+            self.client or get_client(),
+            agent="coordinator",
+            shape=self.plan_shape,
+            messages=self._plan_messages(request, require_approval),
+            response_format={"type": "json_object"}
+        )
+        return self._finalize_llm_plan(planner, request, content, require_approval)
 
-        Output in JSON format:
+    async def aplan(self, request: str, require_approval: bool = False) -> Dict[str, Any]:
         """
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        Async variant of plan() that does not block the event loop.
+        """
+        planner = self.fast_planner or get_fast_planner()
+        fast_plan = planner.plan(request, require_approval)
+        if fast_plan is not None:
+            return self._complete_plan(fast_plan, require_approval)
+        client = self.async_client or get_async_client()
+        content = await acomplete_tiered(
+            client,
+            agent="coordinator",
+            shape=self.plan_shape,
+            messages=self._plan_messages(request, require_approval),
             response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content
+        return self._finalize_llm_plan(planner, request, content, require_approval)
+
+    def _finalize_llm_plan(self, planner: FastPlanner, request: str, content: str, require_approval: bool) -> Dict[str, Any]:
+        plan = self._finalize_plan(content, require_approval)
+        planner.remember(request, plan)
+        plan["planner"] = {"source": "llm", "confidence": None}
+        return plan
+
+    def _plan_messages(self, request: str, require_approval: bool):
+        return (
+            PromptBuilder("coordinator", PLAN_INSTRUCTIONS)
+            .add_text("Request", request)
+            .add_line(f"Require approval before execution: {require_approval}")
+            .build()
+        )
+
+    def _finalize_plan(self, content: str, require_approval: bool) -> Dict[str, Any]:
         parsed = json.loads(content)
 
         # Defensive: Ensure structure (these can be safely removed after validation)
@@ -50,47 +119,55 @@ class CoordinatorAgent:
             parsed["steps"] = ["[LLM did not provide steps]"]
         if "summary" not in parsed:
             parsed["summary"] = "[LLM did not provide summary]"
+        return self._complete_plan(parsed, require_approval)
 
+    def _complete_plan(self, parsed: Dict[str, Any], require_approval: bool) -> Dict[str, Any]:
         parsed["require_approval"] = require_approval
         parsed["status"] = "waiting_approval" if require_approval else "active"
         parsed["task_id"] = str(uuid.uuid4())
         return parsed
 
-    def merge_results(self, agent_outputs: Dict[str, Any]) -> Dict[str, Any]:
-    
-        prompt = f"""
-            You are an AI assistant that merges the outputs from multiple agents into a single, coherent response.
-
-            Combine these results into the following structure:
-            {{
-                "status": "completed",
-                "diagnosis": {{...}},
-                "script": {{...}},
-                "email_draft": "...",
-                "duration_seconds": 42
-            }}
-
-        Agent Outputs:
-        {json.dumps(agent_outputs, indent=2)}
+    def merge_results(self, agent_outputs: Dict[str, Any], mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Merges the agent outputs into {diagnosis, script, email_draft}.
 
-        Output in JSON format:
+        Args:
+            agent_outputs: Outputs keyed by agent ("diagnostic", "automation", "writer").
+            mode: "local" builds the result from MERGE_SCHEMA with no LLM call;
+                "narrative" asks the LLM to write the merged response. Defaults
+                to settings.MERGE_MODE.
         """
-        start = time.perf_counter()
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        if (mode or settings.MERGE_MODE) != "narrative":
+            return merge_agent_outputs(agent_outputs)
+        content = complete_tiered(
+            self.client or get_client(),
+            agent="coordinator",
+            messages=self._merge_messages(agent_outputs),
+            response_format={"type": "json_object"}
+        )
+        return self._finalize_merge(content, agent_outputs)
+
+    async def amerge_results(self, agent_outputs: Dict[str, Any], mode: Optional[str] = None) -> Dict[str, Any]:
+        if (mode or settings.MERGE_MODE) != "narrative":
+            return merge_agent_outputs(agent_outputs)
+        client = self.async_client or get_async_client()
+        content = await acomplete_tiered(
+            client,
+            agent="coordinator",
+            messages=self._merge_messages(agent_outputs),
             response_format={"type": "json_object"}
         )
-        content = response.choices[0].message.content
+        return self._finalize_merge(content, agent_outputs)
+
+    def _merge_messages(self, agent_outputs: Dict[str, Any]):
+        return PromptBuilder("coordinator", MERGE_INSTRUCTIONS).add_json("Agent outputs", agent_outputs).build()
+
+    def _finalize_merge(self, content: str, agent_outputs: Dict[str, Any]) -> Dict[str, Any]:
         merged = json.loads(content)
-        merged["duration_seconds"] = int(time.perf_counter() - start)
 
     # Defensive: Fill missing keys from agent_outputs if LLM skipped any
-        merged.setdefault("diagnosis", agent_outputs.get("diagnostic"))
-        merged.setdefault("script", agent_outputs.get("automation"))
-        merged.setdefault("email_draft", agent_outputs.get("writer"))
-        merged.setdefault("status", "completed")
+        for key, value in merge_agent_outputs(agent_outputs).items():
+            merged.setdefault(key, value)
     # (optionally log merged for debugging)
         print("Merged output:", merged)
         return merged
-
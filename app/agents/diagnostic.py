@@ -1,24 +1,54 @@
-from openai import OpenAI
-from typing import Dict
-import os
+from openai import OpenAI, AsyncOpenAI
+from typing import Any, Dict, List, Optional
+import asyncio
 import json
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.llm import acomplete_tiered, complete_tiered, get_async_client, get_client
+from app.llm.prompts import PromptBuilder
+
+INSTRUCTIONS = """
+You are an AI assistant specializing in IT diagnostics.
+
+Analyze the IT issue in the request and provide a root cause analysis and ranked solutions.
+
+Provide the output in JSON format with the following keys:
+- root_cause: A string describing the most likely root cause.
+- evidence: A list of strings providing evidence for the root cause.
+- solutions: A list of dictionaries, where each dictionary has the keys "title" and "confidence".  "Confidence" should be one of "high", "medium", or "low".
+
+Example:
+
+Request: "Server CPU utilization is consistently above 90%."
+
+Output:
+{"root_cause": "High CPU utilization is likely due to a runaway process or resource contention.", "evidence": ["perfmon shows high cpu usage by process X", "high iowait"], "solutions": [{"title": "Identify and terminate the runaway process.", "confidence": "high"}, {"title": "Check for resource contention (e.g., memory, I/O).", "confidence": "medium"}, {"title": "Update system drivers.", "confidence": "low"}]}
+"""
+
+def _recall(request: str):
+    # Imported here so numpy loads with the index (at startup), not with the agents.
+    from app.retrieval import recall
+
+    return recall(request)
 
-# Initialize OpenAI client (replace with your API key)
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 class DiagnosticAgent:
     """
     Performs root-cause analysis and provides ranked fixes using LLM.
     """
-    def __init__(self, llm_client: OpenAI):
+    # Only reads the request, so it may run before a plan is approved.
+    speculative_safe = True
+    # Answers without these go to the next model tier (see app.llm.tiers).
+    output_shape = {"root_cause": str, "evidence": list, "solutions": list}
+
+    def __init__(self, llm_client: Optional[OpenAI] = None, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
 
     def run(self, request: str) -> Dict:
         """
-        Performs root-cause analysis and suggests fixes using LLM.
+        Performs root-cause analysis and suggests fixes using LLM. A ticket
+        nearly identical to a resolved one gets that diagnosis back without an
+        LLM call; similar resolved ones are shown to the LLM (see app.retrieval).
 
         Args:
             request (str): The IT request describing the issue.
@@ -26,47 +56,38 @@ class DiagnosticAgent:
         Returns:
             Dict: A dictionary containing the root cause and suggested solutions.
         """
-        prompt = f"""
-        You are an AI assistant specializing in IT diagnostics.
-        
-        Analyze the following IT issue and provide a root cause analysis and ranked solutions.
-        
-        Provide the output in JSON format with the following keys:
-        - root_cause: A string describing the most likely root cause.
-        - evidence: A list of strings providing evidence for the root cause.
-        - solutions: A list of dictionaries, where each dictionary has the keys "title" and "confidence".  "Confidence" should be one of "high", "medium", or "low".
-        
-        Example:
-        
-        Request: "Server CPU utilization is consistently above 90%."
-        
-        Output:
-        {{
-            "root_cause": "High CPU utilization is likely due to a runaway process or resource contention.",
-            "evidence": ["perfmon shows high cpu usage by process X", "high iowait"],
-            "solutions": [
-                {{
-                    "title": "Identify and terminate the runaway process.",
-                    "confidence": "high"
-                }},
-                {{
-                    "title": "Check for resource contention (e.g., memory, I/O).",
-                    "confidence": "medium"
-                }},
-                {{
-                    "title": "Update system drivers.",
-                    "confidence": "low"
-                }}
-            ]
-        }}
-        
-        Request: "{request}"
-        
-        Output:
+        reused, past = _recall(request)
+        if reused is not None:
+            return reused
+        content = complete_tiered(
+            self.llm_client or get_client(),
+            agent="diagnostic",
+            shape=self.output_shape,
+            messages=self._build_messages(request, past),
+            response_format={"type": "json_object"}
+        )
+        return json.loads(content)
+
+    async def arun(self, request: str) -> Dict:
+        """
+        Async variant of run() that does not block the event loop.
         """
-        response = self.llm_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        # A lookup scans the whole index, so keep it off the event loop.
+        reused, past = await asyncio.to_thread(_recall, request)
+        if reused is not None:
+            return reused
+        client = self.async_llm_client or get_async_client()
+        content = await acomplete_tiered(
+            client,
+            agent="diagnostic",
+            shape=self.output_shape,
+            messages=self._build_messages(request, past),
             response_format={"type": "json_object"}
         )
-        return json.loads(response.choices[0].message.content)
\ No newline at end of file
+        return json.loads(content)
+
+    def _build_messages(self, request: str, past: Optional[List[Dict[str, Any]]] = None):
+        builder = PromptBuilder("diagnostic", INSTRUCTIONS).add_text("Request", request)
+        if past:
+            builder.add_json("Resolved similar tickets (use only what applies)", past)
+        return builder.build()
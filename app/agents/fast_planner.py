@@ -0,0 +1,167 @@
+"""
+Local planning tier in front of the coordinator LLM.
+
+Most tickets ask for some mix of a diagnosis, a script and a write-up, and the
+wording says which. FastPlanner tries, in order:
+
+1. the plan cache: a plan the LLM already produced for the same request once
+   hostnames, numbers and punctuation are normalized away (confidence 1.0);
+2. the rule table: keyword patterns per agent, each with a weight; an agent is
+   chosen when one of its patterns matches, and the plan's confidence is the
+   weakest chosen agent's weight. Broad words like "error" or "restart" weigh
+   too little to carry a plan on their own.
+
+Anything below settings.PLANNER_MIN_CONFIDENCE goes to the LLM planner, whose
+plan is then cached for the next ticket of the same shape.
+"""
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import settings
+from app.metrics import metrics
+
+# Agent -> (pattern, weight). Weights are how sure a match makes us that the
+# agent belongs in the plan. Broad single words ("error", "restart",
+# "report") turn up in tickets that want something else entirely, so alone
+# they stay below the default PLANNER_MIN_CONFIDENCE and the LLM decides.
+WEAK = 0.6
+PLAN_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "DiagnosticAgent": [
+        (r"\b(diagnos\w*|root[- ]cause|troubleshoot\w*|investigat\w*|why)\b", 0.9),
+        (r"\b(slow|high cpu|cpu|memory leak|disk (is )?full|outage|crash\w*|unreachable|timeout\w*)\b", 0.8),
+        (r"\b(fail\w*|error\w*|down)\b", WEAK),
+    ],
+    "AutomationAgent": [
+        (r"\b(script|powershell|bash|azure cli|az cli|shell command\w*|commands?|cron|automate\w*)\b", 0.95),
+        (r"\b(nsg|firewall rule\w*|lock (down )?\w+|open port|close port)\b", 0.8),
+        (r"\b(restart|install|configure)\b", WEAK),
+    ],
+    "WriterAgent": [
+        (r"\b(e-?mail|draft|summar\w*|sop|notify|notification|write[- ]up|announce\w*)\b", 0.9),
+        (r"\breport\b", WEAK),
+    ],
+}
+
+AGENT_ORDER = ("DiagnosticAgent", "AutomationAgent", "WriterAgent")
+
+STEP_FOR_AGENT = {
+    "DiagnosticAgent": "Diagnose the issue and rank likely fixes",
+    "AutomationAgent": "Generate and syntax-check the script",
+    "WriterAgent": "Draft the write-up",
+}
+
+_COMPILED = {
+    agent: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for agent, rules in PLAN_RULES.items()
+}
+
+
+def normalize_request(request: str) -> str:
+    """
+    Lower-cases the request and replaces the parts that vary between otherwise
+    identical tickets (IPs, host names with digits, numbers, punctuation).
+    """
+    text = request.lower()
+    text = re.sub(r"\b\d{1,3}(\.\d{1,3}){3}(/\d+)?\b", "<ip>", text)
+    text = re.sub(r"\b[a-z][\w-]*\d[\w-]*\b", "<host>", text)
+    text = re.sub(r"\d+(\.\d+)?%?", "<n>", text)
+    text = re.sub(r"[^\w<>]+", " ", text)
+    return " ".join(text.split())
+
+
+class FastPlanner:
+    """
+    Builds plans without the LLM when it can, and remembers the LLM's plans.
+    """
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._outcomes = metrics.counter(
+            "it_agent_planner_total", "Plans by source (rules, cache = fast path; llm = fallback)", ("source",)
+        )
+
+    def plan(self, request: str, require_approval: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns a plan (with its "planner" source and confidence) if one can be
+        built confidently enough, otherwise None.
+        """
+        if settings.PLANNER_MODE != "auto":
+            return None
+        for candidate in (self._from_cache(request), self._from_rules(request)):
+            if candidate and candidate["planner"]["confidence"] >= settings.PLANNER_MIN_CONFIDENCE:
+                self._outcomes.inc(source=candidate["planner"]["source"])
+                return _with_approval_step(candidate, require_approval)
+        return None
+
+    def remember(self, request: str, plan: Dict[str, Any]) -> None:
+        """
+        Records the LLM's plan for the request's normalized form.
+        """
+        self._outcomes.inc(source="llm")
+        agents = [agent for agent in plan.get("agents", []) if agent in AGENT_ORDER]
+        if not agents:
+            return
+        entry = {
+            "agents": agents,
+            "steps": [step for step in plan.get("steps", []) if "approval" not in str(step).lower()],
+            "summary": plan.get("summary", ""),
+        }
+        key = normalize_request(request)
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {source: int(self._outcomes.value(source=source)) for source in ("rules", "cache", "llm")}
+        total = sum(counts.values())
+        return {
+            **counts,
+            "hit_rate": round((counts["rules"] + counts["cache"]) / total, 4) if total else 0.0,
+            "cached_plans": len(self._cache),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _from_cache(self, request: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._cache.get(normalize_request(request))
+        if cached is None:
+            return None
+        return {**cached, "planner": {"source": "cache", "confidence": 1.0}}
+
+    def _from_rules(self, request: str) -> Optional[Dict[str, Any]]:
+        scores = {}
+        for agent in AGENT_ORDER:
+            weights = [weight for pattern, weight in _COMPILED[agent] if pattern.search(request)]
+            if weights:
+                scores[agent] = max(weights)
+        if not scores:
+            return None
+        agents = list(scores)
+        return {
+            "agents": agents,
+            "steps": [STEP_FOR_AGENT[agent] for agent in agents],
+            "summary": f"Run {', '.join(agents)} for: {request.strip()[:120]}",
+            "planner": {"source": "rules", "confidence": min(scores.values())},
+        }
+
+
+def _with_approval_step(plan: Dict[str, Any], require_approval: bool) -> Dict[str, Any]:
+    steps = list(plan["steps"])
+    if require_approval:
+        steps.insert(0, "Pause and await approval")
+    return {**plan, "steps": steps}
+
+
+@lru_cache(maxsize=1)
+def get_fast_planner() -> FastPlanner:
+    return FastPlanner(settings.PLAN_CACHE_MAX_ENTRIES)
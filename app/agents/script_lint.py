@@ -0,0 +1,242 @@
+"""
+Local syntax checks for the scripts AutomationAgent generates.
+
+Checks per language:
+
+- bash: ``bash -n``, plus ``shellcheck --severity=error`` when it is installed;
+- powershell: the PowerShell parser via ``pwsh`` (parse only, nothing runs)
+  when it is installed;
+- azurecli: ``bash -n`` on the script and a static shape check of every ``az``
+  command (group/command words, flag syntax, balanced quotes).
+
+Scripts are never executed. Each external check gets the script in a fresh
+temp directory (also its working directory and HOME), a minimal environment,
+no stdin and a timeout. At most SCRIPT_LINT_WORKERS checks run at once, and
+results are cached by script hash so a script the LLM repeats is not linted
+again.
+
+``passed`` is True or False when at least one check ran, and None when none
+could (e.g. a PowerShell script on a host without pwsh).
+"""
+import asyncio
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app import settings
+from app.metrics import metrics
+
+LANGUAGE_ALIASES = {
+    "bash": "bash", "sh": "bash", "shell": "bash",
+    "powershell": "powershell", "pwsh": "powershell", "ps1": "powershell",
+    "azurecli": "azurecli", "azure cli": "azurecli", "az": "azurecli", "azure-cli": "azurecli",
+}
+
+# Parses $env:LINT_FILE and prints the parse errors; the script is never invoked.
+_PWSH_PARSE = (
+    "$errors = $null; "
+    "[System.Management.Automation.Language.Parser]::ParseFile($env:LINT_FILE, [ref]$null, [ref]$errors) | Out-Null; "
+    "if ($errors) { $errors | ForEach-Object { $_.ToString() }; exit 1 }"
+)
+
+# `az` commands that take no subcommand.
+AZ_STANDALONE = {"login", "logout", "version", "upgrade", "find", "interactive", "configure", "rest", "feedback", "init"}
+_AZ_WORD = re.compile(r"^[a-z][a-z0-9-]*$")
+_AZ_FLAG = re.compile(r"^(--[a-z][a-z0-9-]*(=.*)?|-[a-zA-Z])$")
+_SHELL_OPERATORS = {"|", "||", "&", "&&", ";", ";;", "(", ")", "<", ">", ">>"}
+
+
+def normalize_language(language: Optional[str]) -> str:
+    return LANGUAGE_ALIASES.get(str(language or "").strip().lower(), "")
+
+
+def check_azure_cli(code: str) -> List[str]:
+    """
+    Returns the problems found in the script's ``az`` commands (empty if none).
+    """
+    problems: List[str] = []
+    commands = 0
+    for number, line in _logical_lines(code):
+        lexer = shlex.shlex(line, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        lexer.commenters = "#"
+        try:
+            tokens = list(lexer)
+        except ValueError as exc:
+            problems.append(f"line {number}: {exc}")
+            continue
+        for segment in _segments(tokens):
+            if segment[0] != "az":
+                continue
+            commands += 1
+            problems.extend(f"line {number}: {problem}" for problem in _check_az_command(segment[1:]))
+    if not commands:
+        problems.append("no az commands found")
+    return problems
+
+
+def _logical_lines(code: str):
+    number, buffer = 0, ""
+    for index, line in enumerate(code.splitlines(), start=1):
+        if not buffer:
+            number = index
+        if line.rstrip().endswith("\\"):
+            buffer += line.rstrip()[:-1] + " "
+            continue
+        yield number, buffer + line
+        buffer = ""
+    if buffer:
+        yield number, buffer
+
+
+def _segments(tokens: List[str]):
+    segment: List[str] = []
+    for token in tokens + [";"]:
+        if token in _SHELL_OPERATORS:
+            if segment:
+                yield segment
+            segment = []
+        else:
+            segment.append(token)
+
+
+def _check_az_command(args: List[str]) -> List[str]:
+    words = []
+    for arg in args:
+        if arg.startswith("-"):
+            break
+        words.append(arg)
+    if any("$" in word for word in words):
+        # Built from variables; nothing to check statically.
+        return []
+    problems = [f"invalid command word {word!r}" for word in words if not _AZ_WORD.match(word)]
+    if not words:
+        problems.append("az without a command")
+    elif len(words) == 1 and words[0] not in AZ_STANDALONE:
+        problems.append(f"'az {words[0]}' needs a subcommand")
+    expect_flag = True
+    for arg in args[len(words):]:
+        if arg.startswith("-") and expect_flag or arg.startswith("--"):
+            if not _AZ_FLAG.match(arg):
+                problems.append(f"malformed flag {arg!r}")
+            expect_flag = False
+        else:
+            # A value; the next token may be a flag again.
+            expect_flag = True
+    return problems
+
+
+class ScriptLinter:
+    """
+    Runs the checks on a bounded pool and caches results by script hash.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 10.0, cache_size: int = 1024):
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="script-lint")
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._outcomes = metrics.counter(
+            "it_agent_script_lint_total", "Script lint results by language and outcome", ("language", "outcome")
+        )
+
+    def lint(self, language: Optional[str], code: str) -> Dict[str, Any]:
+        key = self._key(language, code)
+        cached = self._cached(key, language)
+        if cached is not None:
+            return cached
+        return self._store(key, self._pool.submit(self._lint, language, code).result())
+
+    async def alint(self, language: Optional[str], code: str) -> Dict[str, Any]:
+        key = self._key(language, code)
+        cached = self._cached(key, language)
+        if cached is not None:
+            return cached
+        return self._store(key, await asyncio.wrap_future(self._pool.submit(self._lint, language, code)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _key(language: Optional[str], code: str) -> str:
+        return hashlib.sha256(f"{normalize_language(language)}\0{code}".encode()).hexdigest()
+
+    def _cached(self, key: str, language: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+        if result is None:
+            return None
+        self._outcomes.inc(language=normalize_language(language) or "unknown", outcome="cached")
+        return {**result, "cached": True}
+
+    def _store(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {**result, "cached": False}
+
+    def _lint(self, language: Optional[str], code: str) -> Dict[str, Any]:
+        normalized = normalize_language(language)
+        checks: List[Dict[str, Any]] = []
+        with tempfile.TemporaryDirectory(prefix="script-lint-") as workdir:
+            if normalized in ("bash", "azurecli"):
+                path = self._write(workdir, "script.sh", code)
+                checks.append(self._run("bash -n", ["bash", "-n", path], workdir))
+                if normalized == "bash" and shutil.which("shellcheck"):
+                    checks.append(self._run("shellcheck", ["shellcheck", "--severity=error", "--shell=bash", path], workdir))
+            if normalized == "azurecli":
+                problems = check_azure_cli(code)
+                checks.append({"tool": "az-static", "passed": not problems, "output": "\n".join(problems)})
+            if normalized == "powershell" and shutil.which("pwsh"):
+                path = self._write(workdir, "script.ps1", code)
+                argv = ["pwsh", "-NoProfile", "-NonInteractive", "-Command", _PWSH_PARSE]
+                checks.append(self._run("pwsh-parser", argv, workdir, {"LINT_FILE": path}))
+        ran = [check for check in checks if check["passed"] is not None]
+        passed = all(check["passed"] for check in ran) if ran else None
+        outcome = {True: "passed", False: "failed", None: "unchecked"}[passed]
+        self._outcomes.inc(language=normalized or "unknown", outcome=outcome)
+        return {"language": normalized or language, "passed": passed, "checks": checks}
+
+    @staticmethod
+    def _write(workdir: str, name: str, code: str) -> str:
+        path = os.path.join(workdir, name)
+        with open(path, "w") as f:
+            f.write(code)
+        return path
+
+    def _run(self, tool: str, argv: List[str], workdir: str, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        try:
+            proc = subprocess.run(
+                argv,
+                cwd=workdir,
+                env={"PATH": os.environ.get("PATH", ""), "HOME": workdir, **(env or {})},
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return {"tool": tool, "passed": False, "output": f"timed out after {self.timeout:g}s"}
+        except OSError as exc:
+            return {"tool": tool, "passed": None, "output": str(exc)}
+        output = (proc.stdout + proc.stderr).replace(workdir + os.sep, "").strip()
+        return {"tool": tool, "passed": proc.returncode == 0, "output": output}
+
+
+@lru_cache(maxsize=1)
+def get_script_linter() -> ScriptLinter:
+    return ScriptLinter(settings.SCRIPT_LINT_WORKERS, settings.SCRIPT_LINT_TIMEOUT_SECONDS, settings.SCRIPT_LINT_CACHE_MAX_ENTRIES)
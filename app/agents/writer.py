@@ -1,32 +1,60 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+from openai import OpenAI, AsyncOpenAI
+from typing import Optional
 import json
 
-load_dotenv()
+from app.llm import acomplete_tiered, complete_tiered, get_async_client, get_client
+from app.llm.context import current_options
+from app.llm.prompts import PromptBuilder
+from app.llm.streaming import FieldStreamer
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+INSTRUCTIONS = """
+You are an AI assistant specializing in generating structured IT documentation, such as email drafts.
+Generate an email draft based on the information in the request. The email should be concise and informative, suitable for a technical audience. Do not include a salutation or signature.
+Output in JSON format:
+{"email_draft": "<draft text here>"}
+"""
 
 class WriterAgent:
-    def __init__(self, llm_client: OpenAI):
+    # Only drafts text, so it may run before a plan is approved.
+    speculative_safe = True
+    # Answers without these go to the next model tier (see app.llm.tiers).
+    output_shape = {"email_draft": str}
+
+    def __init__(self, llm_client: Optional[OpenAI] = None, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
 
     def run(self, request: str) -> dict:
-        prompt = f"""
-        You are an AI assistant specializing in generating structured IT documentation, such as email drafts.
-        Generate an email draft based on the following information. The email should be concise and informative, suitable for a technical audience. Do not include a salutation or signature.
-        Output in JSON format:
-        {{
-            "email_draft": "<draft text here>"
-        }}
+        content = complete_tiered(
+            self.llm_client or get_client(),
+            agent="writer",
+            shape=self.output_shape,
+            messages=self._build_messages(request),
+            response_format={"type": "json_object"},
+            on_delta=self._token_listener(),
+        )
+        return json.loads(content)
 
-        Request: "{request}"
+    async def arun(self, request: str) -> dict:
+        client = self.async_llm_client or get_async_client()
+        content = await acomplete_tiered(
+            client,
+            agent="writer",
+            shape=self.output_shape,
+            messages=self._build_messages(request),
+            response_format={"type": "json_object"},
+            on_delta=self._token_listener(),
+        )
+        return json.loads(content)
 
-        Output (in JSON):
+    def _token_listener(self):
         """
-        response = self.llm_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
\ No newline at end of file
+        Streams the email_draft text to the ticket's token sink, when the ticket asked for tokens.
+        """
+        sink = current_options().get("token_sink")
+        if sink is None:
+            return None
+        return FieldStreamer("email_draft", lambda text: sink("writer", text)).feed
+
+    def _build_messages(self, request: str):
+        return PromptBuilder("writer", INSTRUCTIONS).add_text("Request", request).build()
@@ -1,91 +1,242 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import contextlib
+import json
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from app.models import (
     ExecuteRequest,
     TaskResponse,
     PlanApprovalResponse,
     TaskStatusResponse,
+    ProfilingUpdate,
 )
-from app.workflows.coordinator_graph import build_coordinator_graph, approval_pause_node
+from app.workflows.coordinator_graph import get_coordinator_graph, approval_pause_node
+from app.runner import TASKS, PLANS, Flight, abandon_flight, join_flight, leads, run_flight, run_graph, set_status, ticket_context
+from app.coalescing import coalesce_key, single_flight
+from app.batch import Batch, ndjson_items, ndjson_line, parse_ticket
+from app.storage import get_task_store
+from app.jobs import JobQueueFull, get_job_queue
+from app.admission import Grant, Overloaded, get_admission_controller
+from app.profiling import collapsed, profiler, speedscope
+from app.events import TERMINAL_STATUSES, event_bus
+from app.workflows.diagram import DIAGRAM_FORMATS, render_diagram
+from app.llm import request_options
+from app.llm.cache import get_response_cache
+from app.llm.tiers import tier_stats
+from app.metrics import metrics
+from app.speculation import SPECULATING, plan_is_claimed, speculator
+from app import settings
+from app.agents.fast_planner import get_fast_planner
 from uuid import uuid4
-from typing import Dict, Any
-
-from IPython.display import Image, display
-from langchain_core.runnables.graph import CurveStyle, MermaidDrawMethod, NodeStyles
+from typing import Dict, Any, Optional
 
 
 router = APIRouter()
-TASKS: Dict[str, Dict[str, Any]] = {}
-PLANS: Dict[str, Dict[str, Any]] = {}
 
+SSE_HEARTBEAT_SECONDS = 15
+# With several workers the task may run in another process whose events never
+# reach this one; the stream then polls the shared store this often.
+SSE_STORE_POLL_SECONDS = 1.0
+# How often approve/reject re-check a plan that speculation is writing into.
+PLAN_CLAIM_POLL_SECONDS = 0.05
+
+
+async def _unless_disconnected(http_request: Request, run, may_cancel=lambda: True):
+    """
+    Awaits ``run`` (a graph run coroutine), cancelling it if the client goes away
+    and ``may_cancel()`` agrees. Returns None when it was cancelled.
+    """
+    task = asyncio.ensure_future(run)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected() and may_cancel():
+            # The runner records the task as cancelled with its partial results.
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return None
+
+def _too_busy(exc: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+def _admit(priority: str) -> Grant:
+    try:
+        return get_admission_controller().admit(priority)
+    except Overloaded as exc:
+        raise _too_busy(exc)
+
+def _admit_leader(task_id: str, context: Dict[str, Any], flight: Optional[Flight]) -> Optional[Grant]:
+    """
+    Admits the ticket if it will run the graph. A follower of an identical
+    ticket in flight only waits for the leader's outcome, so it takes no slot.
+    """
+    if not leads(task_id, flight):
+        return None
+    try:
+        return get_admission_controller().admit(context["priority"])
+    except Overloaded as exc:
+        abandon_flight(task_id, flight, exc)
+        raise _too_busy(exc)
+
+async def _when_admitted(grant: Grant, run, profile: bool = False):
+    with request_options(profile=profile):
+        async with grant:
+            return await run()
+
+async def _profiled(run, profile: bool = False):
+    with request_options(profile=profile):
+        return await run()
+
+def _profile_requested(http_request: Request) -> bool:
+    return http_request.headers.get(settings.PROFILE_HEADER, "").lower() in ("1", "true", "yes")
 
 @router.post("/execute", response_model=TaskResponse)
-async def execute(request: ExecuteRequest):
+async def execute(request: ExecuteRequest, response: Response, http_request: Request):
     task_id = str(uuid4())
-    graph = build_coordinator_graph()
-    save_mermaid_diagram(graph)
-
-    context = {
-        "task_id": task_id,
-        "request": request.request,
-        "require_approval": request.require_approval,
-    }
+
+    context = ticket_context(task_id, request, bulk=request.background)
     print(f"Context: {context}")
-    
-    updated_state = graph.invoke(context, config={"configurable": {"thread_id": task_id}})
+    # Coalesce first: identical tickets in flight are answered by one admitted run.
+    flight = join_flight(task_id, context)
+    grant = _admit_leader(task_id, context, flight)
+    profile = _profile_requested(http_request)
+
+    if request.background:
+        # Hand the run to the worker pool; clients poll GET /tasks/{id}.
+        set_status(task_id, "queued", request=request.request)
+        try:
+            get_job_queue().submit(lambda: _profiled(lambda: run_flight(task_id, context, flight, grant), profile))
+        except JobQueueFull as exc:
+            if grant is not None:
+                grant.cancel()
+            abandon_flight(task_id, flight, RuntimeError(f"Job queue is full: {exc}"))
+            del TASKS[task_id]
+            raise HTTPException(status_code=503, detail=f"Job queue is full: {exc}")
+        response.status_code = 202
+        return TaskResponse(task_id=task_id, status="queued")
+
+    set_status(task_id, "planning", request=request.request)
+    # Identical tickets waiting on this run keep it alive when this client leaves.
+    try:
+        updated_state = await _unless_disconnected(
+            http_request,
+            _profiled(lambda: run_flight(task_id, context, flight, grant), profile),
+            lambda: not single_flight.followers(coalesce_key(context)),
+        )
+    except Overloaded as exc:
+        # This ticket followed a leader that was refused admission.
+        del TASKS[task_id]
+        raise _too_busy(exc)
+    if updated_state is None:
+        return TaskResponse(task_id=task_id, status="cancelled")
     status = updated_state["status"]
     print(f"Status: {status}")
 
     if status == "waiting_approval":
-        # Store in PLANS for approval
-        PLANS[task_id] = updated_state
-        TASKS[task_id] = {"status": status, "plan": updated_state.get("plan"), "request": request.request}
         return TaskResponse(
             task_id=task_id,
             status=status,
             result=updated_state.get("plan"),
         )
+    return TaskResponse(
+        task_id=task_id,
+        status=status,
+        result=updated_state.get("results"),
+    )
+
+@router.post("/execute/batch")
+async def execute_batch(http_request: Request):
+    """
+    Runs many tickets: a JSON list of ExecuteRequest bodies, or NDJSON (one per
+    line, Content-Type application/x-ndjson) read as it streams in. Streams back
+    one NDJSON line per ticket as it finishes; see app.batch.
+    """
+    if "ndjson" in http_request.headers.get("content-type", ""):
+        items = ndjson_items(http_request.stream())
     else:
-        # Completed—store in TASKS
-        TASKS[task_id] = {
-            "status": status,
-            "result": updated_state.get("results"),
-            "request": request.request
-        }
-        return TaskResponse(
-            task_id=task_id,
-            status=status,
-            result=updated_state.get("results"),
-        )
+        try:
+            body = await http_request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON list of tickets or NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON list of tickets or NDJSON")
+        items = _aiter(parse_ticket(raw) for raw in body)
+    batch = Batch(items)
+    try:
+        # The response listens for disconnects on the channel the body arrives
+        # on, so read every ticket (each starts as it is read) before streaming.
+        await batch.read.wait()
+    except BaseException:
+        batch.cancel()
+        raise
+
+    async def lines():
+        # Closing batch.lines() (e.g. on disconnect) cancels the tickets still running.
+        async with contextlib.aclosing(batch.lines()) as results:
+            async for line in results:
+                yield ndjson_line(line)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+async def _claim_plan(id: str, status: str) -> Dict[str, Any]:
+    """
+    Moves a waiting plan to ``status`` with a compare-and-set on its version,
+    so only one approve/reject wins even when requests land on different workers.
+    Waits while speculation (on any worker) writes into the plan's checkpoint.
+    """
+    while True:
+        try:
+            context, version = PLANS.get_versioned(id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        if not plan_is_claimed(context):
+            break
+        await asyncio.sleep(PLAN_CLAIM_POLL_SECONDS)
+    claimed = {**context, "status": status, "claimed_until": None}
+    if context.get("status") not in ("waiting_approval", SPECULATING) or not PLANS.replace_if(id, claimed, version):
+        raise HTTPException(status_code=409, detail="Plan is already being approved or rejected")
+    return claimed
 
 @router.post("/plans/{id}/approve", response_model=PlanApprovalResponse)
-async def approve_plan(id: str):
-    if id not in PLANS:
-        raise HTTPException(status_code=404, detail="Plan not found")
-    context = PLANS[id]
-    context["status"] = "active"
-    graph = build_coordinator_graph()
-
-   
-
-    # Resume from approval node
-    print("DEBUG: Approving plan. Context keys:", context.keys())
-    print("DEBUG: Plan in context:", context.get("plan"))
-
-    updated_result_state = graph.invoke(None, config={"configurable": {"thread_id": id}})
-    TASKS[id] = {
-        "status": updated_result_state["status"],
-        "result": updated_result_state.get("results"),
-        "request": context["request"]
-    }
-    del PLANS[id]
-    return PlanApprovalResponse(status=updated_result_state["status"])
+async def approve_plan(id: str, http_request: Request):
+    # Let speculative agent runs land in the checkpoint so they are reused.
+    await speculator.wait(id)
+    # Someone is waiting on the approval, so it is admitted (and its LLM calls
+    # go ahead of bulk work) as interactive whatever the original submission's priority.
+    grant = _admit("interactive")
+    try:
+        claimed = await _claim_plan(id, "approving")
+    except HTTPException:
+        grant.cancel()
+        raise
+
+    # Resume from approval node.
+    try:
+        with request_options(priority="interactive"):
+            updated_result_state = await _unless_disconnected(
+                http_request, _when_admitted(grant, lambda: run_graph(id, None), _profile_requested(http_request))
+            )
+    except Exception:
+        # Give the plan back so the approval can be retried.
+        PLANS[id] = {**claimed, "status": "waiting_approval"}
+        raise
+    if updated_result_state is None:
+        return PlanApprovalResponse(status="cancelled")
+    return PlanApprovalResponse(status=updated_result_state["status"], error=updated_result_state.get("error"))
 
 @router.post("/plans/{id}/reject", response_model=PlanApprovalResponse)
 async def reject_plan(id: str):
-    if id not in PLANS:
-        raise HTTPException(status_code=404, detail="Plan not found")
-    TASKS[id] = {"status": "rejected"}
-    del PLANS[id]
+    await _claim_plan(id, "rejected")
+    speculator.cancel(id)
+    set_status(id, "rejected")
+    PLANS.pop(id, None)
+    await asyncio.to_thread(get_task_store().release, id)
     return PlanApprovalResponse(status="rejected")
 
 @router.get("/tasks/{id}", response_model=TaskStatusResponse)
@@ -105,21 +256,156 @@ async def get_task_status(id: str):
         diagnosis=diagnosis,
         script=script,
         email_draft=email_draft,
-        duration_seconds=duration_seconds
+        duration_seconds=duration_seconds,
+        error=task.get("error"),
+        metrics=task.get("metrics"),
+        profiled="profile" in task,
     )
-    
-def save_mermaid_diagram(graph, base_filename="workflow"):
+
+@router.get("/tasks/{id}/profile")
+async def get_task_profile(id: str, format: str = "speedscope"):
     """
-    Saves the Mermaid diagram of the given LangGraph graph as both PNG and Markdown files.
-    
-    Args:
-        graph: The LangGraph graph object
-        base_filename: Base name for the output files (without extension)
+    The task's run profile as speedscope JSON (https://www.speedscope.app) or collapsed stacks (flamegraph.pl).
     """
-    # Save PNG version
-    png_data = graph.get_graph().draw_mermaid_png()
+    profile = TASKS.get(id, {}).get("profile")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile for this task")
+    if format == "collapsed":
+        return Response(content=collapsed(profile), media_type="text/plain")
+    if format != "speedscope":
+        raise HTTPException(status_code=400, detail="format must be one of ['speedscope', 'collapsed']")
+    return Response(
+        content=json.dumps(speedscope(profile, f"task {id}")),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{id}.speedscope.json"'},
+    )
     
-    png_filename = f"{base_filename}.png"
-    with open(png_filename, "wb") as f:
-        f.write(png_data)
-    print(f"Saved PNG diagram to {png_filename}")
\ No newline at end of file
+@router.get("/tasks/{id}/stream")
+async def stream_task_events(id: str):
+    """
+    Server-Sent Events for one task: status changes, node_started/node_finished,
+    each agent_output as soon as it exists and, if the ticket was submitted with
+    stream_tokens, the writer's email_draft tokens. Ends with the terminal status.
+    """
+    if id not in TASKS:
+        raise HTTPException(status_code=404, detail="Task not found")
+    subscription = event_bus.subscribe(id)
+
+    async def events():
+        try:
+            last_status = TASKS.get(id, {}).get("status")
+            if last_status in TERMINAL_STATUSES and not event_bus.history(id):
+                yield _sse("status", {"status": last_status})
+                return
+            idle = 0.0
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=SSE_STORE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    status = TASKS.get(id, {}).get("status")
+                    if status != last_status:
+                        last_status = status
+                        yield _sse("status", {"status": status})
+                        if status in TERMINAL_STATUSES:
+                            return
+                    idle += SSE_STORE_POLL_SECONDS
+                    if idle >= SSE_HEARTBEAT_SECONDS:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                idle = 0.0
+                if event.type == "status":
+                    last_status = event.data.get("status")
+                yield _sse(event.type, event.data, event.id)
+                if event.is_terminal:
+                    return
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _sse(event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event_type}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@router.get("/health")
+async def get_health():
+    """
+    Liveness plus admission state: per class running and queued runs, the estimated wait and whether new work is accepted.
+    """
+    admission = get_admission_controller().stats()
+    accepting = all(budget["accepting"] for budget in admission["classes"].values())
+    return {"status": "ok" if accepting else "overloaded", "admission": admission, "jobs": get_job_queue().stats()}
+
+@router.get("/admin/profiling")
+async def get_profiling():
+    """
+    Current profiling sample rate, runs still to profile on request and runs profiled so far.
+    """
+    return profiler.stats()
+
+@router.put("/admin/profiling")
+async def update_profiling(update: ProfilingUpdate):
+    """
+    Changes the share of runs profiled and/or asks for the next ``next_runs`` runs to be profiled.
+    """
+    profiler.configure(update.sample_rate, update.next_runs)
+    return profiler.stats()
+
+@router.get("/jobs/stats")
+async def get_job_stats():
+    """
+    Depth and throughput of the background worker pool, for sizing JOB_WORKERS / JOB_QUEUE_SIZE.
+    """
+    return get_job_queue().stats()
+
+@router.get("/llm/cache")
+async def get_llm_cache_stats():
+    """
+    Hit/miss/eviction counters of the shared LLM response cache.
+    """
+    return get_response_cache().stats()
+
+@router.get("/llm/tiers")
+async def get_llm_tier_stats():
+    """
+    Per agent and model tier: calls, escalations to the next tier and mean latency.
+    """
+    return tier_stats()
+
+@router.get("/retrieval/stats")
+async def get_retrieval_stats():
+    """
+    Size of the index of resolved tickets and how often DiagnosticAgent reused or was grounded by it.
+    """
+    from app.retrieval import get_retrieval_index
+
+    return get_retrieval_index().stats()
+
+@router.get("/planner/stats")
+async def get_planner_stats():
+    """
+    How often plans came from the fast path (rules, plan cache) instead of the coordinator LLM.
+    """
+    return get_fast_planner().stats()
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus exposition of per-node, per-agent and per-LLM-call latency, tokens and cache hits.
+    """
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/graph/diagram")
+async def get_graph_diagram(format: str = "mermaid"):
+    """
+    Returns the coordinator graph as Mermaid source or PNG. Rendered once, then cached.
+    """
+    if format not in DIAGRAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(DIAGRAM_FORMATS)}")
+    data = render_diagram(get_coordinator_graph(), format)
+    media_type = "image/png" if format == "png" else "text/plain"
+    return Response(content=data, media_type=media_type)
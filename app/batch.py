@@ -0,0 +1,153 @@
+"""
+Bulk ticket ingestion for POST /execute/batch.
+
+A nightly ITSM export carries hundreds of tickets at once. A Batch starts
+each ticket as soon as it is parsed (from a JSON list, or NDJSON as it
+streams in) and yields one result line per ticket, in the order they finish:
+
+- identical tickets (same coalesce key) run once, and the duplicates adopt
+  that run's outcome under their own task ids;
+- at most BATCH_CONCURRENCY tickets run at once, at bulk priority unless
+  they ask for another;
+- their short agent prompts are packed several per LLM call (see
+  app.llm.packing).
+
+Every ticket gets a task id, so GET /tasks/{id} reports it like any other.
+A ticket that does not parse is reported as rejected; the rest still run.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple, Union
+from uuid import uuid4
+
+from pydantic import ValidationError
+
+from app import settings
+from app.coalescing import coalesce_key
+from app.models import ExecuteRequest
+from app.runner import adopt_outcome, run_coalesced, set_status, ticket_context
+
+# A parsed ticket, or why it could not be parsed.
+BatchItem = Union[ExecuteRequest, ValueError]
+
+
+def parse_ticket(raw: Any) -> BatchItem:
+    try:
+        if isinstance(raw, (bytes, str)):
+            return ExecuteRequest.model_validate_json(raw)
+        return ExecuteRequest.model_validate(raw)
+    except ValidationError as exc:
+        return ValueError(f"Invalid ticket: {exc.errors(include_url=False)}")
+
+
+async def ndjson_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[BatchItem]:
+    """
+    Tickets from an NDJSON body, one per non-blank line, as the lines arrive.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_ticket(line)
+    if buffer.strip():
+        yield parse_ticket(buffer)
+
+
+class Batch:
+    """
+    A running batch. Tickets start as soon as they are read from ``items``;
+    ``lines()`` yields {"index", "task_id", "status", "result", "error"} (plus
+    "duplicate_of" for duplicates) as each finishes. "result" is the plan for
+    tickets waiting for approval.
+    """
+
+    def __init__(self, items: AsyncIterator[BatchItem]):
+        self._lines: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+        # Coalesce key -> (task id, future of its (final state, error)).
+        self._firsts: Dict[Any, Tuple[str, asyncio.Future]] = {}
+        self._running: Set[asyncio.Future] = set()
+        # Set once every ticket has been read (or reading failed).
+        self.read = asyncio.Event()
+        self._feeder = asyncio.ensure_future(self._feed(items))
+
+    async def _feed(self, items: AsyncIterator[BatchItem]) -> None:
+        try:
+            index = 0
+            async for item in items:
+                self._running.add(asyncio.ensure_future(_run_ticket(index, item, self._slots, self._firsts, self._lines)))
+                index += 1
+            self.read.set()
+            await asyncio.gather(*self._running)
+        except Exception as exc:
+            await self._lines.put({"index": None, "task_id": None, "status": "rejected", "error": f"Unreadable batch: {exc}"})
+            await asyncio.gather(*self._running, return_exceptions=True)
+        finally:
+            self.read.set()
+            await self._lines.put(None)
+
+    async def lines(self) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            while (line := await self._lines.get()) is not None:
+                yield line
+        finally:
+            # The client went away (or the batch is done): stop what is still running.
+            self.cancel()
+
+    def cancel(self) -> None:
+        for future in (self._feeder, *self._running):
+            future.cancel()
+
+
+async def _run_ticket(
+    index: int,
+    item: BatchItem,
+    slots: asyncio.Semaphore,
+    firsts: Dict[Any, Tuple[str, asyncio.Future]],
+    lines: asyncio.Queue,
+) -> None:
+    if isinstance(item, ValueError):
+        await lines.put({"index": index, "task_id": None, "status": "rejected", "error": str(item)})
+        return
+    task_id = str(uuid4())
+    context = {**ticket_context(task_id, item, bulk=True), "pack_prompts": True}
+    set_status(task_id, "queued", request=item.request)
+    line: Dict[str, Any] = {"index": index, "task_id": task_id}
+    key = None if item.bypass_cache else coalesce_key(context)
+    if key in firsts:
+        first_id, outcome = firsts[key]
+        line["duplicate_of"] = first_id
+        state, error = await asyncio.shield(outcome)
+        if error is None:
+            state = await adopt_outcome(task_id, state)
+        else:
+            set_status(task_id, "failed", error=error)
+    else:
+        outcome = asyncio.get_running_loop().create_future()
+        if key is not None:
+            firsts[key] = (task_id, outcome)
+        state, error = None, None
+        try:
+            async with slots:
+                state = await run_coalesced(task_id, context)
+        except Exception as exc:
+            error = str(exc)
+        except BaseException:
+            outcome.set_result((None, "Cancelled before completion"))
+            raise
+        outcome.set_result((state, error))
+    await lines.put({**line, **_summary(state, error)})
+
+
+def _summary(state: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    if state is None:
+        return {"status": "failed", "result": None, "error": error}
+    status = state.get("status")
+    result = state.get("plan") if status == "waiting_approval" else state.get("results")
+    return {"status": status, "result": result, "error": state.get("error")}
+
+
+def ndjson_line(line: Dict[str, Any]) -> str:
+    return json.dumps(line, default=str) + "\n"
@@ -0,0 +1,65 @@
+"""
+Single-flight coalescing of identical in-flight tickets.
+
+During an incident many users file the same ticket within seconds. The first
+submission (the leader) runs the graph; every identical submission that
+arrives while it is running (a follower) waits for the leader's outcome
+instead of making its own LLM calls. Futures are concurrent.futures ones so
+leaders and followers may live on different event loops (inline requests and
+background jobs).
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+
+def coalesce_key(context: Dict[str, Any]) -> Tuple[str, bool, Optional[str]]:
+    """
+    Tickets with the same key get the same answer: case, whitespace and
+    trailing punctuation of the request text do not matter.
+    """
+    text = " ".join(str(context.get("request", "")).lower().split()).strip(" .!?")
+    return text, bool(context.get("require_approval")), context.get("merge_mode")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Any, Tuple[str, Future]] = {}
+        self._followers: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Any, task_id: str) -> Tuple[str, Future]:
+        """
+        Returns (leader task id, future of the leader's outcome). If nothing
+        with this key is in flight, ``task_id`` becomes the leader.
+        """
+        with self._lock:
+            if key not in self._in_flight:
+                self._in_flight[key] = (task_id, Future())
+            else:
+                self._followers[key] = self._followers.get(key, 0) + 1
+            return self._in_flight[key]
+
+    def finish(self, key: Any, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        """
+        Called by the leader; later submissions with the key start a new flight.
+        """
+        with self._lock:
+            _, future = self._in_flight.pop(key)
+            self._followers.pop(key, None)
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def followers(self, key: Any) -> int:
+        """
+        How many submissions are waiting on the flight for ``key``.
+        """
+        return self._followers.get(key, 0)
+
+
+single_flight = SingleFlight()
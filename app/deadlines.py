@@ -0,0 +1,66 @@
+"""
+Deadlines for graph runs, agent runs and LLM calls.
+
+A deadline is an absolute time.time() carried in the LLM request options
+(app.llm.context) under "deadline", so it reaches every node, agent and LLM
+call of the ticket the same way the cache and priority options do:
+
+- the runner sets the run's deadline (REQUEST_TIMEOUT_SECONDS or the
+  ticket's own timeout_seconds) around the graph;
+- each agent run narrows it to its own budget (AGENT_TIMEOUT_SECONDS, or
+  AGENT_TIMEOUTS per agent);
+- every LLM call passes what is left as its HTTP timeout and never starts,
+  or backs off, past it.
+
+Work cut short ends the ticket as "timed_out" with whatever results exist.
+"""
+import json
+import time
+from typing import Optional
+
+from app import settings
+from app.llm.context import current_options
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work would start or continue past its deadline."""
+
+
+def deadline_in(seconds: Optional[float]) -> Optional[float]:
+    """
+    The deadline ``seconds`` from now, or None for no deadline (None or <= 0).
+    """
+    return time.time() + seconds if seconds and seconds > 0 else None
+
+
+def earliest(*deadlines: Optional[float]) -> Optional[float]:
+    set_deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(set_deadlines) if set_deadlines else None
+
+
+def current_deadline() -> Optional[float]:
+    return current_options().get("deadline")
+
+
+def time_left(deadline: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds until ``deadline`` (default: the current one), or None without a deadline.
+    """
+    deadline = current_deadline() if deadline is None else deadline
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(what: str, deadline: Optional[float] = None) -> Optional[float]:
+    """
+    Raises DeadlineExceeded if the deadline has passed; otherwise returns the time left.
+    """
+    left = time_left(deadline)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"{what}: deadline exceeded")
+    return left
+
+
+def agent_timeout(agent_key: str) -> Optional[float]:
+    overrides = json.loads(settings.AGENT_TIMEOUTS) if settings.AGENT_TIMEOUTS else {}
+    seconds = overrides.get(agent_key, settings.AGENT_TIMEOUT_SECONDS)
+    return seconds if seconds and seconds > 0 else None
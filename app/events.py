@@ -0,0 +1,122 @@
+"""
+Per-task progress events for streaming clients.
+
+Graph nodes, agents and the runner publish small events (node started/finished,
+agent output, status change, LLM tokens) keyed by task id. Subscribers get an
+asyncio queue on their own event loop; publishing is thread-safe because nodes
+and agents run on worker threads and on the background job loop.
+
+Memory stays bounded: each task keeps only its last few non-token events for
+late subscribers, only a fixed number of tasks are retained, and token events
+are dropped for a subscriber that falls too far behind.
+"""
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from app import settings
+
+TERMINAL_STATUSES = ("completed", "failed", "rejected", "timed_out", "cancelled")
+
+
+@dataclass
+class TaskEvent:
+    id: int
+    task_id: str
+    type: str
+    data: Dict[str, Any]
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.type == "status" and self.data.get("status") in TERMINAL_STATUSES
+
+
+@dataclass
+class Subscription:
+    task_id: str
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    token_buffer: int = 256
+    pending_tokens: int = 0
+    dropped_tokens: int = 0
+
+    def offer(self, event: TaskEvent) -> None:
+        # Runs on the subscriber's loop.
+        if event.type == "token":
+            if self.pending_tokens >= self.token_buffer:
+                self.dropped_tokens += 1
+                return
+            self.pending_tokens += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> TaskEvent:
+        event = await self.queue.get()
+        if event.type == "token":
+            self.pending_tokens -= 1
+        return event
+
+
+class TaskEventBus:
+    def __init__(self, history_per_task: int = 64, history_tasks: int = 1024, token_buffer: int = 256):
+        self.history_per_task = history_per_task
+        self.history_tasks = history_tasks
+        self.token_buffer = token_buffer
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history: "OrderedDict[str, Deque[TaskEvent]]" = OrderedDict()
+        self._subscribers: Dict[str, List[Subscription]] = {}
+
+    def publish(self, task_id: Optional[str], event_type: str, **data: Any) -> None:
+        if not task_id:
+            return
+        with self._lock:
+            event = TaskEvent(next(self._ids), task_id, event_type, data)
+            if event_type != "token":
+                history = self._history.get(task_id)
+                if history is None:
+                    history = self._history[task_id] = deque(maxlen=self.history_per_task)
+                    while len(self._history) > self.history_tasks:
+                        self._history.popitem(last=False)
+                else:
+                    self._history.move_to_end(task_id)
+                history.append(event)
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's loop has closed; unsubscribe() will clean up.
+                pass
+
+    def subscribe(self, task_id: str) -> Subscription:
+        """
+        Registers a subscriber on the running loop, pre-loaded with the task's recent events.
+        """
+        subscription = Subscription(task_id, asyncio.get_running_loop(), token_buffer=self.token_buffer)
+        with self._lock:
+            for event in self._history.get(task_id, ()):
+                subscription.offer(event)
+            self._subscribers.setdefault(task_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.task_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.task_id, None)
+
+    def history(self, task_id: str) -> List[TaskEvent]:
+        with self._lock:
+            return list(self._history.get(task_id, ()))
+
+
+event_bus = TaskEventBus(
+    history_per_task=settings.EVENT_HISTORY_PER_TASK,
+    history_tasks=settings.EVENT_HISTORY_TASKS,
+    token_buffer=settings.EVENT_SUBSCRIBER_TOKEN_BUFFER,
+)
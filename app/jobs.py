@@ -0,0 +1,120 @@
+"""
+Bounded in-process worker pool for background graph runs.
+
+The pool owns a daemon thread with its own asyncio event loop and a fixed
+number of worker coroutines. Jobs are coroutine factories submitted from any
+thread; when more than ``max_queued`` jobs are waiting, submit() refuses new
+work instead of letting the backlog grow without bound.
+"""
+import asyncio
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict
+
+from app import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit when the backlog is at capacity."""
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._counters = {"queued": 0, "running": 0, "submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._wait_seconds_total = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="job-queue", daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        for index in range(self.workers):
+            self._loop.create_task(self._worker(), name=f"job-worker-{index}")
+        ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _worker(self) -> None:
+        while True:
+            factory, enqueued_at = await self._queue.get()
+            with self._lock:
+                self._counters["queued"] -= 1
+                self._counters["running"] += 1
+                self._wait_seconds_total += time.perf_counter() - enqueued_at
+            outcome = "completed"
+            try:
+                await factory()
+            except Exception:
+                outcome = "failed"
+                logger.exception("Background job failed")
+            finally:
+                with self._lock:
+                    self._counters["running"] -= 1
+                    self._counters[outcome] += 1
+
+    def submit(self, factory: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Queues ``factory()`` to run on a worker. Raises JobQueueFull at capacity.
+        """
+        self.start()
+        with self._lock:
+            if self._counters["queued"] >= self.max_queued:
+                self._counters["rejected"] += 1
+                raise JobQueueFull(f"{self._counters['queued']} jobs already queued")
+            self._counters["queued"] += 1
+            self._counters["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (factory, time.perf_counter()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._counters["completed"] + self._counters["failed"] + self._counters["running"]
+            return {
+                **self._counters,
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "avg_queue_wait_seconds": round(self._wait_seconds_total / started, 4) if started else 0.0,
+            }
+
+    async def _shutdown(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.get_running_loop().stop()
+
+    def stop(self) -> None:
+        """
+        Cancels running and queued jobs and stops the worker thread.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._thread = None
+        if thread is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+            thread.join(timeout=5)
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide job queue, sized from settings.
+    """
+    return JobQueue(workers=settings.JOB_WORKERS, max_queued=settings.JOB_QUEUE_SIZE)
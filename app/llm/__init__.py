@@ -0,0 +1,6 @@
+from .client import get_async_client, get_client
+from .context import request_options
+from .dispatch import acomplete, complete
+from .tiers import acomplete_tiered, complete_tiered
+
+__all__ = ["get_async_client", "get_client", "request_options", "complete", "acomplete", "complete_tiered", "acomplete_tiered"]
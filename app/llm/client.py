@@ -0,0 +1,57 @@
+"""
+Shared OpenAI client construction.
+
+Clients are created lazily, on first use (or by the app's lifespan at startup),
+never at import. Every agent shares one sync client and its connection pool.
+The async client is created one per event loop: an httpx connection pool is
+bound to the loop that opened its connections, so sharing one client across
+loops (e.g. a background worker loop and the server loop) is unsafe. Within a
+loop every agent shares the same client and connection pool.
+"""
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, Timeout
+
+from app import settings
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _pool_options():
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": Timeout(settings.LLM_REQUEST_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+    }
+
+
+def _build_async_client() -> AsyncOpenAI:
+    # Retries are done by app.llm.dispatch, which also paces them through the rate limiter.
+    return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=DefaultAsyncHttpxClient(**_pool_options()), max_retries=0)
+
+
+@lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    """
+    Returns the sync OpenAI client shared by every agent, creating it on first use.
+    """
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=DefaultHttpxClient(**_pool_options()), max_retries=0)
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Returns the AsyncOpenAI client for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _build_async_client()
+        _async_clients[loop] = client
+    return client
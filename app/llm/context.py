@@ -0,0 +1,29 @@
+"""
+Per-request options for LLM calls.
+
+Agents only receive the request text, so options that travel with a ticket
+(e.g. bypassing the response cache) are carried in a context variable set by
+the graph nodes. Context is copied into asyncio tasks and, explicitly, into
+the agent thread pool.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict
+
+_request_options: ContextVar[Dict[str, Any]] = ContextVar("llm_request_options", default={})
+
+
+def current_options() -> Dict[str, Any]:
+    return _request_options.get()
+
+
+@contextmanager
+def request_options(**options):
+    """
+    Layers ``options`` over the current ones for the duration of the block.
+    """
+    token = _request_options.set({**_request_options.get(), **options})
+    try:
+        yield
+    finally:
+        _request_options.reset(token)
@@ -0,0 +1,238 @@
+"""
+Single entry point for chat completions.
+
+Every agent sends its prompts through complete()/acomplete(), which answer from
+the shared response cache when they can and otherwise call the OpenAI client.
+Each call reports its latency, token usage and cache outcome to app.metrics,
+attributed to the agent and task in the current request options.
+
+Calls that reach the API first take quota from the shared rate limiter (at the
+ticket's priority) and are retried with jittered backoff on 429s and transient
+connection/server errors. The current deadline (app.deadlines) bounds each
+attempt's HTTP timeout, and no attempt or backoff starts past it.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app import settings
+from app.llm.cache import get_response_cache, make_cache_key
+import openai
+
+from app.deadlines import DeadlineExceeded, check_deadline, time_left
+from app.llm.context import current_options
+from app.llm.ratelimit import backoff_delay, estimate_tokens, get_rate_limiter, retry_after_seconds
+from app.metrics import metrics
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def _cache_lookup(model, messages, response_format):
+    if not settings.LLM_CACHE_ENABLED:
+        return None, None
+    cache = get_response_cache()
+    if current_options().get("bypass_cache"):
+        cache.record_bypass()
+        return None, None
+    key = make_cache_key(model, messages, response_format)
+    return key, cache.get(key)
+
+
+def _cache_store(key: Optional[str], content: str, response_format) -> None:
+    if key is None:
+        return
+    if response_format and response_format.get("type") == "json_object":
+        # Never cache a malformed JSON answer: it would fail every repeat ticket.
+        try:
+            json.loads(content)
+        except (TypeError, ValueError):
+            return
+    get_response_cache().set(key, content)
+
+
+def _record_call(model: str, started: float, usage=None, cache_hit: bool = False) -> None:
+    options = current_options()
+    details = getattr(usage, "prompt_tokens_details", None)
+    metrics.observe_llm(
+        options.get("task_id"),
+        options.get("agent", "unknown"),
+        model,
+        time.perf_counter() - started,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        cache_hit=cache_hit,
+    )
+
+
+def _should_retry(exc: BaseException, attempt: int) -> Optional[float]:
+    """
+    Returns the delay before the next attempt, or None to give up.
+    """
+    retry_after = retry_after_seconds(exc)
+    if isinstance(exc, openai.RateLimitError):
+        get_rate_limiter().throttled(retry_after)
+    if attempt >= settings.LLM_MAX_RETRIES:
+        return None
+    return backoff_delay(attempt, retry_after)
+
+
+def _timeout_kwargs(timeout: Optional[float]) -> Dict[str, Any]:
+    return {"timeout": timeout} if timeout is not None else {}
+
+
+def _backoff_within_deadline(exc: BaseException, attempt: int) -> float:
+    """
+    The delay before the next attempt; re-raises ``exc`` (as DeadlineExceeded if
+    that is the reason) when there should be none.
+    """
+    delay = _should_retry(exc, attempt)
+    if delay is None:
+        raise exc
+    left = time_left()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded(f"LLM call: no time left to retry after {exc}") from exc
+    return delay
+
+
+def _send(create: Callable[..., Any], messages: List[Dict[str, Any]]):
+    """
+    Runs ``create`` (one API request; called with the HTTP timeout, if any)
+    under the rate limiter, retrying transient failures.
+    Returns (result, tokens reserved).
+    """
+    limiter = get_rate_limiter()
+    priority = current_options().get("priority", "interactive")
+    reserved = estimate_tokens(messages)
+    for attempt in itertools.count():
+        limiter.acquire(reserved, priority)
+        timeout = check_deadline("LLM call")
+        try:
+            return create(**_timeout_kwargs(timeout)), reserved
+        except RETRYABLE_ERRORS as exc:
+            time.sleep(_backoff_within_deadline(exc, attempt))
+
+
+async def _asend(create: Callable[..., Any], messages: List[Dict[str, Any]]):
+    limiter = get_rate_limiter()
+    priority = current_options().get("priority", "interactive")
+    reserved = estimate_tokens(messages)
+    for attempt in itertools.count():
+        await limiter.aacquire(reserved, priority)
+        timeout = check_deadline("LLM call")
+        try:
+            if timeout is None:
+                return await create(), reserved
+            # The HTTP timeout is per read; this bounds the whole call.
+            return await asyncio.wait_for(create(timeout=timeout), timeout), reserved
+        except asyncio.TimeoutError as exc:
+            raise DeadlineExceeded("LLM call: deadline exceeded") from exc
+        except RETRYABLE_ERRORS as exc:
+            await asyncio.sleep(_backoff_within_deadline(exc, attempt))
+
+
+def _settle(reserved: int, usage) -> None:
+    get_rate_limiter().settle(reserved, getattr(usage, "total_tokens", None))
+
+
+def _delta_text(chunk) -> str:
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def complete(
+    client,
+    *,
+    model: str,
+    messages: List[Dict[str, Any]],
+    response_format: Optional[Dict[str, Any]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Returns the assistant message content for the given prompt.
+
+    Args:
+        client: An OpenAI client.
+        model: Model name.
+        messages: Chat messages.
+        response_format: Passed through to the API, e.g. {"type": "json_object"}.
+        on_delta: If given, the response is streamed and each content fragment
+            is passed to it as it arrives (a cached answer arrives in one piece).
+    """
+    started = time.perf_counter()
+    key, cached = _cache_lookup(model, messages, response_format)
+    if cached is not None:
+        if on_delta:
+            on_delta(cached)
+        _record_call(model, started, cache_hit=True)
+        return cached
+    kwargs = {"response_format": response_format} if response_format else {}
+    usage = None
+    if on_delta:
+        parts = []
+        # The usage block arrives in a final chunk without choices.
+        stream, reserved = _send(lambda **extra: client.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs, **extra
+        ), messages)
+        for chunk in stream:
+            check_deadline("LLM stream")
+            usage = getattr(chunk, "usage", None) or usage
+            text = _delta_text(chunk)
+            if text:
+                parts.append(text)
+                on_delta(text)
+        content = "".join(parts)
+    else:
+        response, reserved = _send(lambda **extra: client.chat.completions.create(model=model, messages=messages, **kwargs, **extra), messages)
+        content = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+    _settle(reserved, usage)
+    _record_call(model, started, usage)
+    _cache_store(key, content, response_format)
+    return content
+
+
+async def acomplete(
+    client,
+    *,
+    model: str,
+    messages: List[Dict[str, Any]],
+    response_format: Optional[Dict[str, Any]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Async variant of complete() for an AsyncOpenAI client.
+    """
+    started = time.perf_counter()
+    key, cached = _cache_lookup(model, messages, response_format)
+    if cached is not None:
+        if on_delta:
+            on_delta(cached)
+        _record_call(model, started, cache_hit=True)
+        return cached
+    kwargs = {"response_format": response_format} if response_format else {}
+    usage = None
+    if on_delta:
+        parts = []
+        stream, reserved = await _asend(lambda **extra: client.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs, **extra
+        ), messages)
+        async for chunk in stream:
+            check_deadline("LLM stream")
+            usage = getattr(chunk, "usage", None) or usage
+            text = _delta_text(chunk)
+            if text:
+                parts.append(text)
+                on_delta(text)
+        content = "".join(parts)
+    else:
+        response, reserved = await _asend(lambda **extra: client.chat.completions.create(model=model, messages=messages, **kwargs, **extra), messages)
+        content = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+    _settle(reserved, usage)
+    _record_call(model, started, usage)
+    _cache_store(key, content, response_format)
+    return content
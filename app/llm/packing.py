@@ -0,0 +1,140 @@
+"""
+Packing of short same-agent prompts into one LLM call, for bulk imports.
+
+Tickets submitted through POST /execute/batch run with the ``pack_prompts``
+request option. Their agents' calls then wait here up to PACK_WINDOW_SECONDS
+for other calls with the same instructions (the system message built by
+app.llm.prompts). Up to PACK_MAX_TICKETS of them go out as one call: the
+shared instructions once, plus every ticket as an {"id", "ticket"} JSON list,
+answered as {"results": {"<id>": <answer>}}. So the instructions and few-shot
+examples are paid for once per pack rather than once per ticket.
+
+A ticket whose answer is missing from the pack or has the wrong shape, or
+whose pack call failed, gets None back and is asked on its own. Long tickets,
+streamed calls and prompts that are not [system, user] pairs are never packed.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import settings
+from app.llm.context import request_options
+from app.llm.prompts import compact_json, count_tokens
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PACK_INSTRUCTIONS = """
+You will receive several independent tickets as a JSON list of {"id": ..., "ticket": ...} objects.
+Answer each ticket exactly as you would answer it alone, and output JSON of the form
+{"results": {"<id>": <that ticket's answer object>, ...}} with one entry per id.
+"""
+
+_packed = metrics.counter(
+    "it_agent_packed_prompts_total",
+    "Agent prompts sent in packed calls, by outcome (unpacked = answered alone after all)",
+    ("agent", "outcome"),
+)
+_pack_calls = metrics.counter("it_agent_pack_calls_total", "Packed LLM calls sent", ("agent",))
+
+
+@dataclass
+class _Pack:
+    agent: str
+    client: Any
+    system: str
+    shape: Optional[Dict[str, Any]]
+    response_format: Optional[Dict[str, Any]]
+    entries: List[Tuple[str, asyncio.Future]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class PromptPacker:
+    def __init__(self):
+        self._open: Dict[Tuple, _Pack] = {}
+
+    @staticmethod
+    def packable(messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]) -> bool:
+        return (
+            settings.PACK_MAX_TICKETS > 1
+            and (response_format or {}).get("type") == "json_object"
+            and [m.get("role") for m in messages] == ["system", "user"]
+            and count_tokens(messages[1]["content"]) <= settings.PACK_MAX_TICKET_TOKENS
+        )
+
+    async def complete(
+        self,
+        client,
+        *,
+        agent: str,
+        messages: List[Dict[str, Any]],
+        shape: Optional[Dict[str, Any]] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> Optional[str]:
+        """
+        This prompt's answer from a packed call, or None if it should be asked alone.
+        """
+        if not self.packable(messages, response_format):
+            return None
+        loop = asyncio.get_running_loop()
+        system = messages[0]["content"]
+        key = (loop, id(client), agent, system, json.dumps(response_format, sort_keys=True))
+        pack = self._open.get(key)
+        if pack is None:
+            pack = self._open[key] = _Pack(agent, client, system, shape, response_format)
+            pack.timer = loop.call_later(settings.PACK_WINDOW_SECONDS, self._flush, key, pack)
+        future = loop.create_future()
+        pack.entries.append((messages[1]["content"], future))
+        if len(pack.entries) >= settings.PACK_MAX_TICKETS:
+            self._flush(key, pack)
+        content = await future
+        _packed.inc(agent=agent, outcome="packed" if content is not None else "unpacked")
+        return content
+
+    def _flush(self, key: Tuple, pack: _Pack) -> None:
+        if self._open.get(key) is not pack:
+            return
+        del self._open[key]
+        pack.timer.cancel()
+        if len(pack.entries) == 1:
+            # Nothing to share the instructions with.
+            future = pack.entries[0][1]
+            if not future.done():
+                future.set_result(None)
+            return
+        asyncio.ensure_future(self._send(pack))
+
+    async def _send(self, pack: _Pack) -> None:
+        from app.llm.tiers import acomplete_tiered, shape_errors
+
+        tickets = [{"id": str(i), "ticket": ticket} for i, (ticket, _) in enumerate(pack.entries)]
+        messages = [
+            {"role": "system", "content": f"{pack.system}\n\n{PACK_INSTRUCTIONS.strip()}"},
+            {"role": "user", "content": compact_json(tickets)},
+        ]
+        answers: Dict[str, Any] = {}
+        try:
+            # The call serves several tasks, so its tokens are not any one task's.
+            with request_options(task_id=None, agent=pack.agent, pack_prompts=False):
+                _pack_calls.inc(agent=pack.agent)
+                content = await acomplete_tiered(
+                    pack.client, agent=pack.agent, messages=messages, shape={"results": dict}, response_format=pack.response_format
+                )
+            answers = json.loads(content).get("results") or {}
+        except Exception:
+            logger.warning("Packed %s call for %d tickets failed, asking them one by one", pack.agent, len(tickets), exc_info=True)
+        for ticket, (_, future) in zip(tickets, pack.entries):
+            answer = answers.get(ticket["id"]) if isinstance(answers, dict) else None
+            content = json.dumps(answer) if isinstance(answer, dict) else None
+            if content is not None and shape_errors(content, pack.shape):
+                content = None
+            if not future.done():
+                future.set_result(content)
+
+
+@lru_cache(maxsize=1)
+def get_prompt_packer() -> PromptPacker:
+    return PromptPacker()
@@ -0,0 +1,170 @@
+"""
+Token-budgeted prompt construction shared by the agents.
+
+PromptBuilder splits every prompt in two:
+
+- the system message holds the agent's instructions and few-shot examples,
+  dedented, and is byte-identical for every ticket, so the provider's prompt
+  cache can serve that prefix;
+- the user message holds the ticket-specific parts: free text fitted to the
+  agent's token budget (PROMPT_TOKEN_BUDGET, or PROMPT_TOKEN_BUDGETS per
+  agent) and JSON serialized compactly.
+
+Oversized text, typically pasted logs, is first condensed by collapsing runs
+of lines that differ only in numbers (timestamps, PIDs, counters), then cut to
+its head and tail with a marker saying how much was left out.
+
+Tokens are counted locally: with tiktoken when it is installed and its
+encoding is available, otherwise estimated at ~4 characters per token. Each
+built prompt reports the tokens sent and saved (against the raw request and
+indented JSON) to app.metrics, per agent and per ticket.
+"""
+import json
+import re
+import textwrap
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import settings
+from app.llm.context import current_options
+from app.metrics import metrics
+
+# Share of a truncated text's budget kept from its start; the rest is its end.
+HEAD_SHARE = 0.6
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Not installed, or its BPE file cannot be fetched (e.g. offline).
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def token_budget(agent: str) -> int:
+    overrides = json.loads(settings.PROMPT_TOKEN_BUDGETS) if settings.PROMPT_TOKEN_BUDGETS else {}
+    return int(overrides.get(agent, settings.PROMPT_TOKEN_BUDGET))
+
+
+def collapse_repeats(text: str) -> str:
+    """
+    Replaces runs of lines that differ only in their digits with the first line
+    and a count of the rest.
+    """
+    lines = text.splitlines()
+    out: List[str] = []
+    run_key, run_length = None, 0
+    for line in lines + [None]:
+        key = None if line is None else re.sub(r"\d+", "0", line.strip())
+        if key is not None and key == run_key:
+            run_length += 1
+            continue
+        if run_length:
+            out.append(f"[... {run_length} similar line{'s' if run_length > 1 else ''} ...]")
+        if line is not None:
+            out.append(line)
+        run_key, run_length = key, 0
+    return "\n".join(out)
+
+
+def fit_text(text: str, budget: int) -> str:
+    """
+    Returns ``text`` unchanged if it fits in ``budget`` tokens, else condensed and
+    cut to its head and tail.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    text = collapse_repeats(text)
+    if count_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    if len(lines) < 3:
+        # One long line: cut by characters, at the estimate's ratio.
+        chars = len(text) * budget // max(1, count_tokens(text))
+        head = int(chars * HEAD_SHARE)
+        omitted = count_tokens(text[head:len(text) - (chars - head)])
+        return f"{text[:head]}\n[... ~{omitted} tokens omitted ...]\n{text[len(text) - (chars - head):]}"
+    head, tail = _take(lines, int(budget * HEAD_SHARE)), _take(lines[::-1], budget - int(budget * HEAD_SHARE))[::-1]
+    if len(head) + len(tail) >= len(lines):
+        return text
+    omitted = len(lines) - len(head) - len(tail)
+    return "\n".join(head + [f"[... {omitted} lines omitted ...]"] + tail)
+
+
+def _take(lines: List[str], budget: int) -> List[str]:
+    taken, used = [], 0
+    for line in lines:
+        used += count_tokens(line) + 1
+        if used > budget:
+            break
+        taken.append(line)
+    return taken
+
+
+@lru_cache(maxsize=64)
+def _instructions(raw: str) -> Tuple[str, int, int]:
+    text = textwrap.dedent(raw).strip()
+    return text, count_tokens(raw), count_tokens(text)
+
+
+class PromptBuilder:
+    """
+    Builds one agent's chat messages; see the module docstring.
+    """
+
+    def __init__(self, agent: str, instructions: str, budget: Optional[int] = None):
+        self.agent = agent
+        self.system, raw_tokens, sent_tokens = _instructions(instructions)
+        self.budget = token_budget(agent) if budget is None else budget
+        self.parts: List[str] = []
+        self.raw_tokens = raw_tokens
+        self.sent_tokens = sent_tokens
+        self._user_tokens = 0
+
+    def add_text(self, label: str, text: str) -> "PromptBuilder":
+        """
+        Adds free text (e.g. the ticket), fitted to what is left of the budget.
+        """
+        text = str(text or "")
+        fitted = fit_text(text, max(64, self.budget - self._user_tokens))
+        return self._add(f"{label}:\n{fitted}", count_tokens(text) - count_tokens(fitted))
+
+    def add_json(self, label: str, value: Any) -> "PromptBuilder":
+        compact = compact_json(value)
+        saved = count_tokens(json.dumps(value, indent=2, default=str)) - count_tokens(compact)
+        return self._add(f"{label}:\n{compact}", saved)
+
+    def add_line(self, text: str) -> "PromptBuilder":
+        return self._add(text, 0)
+
+    def _add(self, part: str, saved: int) -> "PromptBuilder":
+        tokens = count_tokens(part)
+        self.parts.append(part)
+        self._user_tokens += tokens
+        self.sent_tokens += tokens
+        self.raw_tokens += tokens + saved
+        return self
+
+    def build(self) -> List[Dict[str, str]]:
+        """
+        The messages to send; also records the tokens sent and saved.
+        """
+        metrics.observe_prompt(current_options().get("task_id"), self.agent, self.sent_tokens, self.raw_tokens - self.sent_tokens)
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": "\n\n".join(self.parts)},
+        ]
@@ -0,0 +1,196 @@
+"""
+Process-wide pacing of OpenAI calls.
+
+Every call reserves one request and its estimated tokens (prompt + expected
+completion) from two token buckets refilled at LLM_RATE_LIMIT_RPM/TPM. Callers
+that cannot be served yet wait in a priority queue: "interactive" calls (inline
+/execute, approvals) always go before "bulk" ones (background submissions),
+and within a priority callers are served in arrival order. A 429 pauses the
+whole limiter for the server's Retry-After, so one throttled call slows every
+caller instead of each of them hitting the limit in turn.
+
+The limiter is shared by sync callers (agent threads) and async callers on any
+event loop, so its state is guarded by a plain lock and waiters poll.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app import settings
+from app.llm.prompts import count_tokens
+from app.metrics import metrics
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+# Longest a waiter sleeps before re-checking the queue.
+_MAX_POLL_SECONDS = 0.25
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], completion_tokens: Optional[int] = None) -> int:
+    """
+    Token count of a chat request (counted locally, see app.llm.prompts) plus a
+    small per-message overhead, plus the completion we expect back.
+    """
+    prompt = sum(count_tokens(m.get("content") if isinstance(m.get("content"), str) else json.dumps(m.get("content"))) for m in messages)
+    expected = settings.LLM_EXPECTED_COMPLETION_TOKENS if completion_tokens is None else completion_tokens
+    return prompt + 4 * len(messages) + expected
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single call larger than the bucket may go once the bucket is full.
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    def __init__(self, rpm: int = 0, tpm: int = 0, headroom: float = 1.0, burst_seconds: float = 10.0):
+        self.requests = TokenBucket(rpm * headroom, burst_seconds) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm * headroom, burst_seconds) if tpm > 0 else None
+        self.blocked_until = 0.0
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wait_seconds = metrics.histogram("it_agent_llm_rate_limit_wait_seconds", "Time LLM calls waited for quota", ("priority",))
+        self._throttled = metrics.counter("it_agent_llm_throttled_total", "LLM calls answered with 429")
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _enqueue(self, priority: str) -> tuple:
+        entry = (PRIORITIES.get(priority, 0), next(self._seq))
+        with self._lock:
+            heapq.heappush(self._queue, entry)
+        return entry
+
+    def _try_acquire(self, entry: tuple, tokens: int) -> float:
+        """
+        Takes quota for ``entry`` and returns 0, or returns how long to wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = self.blocked_until - now
+            if self._queue[0] != entry:
+                # Someone ahead in the queue goes first.
+                return min(max(wait, 0.01), _MAX_POLL_SECONDS)
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                if bucket is not None:
+                    wait = max(wait, bucket.wait_time(amount, now))
+            if wait > 0:
+                return min(wait, _MAX_POLL_SECONDS)
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                if bucket is not None:
+                    bucket.take(min(amount, bucket.capacity))
+            heapq.heappop(self._queue)
+            return 0.0
+
+    def _abandon(self, entry: tuple) -> None:
+        with self._lock:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+
+    def acquire(self, tokens: int, priority: str = "interactive") -> None:
+        if not self.enabled and self.blocked_until <= time.monotonic():
+            return
+        start = time.monotonic()
+        entry = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_acquire(entry, tokens)
+                if not wait:
+                    break
+                time.sleep(wait)
+        except BaseException:
+            self._abandon(entry)
+            raise
+        self._wait_seconds.observe(time.monotonic() - start, priority=priority)
+
+    async def aacquire(self, tokens: int, priority: str = "interactive") -> None:
+        if not self.enabled and self.blocked_until <= time.monotonic():
+            return
+        start = time.monotonic()
+        entry = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_acquire(entry, tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._abandon(entry)
+            raise
+        self._wait_seconds.observe(time.monotonic() - start, priority=priority)
+
+    def settle(self, reserved: int, used: Optional[int]) -> None:
+        """
+        Returns over-reserved tokens (or charges the shortfall) once the real usage is known.
+        """
+        if self.tokens is None or used is None:
+            return
+        with self._lock:
+            self.tokens.give_back(reserved - used)
+
+    def throttled(self, retry_after: Optional[float]) -> None:
+        """
+        Called on a 429: nobody sends until the server's Retry-After has passed.
+        """
+        self._throttled.inc()
+        if retry_after:
+            with self._lock:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than the server's Retry-After.
+    """
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return max(retry_after or 0.0, random.uniform(0, ceiling))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(
+        settings.LLM_RATE_LIMIT_RPM,
+        settings.LLM_RATE_LIMIT_TPM,
+        settings.LLM_RATE_LIMIT_HEADROOM,
+        settings.LLM_RATE_LIMIT_BURST_SECONDS,
+    )
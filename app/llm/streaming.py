@@ -0,0 +1,63 @@
+"""
+Incremental extraction of one string field from a streamed JSON answer.
+
+With response_format=json_object the model streams raw JSON, e.g.
+'{"email_draft": "Hi te' ... 'am\\nThe disk..."}'. FieldStreamer forwards only the
+decoded text of a single top-level string field as it arrives, so a client
+can render the email draft token by token.
+"""
+import json
+import re
+from typing import Callable
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class FieldStreamer:
+    def __init__(self, field: str, emit: Callable[[str], None]):
+        self._opening = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._emit = emit
+        self._buffer = ""
+        self._inside = False
+        self._done = False
+
+    def feed(self, fragment: str) -> None:
+        if self._done:
+            return
+        self._buffer += fragment
+        if not self._inside:
+            match = self._opening.search(self._buffer)
+            if match is None:
+                return
+            self._inside = True
+            self._buffer = self._buffer[match.end():]
+        self._drain()
+
+    def _drain(self) -> None:
+        out = []
+        i = 0
+        buffer = self._buffer
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self._done = True
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence: wait until it is complete.
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(buffer):
+                    break
+                out.append(json.loads('"' + buffer[i:i + 6] + '"'))
+                i += 6
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._buffer = buffer[i:]
+        if out:
+            self._emit("".join(out))
@@ -0,0 +1,161 @@
+"""
+Model tiers and per-agent cascades.
+
+Agents name tiers, not models: LLM_MODEL_TIERS maps each tier ("fast",
+"strong", ...) to a model, and AGENT_MODEL_CASCADE lists the tiers each agent
+tries in order. complete_tiered() asks the first tier and only moves on to the
+next one when the answer is not JSON of the agent's expected shape (its
+required keys present, with the right types and not blank). The last tier's
+answer is returned whatever its shape.
+
+Per tier and agent, it_agent_llm_tier_seconds records latency and
+it_agent_llm_tier_calls_total counts answers accepted or escalated, which is
+what shows whether starting on the fast tier actually saves time.
+
+Bulk tickets may have their calls packed with others' first; see app.llm.packing.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import settings
+from app.llm.dispatch import acomplete, complete
+from app.llm.context import current_options
+from app.llm.packing import get_prompt_packer
+from app.metrics import metrics
+
+DEFAULT_TIERS: Dict[str, str] = {"fast": "gpt-4o-mini", "strong": "gpt-4o"}
+
+# Planning and drafting are cheap steps; diagnostics and scripts escalate.
+DEFAULT_CASCADES: Dict[str, List[str]] = {
+    "coordinator": ["fast"],
+    "diagnostic": ["fast", "strong"],
+    "automation": ["fast", "strong"],
+    "writer": ["fast"],
+}
+
+# Expected top-level keys of an answer and their types.
+Shape = Dict[str, Any]
+
+_tier_seconds = metrics.histogram("it_agent_llm_tier_seconds", "LLM call latency per agent and model tier", ("agent", "tier"))
+_tier_calls = metrics.counter(
+    "it_agent_llm_tier_calls_total",
+    "LLM answers per agent and tier (escalated = wrong shape, next tier asked)",
+    ("agent", "tier", "outcome"),
+)
+
+
+def model_tiers() -> Dict[str, str]:
+    overrides = json.loads(settings.LLM_MODEL_TIERS) if settings.LLM_MODEL_TIERS else {}
+    return {**DEFAULT_TIERS, **overrides}
+
+
+def cascade_for(agent: str) -> List[Tuple[str, str]]:
+    """
+    The (tier, model) pairs ``agent`` tries, in order.
+    """
+    overrides = json.loads(settings.AGENT_MODEL_CASCADE) if settings.AGENT_MODEL_CASCADE else {}
+    tiers = model_tiers()
+    names = overrides.get(agent) or DEFAULT_CASCADES.get(agent) or ["fast"]
+    return [(name, tiers[name]) for name in names]
+
+
+def shape_errors(content: str, shape: Optional[Shape]) -> List[str]:
+    """
+    What is wrong with ``content`` as an answer of the given shape (empty if nothing).
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as exc:
+        return [f"not JSON: {exc}"]
+    if not isinstance(data, dict):
+        return ["not a JSON object"]
+    errors = []
+    for key, expected in (shape or {}).items():
+        value = data.get(key)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            errors.append(f"missing {key}")
+        elif not isinstance(value, expected):
+            errors.append(f"{key} is {type(value).__name__}")
+    return errors
+
+
+def _accept(agent: str, tier: str, started: float, content: str, shape: Optional[Shape], last: bool) -> bool:
+    _tier_seconds.observe(time.perf_counter() - started, agent=agent, tier=tier)
+    if last or not shape_errors(content, shape):
+        _tier_calls.inc(agent=agent, tier=tier, outcome="accepted")
+        return True
+    _tier_calls.inc(agent=agent, tier=tier, outcome="escalated")
+    return False
+
+
+def complete_tiered(
+    client,
+    *,
+    agent: str,
+    messages: List[Dict[str, Any]],
+    shape: Optional[Shape] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    complete() down the agent's cascade until an answer has the expected shape.
+    Only the first tier streams to ``on_delta``.
+    """
+    cascade = cascade_for(agent)
+    for index, (tier, model) in enumerate(cascade):
+        started = time.perf_counter()
+        content = complete(
+            client, model=model, messages=messages, response_format=response_format, on_delta=on_delta if index == 0 else None
+        )
+        if _accept(agent, tier, started, content, shape, index == len(cascade) - 1):
+            return content
+
+
+async def acomplete_tiered(
+    client,
+    *,
+    agent: str,
+    messages: List[Dict[str, Any]],
+    shape: Optional[Shape] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Async variant of complete_tiered(). Under the ``pack_prompts`` request
+    option, short prompts are first offered to the prompt packer.
+    """
+    if on_delta is None and current_options().get("pack_prompts"):
+        content = await get_prompt_packer().complete(
+            client, agent=agent, messages=messages, shape=shape, response_format=response_format
+        )
+        if content is not None:
+            return content
+    cascade = cascade_for(agent)
+    for index, (tier, model) in enumerate(cascade):
+        started = time.perf_counter()
+        content = await acomplete(
+            client, model=model, messages=messages, response_format=response_format, on_delta=on_delta if index == 0 else None
+        )
+        if _accept(agent, tier, started, content, shape, index == len(cascade) - 1):
+            return content
+
+
+def tier_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Per agent and tier: answers, escalations, escalation rate and mean latency.
+    """
+    stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for agent in sorted(set(DEFAULT_CASCADES) | set(json.loads(settings.AGENT_MODEL_CASCADE or "{}"))):
+        for tier, model in cascade_for(agent):
+            accepted = _tier_calls.value(agent=agent, tier=tier, outcome="accepted")
+            escalated = _tier_calls.value(agent=agent, tier=tier, outcome="escalated")
+            calls = accepted + escalated
+            stats.setdefault(agent, {})[tier] = {
+                "model": model,
+                "calls": int(calls),
+                "escalated": int(escalated),
+                "escalation_rate": round(escalated / calls, 4) if calls else 0.0,
+                "mean_seconds": round(_tier_seconds.sum(agent=agent, tier=tier) / calls, 4) if calls else 0.0,
+            }
+    return stats
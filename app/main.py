@@ -1,15 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api import router
+from app.workflows.coordinator_graph import get_coordinator_graph
+from app.jobs import get_job_queue
+from app import settings
+from app.llm import get_async_client, get_client
+from app.storage import get_task_store
 
 
 import sys
 print("Python running at:", sys.executable)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the coordinator graph once at startup; requests share it.
+    get_coordinator_graph()
+    # Nothing opens an OpenAI client at import; do it here so the first ticket does not.
+    get_client()
+    get_async_client()
+    if settings.RETRIEVAL_ENABLED:
+        # Loads numpy and maps the index of resolved tickets.
+        from app.retrieval import get_retrieval_index
+
+        get_retrieval_index()
+    get_task_store().sweep()
+    get_job_queue().start()
+    yield
+    get_job_queue().stop()
+
+
 app = FastAPI(
     title="Agentic AI Microservice",
     description="Agentic LLM-powered microservice for IT request automation.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(router, prefix="/api/v1")
@@ -0,0 +1,220 @@
+"""
+Latency, token and cache instrumentation for the pipeline.
+
+Graph nodes, agent runs and LLM calls report here. Every observation feeds two
+views: process-wide aggregates rendered in the Prometheus text format by
+GET /metrics, and a per-task breakdown that the runner stores with the task
+and GET /tasks/{id} returns. The exposition format is simple enough that no
+client library is needed.
+
+Other modules add their own series with counter() and histogram().
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        # Per label set: [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.labels))
+        return int(series[-1]) if series else 0
+
+    def sum(self, **labels: Any) -> float:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.labels))
+        return series[-2] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {count:g}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {series[-1]:g}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]:g}")
+        return lines
+
+
+def merge_breakdowns(base: Optional[Dict[str, Any]], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Adds up two per-task breakdowns (e.g. the run before an approval and the run after it).
+    """
+    merged = dict(base or {})
+    for key, value in (extra or {}).items():
+        if isinstance(value, dict):
+            merged[key] = merge_breakdowns(merged.get(key), value)
+        elif isinstance(value, (int, float)) and isinstance(merged.get(key), (int, float)):
+            merged[key] = round(merged[key] + value, 6)
+        else:
+            merged[key] = value
+    return merged
+
+
+class MetricsRegistry:
+    """
+    Holds every metric series plus the not-yet-stored breakdown of in-flight tasks.
+    """
+
+    def __init__(self, max_tasks: int = 1024):
+        self.max_tasks = max_tasks
+        self._metrics: "OrderedDict[str, Any]" = OrderedDict()
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.node_seconds = self.histogram("it_agent_node_seconds", "Wall time per graph node", ("node",))
+        self.node_failures = self.counter("it_agent_node_failures_total", "Graph nodes that raised", ("node",))
+        self.agent_seconds = self.histogram("it_agent_agent_seconds", "Wall time per agent run", ("agent",))
+        self.agent_failures = self.counter("it_agent_agent_failures_total", "Agent runs that raised", ("agent",))
+        self.llm_seconds = self.histogram("it_agent_llm_seconds", "Wall time per LLM call", ("agent", "model"))
+        self.llm_calls = self.counter("it_agent_llm_calls_total", "LLM calls, by response cache outcome", ("agent", "model", "cache"))
+        self.llm_tokens = self.counter(
+            "it_agent_llm_tokens_total", "Tokens reported by the API (cached = provider prompt cache)", ("agent", "model", "kind")
+        )
+        self.prompt_tokens = self.counter(
+            "it_agent_prompt_tokens_total", "Prompt tokens counted locally (saved = removed by compaction/truncation)", ("agent", "kind")
+        )
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help, labels)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help, labels, buckets)
+            return self._metrics[name]
+
+    def _add_to_task(self, task_id: Optional[str], section: str, name: str, values: Dict[str, float]) -> None:
+        if not task_id:
+            return
+        with self._lock:
+            breakdown = self._tasks.setdefault(task_id, {})
+            self._tasks.move_to_end(task_id)
+            entry = breakdown.setdefault(section, {}).setdefault(name, {})
+            for key, value in values.items():
+                entry[key] = round(entry.get(key, 0) + value, 6)
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+
+    def observe_node(self, task_id: Optional[str], node: str, seconds: float, failed: bool = False) -> None:
+        self.node_seconds.observe(seconds, node=node)
+        if failed:
+            self.node_failures.inc(node=node)
+        self._add_to_task(task_id, "nodes", node, {"seconds": seconds, "calls": 1})
+
+    def observe_agent(self, task_id: Optional[str], agent: str, seconds: float, failed: bool = False) -> None:
+        self.agent_seconds.observe(seconds, agent=agent)
+        if failed:
+            self.agent_failures.inc(agent=agent)
+        self._add_to_task(task_id, "agents", agent, {"seconds": seconds, "runs": 1, "failures": int(failed)})
+
+    def observe_llm(
+        self,
+        task_id: Optional[str],
+        agent: str,
+        model: str,
+        seconds: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        cache_hit: bool = False,
+    ) -> None:
+        self.llm_seconds.observe(seconds, agent=agent, model=model)
+        self.llm_calls.inc(agent=agent, model=model, cache="hit" if cache_hit else "miss")
+        for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens), ("cached", cached_tokens)):
+            if count:
+                self.llm_tokens.inc(count, agent=agent, model=model, kind=kind)
+        self._add_to_task(task_id, "llm", agent, {
+            "calls": 1,
+            "cache_hits": int(cache_hit),
+            "seconds": seconds,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+        })
+
+    def observe_prompt(self, task_id: Optional[str], agent: str, sent_tokens: int, saved_tokens: int) -> None:
+        self.prompt_tokens.inc(sent_tokens, agent=agent, kind="sent")
+        if saved_tokens:
+            self.prompt_tokens.inc(saved_tokens, agent=agent, kind="saved")
+        self._add_to_task(task_id, "prompt", agent, {"tokens_sent": sent_tokens, "tokens_saved": saved_tokens})
+
+    def pop_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        Hands over (and forgets) what was recorded for the task since the last call.
+        """
+        with self._lock:
+            return self._tasks.pop(task_id, {})
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(max_tasks=settings.METRICS_MAX_TASKS)
@@ -1,9 +1,16 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
 
 class ExecuteRequest(BaseModel):
     request: str
     require_approval: bool = False
+    merge_mode: Optional[Literal["local", "narrative"]] = None  # defaults to settings.MERGE_MODE
+    bypass_cache: bool = False  # skip the LLM response cache for this ticket
+    background: bool = False  # return 202 + task_id immediately and run on the worker pool
+    stream_tokens: bool = False  # publish the writer's email_draft tokens on GET /tasks/{id}/stream
+    priority: Optional[Literal["interactive", "bulk"]] = None  # LLM rate-limit queue; defaults to bulk for background
+    speculative: Optional[bool] = None  # run read-only agents while waiting for approval; defaults to settings.SPECULATIVE_EXECUTION
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # deadline of each run of this ticket; defaults to settings.REQUEST_TIMEOUT_SECONDS
 
 class TaskResponse(BaseModel):
     task_id: str
@@ -20,4 +27,11 @@ class TaskStatusResponse(BaseModel):
     diagnosis: Optional[Dict[str, Any]] = None
     script: Optional[Dict[str, Any]] = None
     email_draft: Optional[str] = None
-    duration_seconds: Optional[int] = None  # If you want to expose planning stage as well
+    duration_seconds: Optional[float] = None  # Whole pipeline, excluding time waiting for approval
+    error: Optional[str] = None
+    metrics: Optional[Dict[str, Any]] = None  # seconds per node and agent; LLM calls, tokens and cache hits per agent
+    profiled: bool = False  # a profile of the run can be downloaded from GET /tasks/{id}/profile
+
+class ProfilingUpdate(BaseModel):
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)  # share of runs to profile; None leaves it unchanged
+    next_runs: Optional[int] = Field(None, ge=0)  # profile this many of the next runs regardless of the rate
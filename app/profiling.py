@@ -0,0 +1,341 @@
+"""
+Opt-in sampling profiler for graph runs.
+
+A run is profiled when its request carries the PROFILE_HEADER header, when it
+is picked by PROFILE_SAMPLE_RATE, or when an operator asked for the next runs
+through PUT /admin/profiling. While at least one run is profiled, a daemon
+thread wakes every PROFILE_INTERVAL_SECONDS and records a stack for each place
+the run is at:
+
+- the event loop thread, when the task on it belongs to the run;
+- each of the run's suspended asyncio tasks, as its chain of awaiting
+  coroutines ending in "<await ...>" (the time spent on the network, in the
+  rate limiter or waiting for the loop);
+- executor threads (asyncio.to_thread, the agent pool) running a function in
+  the run's context.
+
+A task belongs to the run if it was created in the run's context. A task
+factory records this and is only installed while a run on that loop is being
+profiled. With nothing profiled there is no thread and no hook, and a run
+pays for one check of the header and the sample rate.
+
+Samples are kept as collapsed stacks ("frame;frame;frame" -> count), stored
+with the task, and exported as collapsed-stack text (flamegraph.pl, inferno)
+or speedscope JSON.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import thread as _futures_thread
+from typing import Any, Dict, List, Optional
+
+from app import settings
+from app.llm.context import current_options
+
+logger = logging.getLogger(__name__)
+
+# Distinct stacks kept per profile; further new stacks are counted as "<truncated>".
+MAX_STACKS = 5000
+MAX_DEPTH = 128
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+# The frame executor threads run work items in (a private API). Without it,
+# samples from executor threads are not attributed to runs.
+_WORK_ITEM_RUN = getattr(getattr(getattr(_futures_thread, "_WorkItem", None), "run", None), "__code__", None)
+
+
+class Profile:
+    def __init__(self, task_id: str, interval: float):
+        self.task_id = task_id
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        # The run's unfinished tasks; read from the sampler thread as a snapshot.
+        self.tasks: "set[asyncio.Task]" = set()
+        self.token: Optional[contextvars.Token] = None
+        self.samples: Counter = Counter()
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def own(self, task: asyncio.Task) -> None:
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def add(self, stack: List[str]) -> None:
+        key = ";".join(stack)
+        if key not in self.samples and len(self.samples) >= MAX_STACKS:
+            key = "<truncated>"
+        self.samples[key] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "seconds": round(self.seconds, 3),
+            "sample_count": sum(self.samples.values()),
+            "samples": dict(self.samples),
+        }
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(path: str) -> str:
+    # Relative to the sys.path entry it was imported from, e.g. "app/runner.py".
+    roots = [root or os.getcwd() for root in sys.path]
+    roots = [root for root in roots if path.startswith(root + os.sep)]
+    return path[len(max(roots, key=len)) + 1 :] if roots else path
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    stack = []
+    awaitable = task.get_coro()
+    while len(stack) < MAX_DEPTH:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    stack.append(f"<await {type(awaitable).__name__}>")
+    return stack
+
+
+def _thread_context(frame) -> Optional[contextvars.Context]:
+    """
+    The context an executor thread is running its work item in, if any.
+    """
+    if _WORK_ITEM_RUN is None:
+        return None
+    while frame is not None:
+        if frame.f_code is _WORK_ITEM_RUN:
+            fn = getattr(frame.f_locals.get("self"), "fn", None)
+            while isinstance(fn, functools.partial):
+                fn = fn.func
+            owner = getattr(fn, "__self__", None)
+            return owner if isinstance(owner, contextvars.Context) else None
+        frame = frame.f_back
+    return None
+
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: "set[Profile]" = set()
+        self._thread: Optional[threading.Thread] = None
+        # Loop -> number of runs on it being profiled (the task factory is installed while > 0).
+        self._hooked: Dict[asyncio.AbstractEventLoop, int] = {}
+        # Set through PUT /admin/profiling; None falls back to settings.PROFILE_SAMPLE_RATE.
+        self.sample_rate: Optional[float] = None
+        self.next_runs = 0
+        self.profiled_runs = 0
+
+    def wanted(self) -> bool:
+        """
+        Whether the run about to start should be profiled.
+        """
+        if current_options().get("profile"):
+            return True
+        if self.next_runs:
+            with self._lock:
+                if self.next_runs:
+                    self.next_runs -= 1
+                    return True
+        rate = settings.PROFILE_SAMPLE_RATE if self.sample_rate is None else self.sample_rate
+        return rate > 0 and random.random() < rate
+
+    def start(self, task_id: str) -> Profile:
+        """
+        Starts profiling the calling task (a graph run) and everything it spawns.
+        """
+        profile = Profile(task_id, max(0.001, settings.PROFILE_INTERVAL_SECONDS))
+        profile.token = _current.set(profile)
+        profile.own(asyncio.current_task())
+        self._hook(profile.loop)
+        with self._lock:
+            self._profiles.add(profile)
+            self.profiled_runs += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> Dict[str, Any]:
+        with self._lock:
+            self._profiles.discard(profile)
+        _current.reset(profile.token)
+        self._unhook(profile.loop)
+        profile.seconds = time.perf_counter() - profile.started
+        return profile.to_dict()
+
+    def configure(self, sample_rate: Optional[float] = None, next_runs: Optional[int] = None) -> None:
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if next_runs is not None:
+                self.next_runs = next_runs
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sample_rate": settings.PROFILE_SAMPLE_RATE if self.sample_rate is None else self.sample_rate,
+                "next_runs": self.next_runs,
+                "active": len(self._profiles),
+                "profiled_runs": self.profiled_runs,
+                "header": settings.PROFILE_HEADER,
+            }
+
+    # --- task ownership ---
+
+    def _hook(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called on the loop's own thread, like _unhook.
+        with self._lock:
+            count = self._hooked.get(loop, 0)
+            self._hooked[loop] = count + 1
+        if count:
+            return
+        previous = loop.get_task_factory()
+
+        def factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            context = kwargs.get("context")
+            profile = context.get(_current) if context is not None else _current.get()
+            if profile is not None:
+                profile.own(task)
+            return task
+
+        factory.previous = previous
+        loop.set_task_factory(factory)
+
+    def _unhook(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            self._hooked[loop] -= 1
+            if self._hooked[loop]:
+                return
+            del self._hooked[loop]
+        factory = loop.get_task_factory()
+        if hasattr(factory, "previous"):
+            loop.set_task_factory(factory.previous)
+
+    # --- sampling ---
+
+    def _sample(self) -> None:
+        failing = False
+        try:
+            while True:
+                with self._lock:
+                    profiles = list(self._profiles)
+                    if not profiles:
+                        self._thread = None
+                        return
+                try:
+                    self._sweep(profiles)
+                    failing = False
+                except Exception:
+                    # Losing a sample is fine; losing the sampler is not. Log once per streak.
+                    if not failing:
+                        logger.warning("Profiler sample failed", exc_info=True)
+                    failing = True
+                time.sleep(profiles[0].interval)
+        finally:
+            # Should the thread die anyway, the next profiled run starts a new one.
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _sweep(self, profiles: List[Profile]) -> None:
+        me = threading.get_ident()
+        frames = sys._current_frames()
+        running = {}
+        for profile in profiles:
+            if profile.loop_thread not in running:
+                running[profile.loop_thread] = asyncio.current_task(profile.loop)
+        for thread_id, frame in frames.items():
+            if thread_id == me:
+                continue
+            if thread_id in running:
+                for profile in profiles:
+                    if running[thread_id] in profile.tasks:
+                        profile.add(_stack(frame))
+                continue
+            context = _thread_context(frame)
+            owner = context.get(_current) if context is not None else None
+            if owner in profiles:
+                owner.add(_stack(frame))
+        for profile in profiles:
+            current = running[profile.loop_thread]
+            for task in tuple(profile.tasks):
+                if task is not current and not task.done():
+                    profile.add(_await_stack(task))
+
+
+profiler = Profiler()
+
+
+def merge_profiles(previous: Optional[Dict[str, Any]], latest: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds a run's profile to the one stored for the task by an earlier run (before approval).
+    """
+    if not previous:
+        return latest
+    samples = Counter(previous["samples"])
+    samples.update(latest["samples"])
+    return {
+        "interval_seconds": latest["interval_seconds"],
+        "seconds": round(previous["seconds"] + latest["seconds"], 3),
+        "sample_count": previous["sample_count"] + latest["sample_count"],
+        "samples": dict(samples),
+    }
+
+
+def collapsed(profile: Dict[str, Any]) -> str:
+    """
+    Collapsed-stack text, one "frame;frame;frame count" line per stack.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(profile["samples"].items()))
+
+
+def speedscope(profile: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """
+    The profile as a speedscope "sampled" profile, weighted in seconds.
+    """
+    frames: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in profile["samples"].items():
+        samples.append([frames.setdefault(frame, len(frames)) for frame in stack.split(";")])
+        weights.append(count * profile["interval_seconds"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "it-support-agent",
+        "activeProfileIndex": 0,
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
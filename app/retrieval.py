@@ -0,0 +1,300 @@
+"""
+Local retrieval index over resolved tickets.
+
+Every completed task's request is indexed with its results (diagnosis, script,
+email draft). DiagnosticAgent looks a new ticket up before asking the LLM: a
+near-identical past ticket (cosine similarity at least RETRIEVAL_REUSE_SIMILARITY)
+has its diagnosis returned as is, and otherwise the RETRIEVAL_TOP_K most similar
+ones above RETRIEVAL_CONTEXT_SIMILARITY are added to the prompt as compact context.
+
+Requests are embedded as hashed TF-IDF vectors: words and word pairs, hashed
+with a random sign into RETRIEVAL_DIMENSIONS buckets, weighted by sublinear term
+frequency times the inverse document frequency known when the ticket was
+added, and L2-normalized. A lookup is one matrix-vector product over all rows,
+a few milliseconds for 100k tickets.
+
+The index holds at most RETRIEVAL_MAX_ROWS tickets. Past that, each new ticket
+takes the slot of the oldest one, so memory (or disk) stays flat however
+many tickets are resolved.
+
+With RETRIEVAL_INDEX_PATH set, the index lives in that directory and is
+memory-mapped, so a restart reopens it without re-embedding anything:
+
+- vectors.f32: float32 rows, grown by doubling up to the row cap;
+- docs.bin: each ticket's payload as a fixed-size JSON record in the row's
+  slot, tagged with the ticket's sequence number;
+- meta.json: tickets added and document frequencies, replaced atomically after
+  each row is written. A row written after the last meta.json (crash mid-add)
+  is dropped on load.
+
+Only one process may write a given directory; give each uvicorn worker its own.
+Without a path the index is kept in memory.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import settings
+from app.llm.context import current_options
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+# Bytes per payload record on disk; a ticket whose payload does not fit is not indexed.
+RECORD_BYTES = 4096
+# Stored with each ticket; the rest of a result (timings, status) is not reused.
+RESULT_KEYS = ("diagnosis", "script", "email_draft")
+MAX_REQUEST_CHARS = 2000
+
+_lookups = metrics.counter(
+    "it_agent_retrieval_total", "DiagnosticAgent index lookups by outcome (reused, grounded, none)", ("outcome",)
+)
+_lookup_seconds = metrics.histogram("it_agent_retrieval_seconds", "Retrieval index lookup latency", ())
+
+
+def _features(text: str) -> Counter:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def _buckets(features: Counter, dimensions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bucket index and signed sublinear weight of each feature.
+    """
+    hashes = [zlib.crc32(feature.encode("utf-8")) for feature in features]
+    index = np.array([h % dimensions for h in hashes], dtype=np.int64)
+    weight = np.array(
+        [(1.0 + math.log(count)) * (1.0 if (h // dimensions) & 1 else -1.0) for h, count in zip(hashes, features.values())],
+        dtype=np.float32,
+    )
+    return index, weight
+
+
+class RetrievalIndex:
+    def __init__(self, path: str = "", dimensions: int = 512, max_rows: int = 100_000):
+        self.path = path
+        self.dimensions = dimensions
+        self.max_rows = max(1, max_rows)
+        self._lock = threading.Lock()
+        # Tickets ever added; the one with sequence number n lives in slot n % max_rows.
+        self._added = 0
+        self._df = np.zeros(dimensions, dtype=np.int64)
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+        else:
+            self._vectors = np.zeros((min(INITIAL_CAPACITY, self.max_rows), dimensions), dtype=np.float32)
+
+    @property
+    def _count(self) -> int:
+        return min(self._added, self.max_rows)
+
+    # --- persistence ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        meta_path = self._file("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dimensions"] != self.dimensions:
+                raise ValueError(f"Index at {self.path} has {meta['dimensions']} dimensions, not {self.dimensions}")
+            if meta["max_rows"] != self.max_rows:
+                raise ValueError(f"Index at {self.path} holds {meta['max_rows']} rows, not {self.max_rows}")
+            self._added = meta["added"]
+            self._df = np.array(meta["df"], dtype=np.int64)
+        capacity = min(INITIAL_CAPACITY, self.max_rows)
+        while capacity < self._count:
+            capacity = min(2 * capacity, self.max_rows)
+        self._map(max(capacity, self._rows_on_disk()))
+        # A row written after the last meta.json (crash mid-add) is dropped.
+        slot = self._added % self.max_rows
+        record = self._payload(slot) if slot < len(self._vectors) else None
+        if record is not None and record["seq"] >= self._added:
+            self._vectors[slot] = 0
+            self._records[slot] = 0
+
+    def _rows_on_disk(self) -> int:
+        vectors = self._file("vectors.f32")
+        return os.path.getsize(vectors) // (4 * self.dimensions) if os.path.exists(vectors) else 0
+
+    def _map(self, capacity: int) -> None:
+        for name, size in (("vectors.f32", capacity * 4 * self.dimensions), ("docs.bin", capacity * RECORD_BYTES)):
+            with open(self._file(name), "a+b") as f:
+                if os.path.getsize(self._file(name)) < size:
+                    f.truncate(size)
+        self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        # An all-zero record is an empty slot.
+        self._records = np.memmap(self._file("docs.bin"), dtype=np.uint8, mode="r+", shape=(capacity, RECORD_BYTES))
+
+    def _grow(self) -> None:
+        capacity = min(2 * len(self._vectors), self.max_rows)
+        if self.path:
+            self._vectors.flush()
+            self._records.flush()
+            self._map(capacity)
+        else:
+            grown = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            grown[: self._count] = self._vectors[: self._count]
+            self._vectors = grown
+
+    def _write_meta(self) -> None:
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dimensions": self.dimensions, "max_rows": self.max_rows, "added": self._added, "df": self._df.tolist()}, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    # --- indexing and lookup ---
+
+    def _embed(self, text: str, df: np.ndarray, count: int) -> np.ndarray:
+        index, weight = _buckets(_features(text), self.dimensions)
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        np.add.at(vector, index, weight)
+        vector *= np.log((1.0 + count) / (1.0 + df)).astype(np.float32) + 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, task_id: str, request: str, results: Dict[str, Any]) -> None:
+        request = request[:MAX_REQUEST_CHARS]
+        payload = {"task_id": task_id, "request": request, **{key: results.get(key) for key in RESULT_KEYS}}
+        buckets = np.unique(_buckets(_features(request), self.dimensions)[0])
+        with self._lock:
+            slot = self._added % self.max_rows
+            if self.path:
+                record = json.dumps({**payload, "seq": self._added}, default=str).encode("utf-8")
+                if len(record) > RECORD_BYTES:
+                    return
+            if slot == len(self._vectors) and self._added < self.max_rows:
+                self._grow()
+            if self._added >= self.max_rows:
+                self._evict(slot)
+            if self.path:
+                # The record first: a vector is never left next to another ticket's
+                # payload. No msync per row: the page cache keeps the rows if the process dies.
+                self._records[slot] = 0
+                self._records[slot, : len(record)] = np.frombuffer(record, dtype=np.uint8)
+            elif slot == len(self._docs):
+                self._docs.append(payload)
+            else:
+                self._docs[slot] = payload
+            self._df[buckets] += 1
+            self._vectors[slot] = self._embed(request, self._df, self._count + (self._added < self.max_rows))
+            self._added += 1
+            if self.path:
+                self._write_meta()
+
+    def _evict(self, slot: int) -> None:
+        """
+        Forgets the ticket in ``slot`` (the oldest) before it is overwritten.
+        """
+        old = self._payload(slot)
+        if old is not None:
+            self._df[np.unique(_buckets(_features(old["request"]), self.dimensions)[0])] -= 1
+
+    def search(self, request: str, k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        The ``k`` most similar indexed tickets as (cosine similarity, payload), best first.
+        """
+        with self._lock:
+            if not self._count:
+                return []
+            query = self._embed(request[:MAX_REQUEST_CHARS], self._df, self._count)
+            scores = self._vectors[: self._count] @ query
+            k = min(k, self._count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = ((float(scores[i]), self._payload(int(i))) for i in top)
+            return [(score, payload) for score, payload in matches if payload is not None]
+
+    def _payload(self, slot: int) -> Optional[Dict[str, Any]]:
+        if not self.path:
+            return self._docs[slot]
+        record = self._records[slot].tobytes().rstrip(b"\0")
+        return json.loads(record) if record else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._added = 0
+            self._df[:] = 0
+            self._docs.clear()
+            if self.path:
+                self._records[:] = 0
+                self._write_meta()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = {outcome: int(_lookups.value(outcome=outcome)) for outcome in ("reused", "grounded", "none")}
+        return {
+            "tickets": self._count,
+            "max_rows": self.max_rows,
+            "dimensions": self.dimensions,
+            "path": self.path or None,
+            "lookups": lookups,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_retrieval_index() -> RetrievalIndex:
+    return RetrievalIndex(settings.RETRIEVAL_INDEX_PATH, settings.RETRIEVAL_DIMENSIONS, settings.RETRIEVAL_MAX_ROWS)
+
+
+def recall(request: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    For DiagnosticAgent: (a past diagnosis to return as is, or None; compact
+    past resolutions to add to the prompt). Tickets that bypass the cache are
+    never answered from the index.
+    """
+    if not settings.RETRIEVAL_ENABLED:
+        return None, []
+    started = time.perf_counter()
+    matches = get_retrieval_index().search(request, max(1, settings.RETRIEVAL_TOP_K))
+    _lookup_seconds.observe(time.perf_counter() - started)
+    diagnoses = [(score, payload) for score, payload in matches if isinstance(payload.get("diagnosis"), dict)]
+    if diagnoses and diagnoses[0][0] >= settings.RETRIEVAL_REUSE_SIMILARITY and not current_options().get("bypass_cache"):
+        score, payload = diagnoses[0]
+        _lookups.inc(outcome="reused")
+        return {**payload["diagnosis"], "retrieved_from": payload["task_id"], "similarity": round(score, 3)}, []
+    context = [
+        {
+            "request": payload["request"],
+            "root_cause": payload["diagnosis"].get("root_cause"),
+            "solutions": [s.get("title") for s in payload["diagnosis"].get("solutions") or [] if isinstance(s, dict)],
+        }
+        for score, payload in diagnoses
+        if score >= settings.RETRIEVAL_CONTEXT_SIMILARITY
+    ]
+    _lookups.inc(outcome="grounded" if context else "none")
+    return None, context
+
+
+def index_resolution(task_id: str, state: Dict[str, Any]) -> None:
+    """
+    Adds a completed task to the index, unless its diagnosis came from the index.
+    """
+    results = state.get("results") or {}
+    diagnosis = results.get("diagnosis")
+    if not settings.RETRIEVAL_ENABLED or state.get("status") != "completed" or not isinstance(diagnosis, dict):
+        return
+    if "retrieved_from" in diagnosis:
+        return
+    try:
+        get_retrieval_index().add(task_id, state.get("request") or "", results)
+    except Exception:
+        # The index is an optimization; the task itself has completed.
+        logger.warning("Could not index task %s", task_id, exc_info=True)
@@ -0,0 +1,288 @@
+"""
+Runs the coordinator graph for a task and records its progress.
+
+Both the inline /execute path and background jobs go through run_graph(), so
+GET /tasks/{id} reports the same intermediate states either way:
+queued -> planning -> running_agents -> merging -> completed/failed
+(or waiting_approval after planning when approval is required, and
+retrying -> running_agents while failed agents are retried).
+
+Each run has a deadline (see app.deadlines). A run out of time ends as
+timed_out, and one cancelled (its client went away) as cancelled; both keep
+the agent outputs produced so far, merged locally.
+"""
+import asyncio
+import contextlib
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+from app import settings
+from app.admission import Grant
+from app.agents.coordinator import merge_agent_outputs
+from app.coalescing import coalesce_key, single_flight
+from app.deadlines import deadline_in
+from app.events import event_bus
+from app.llm import request_options
+from app.metrics import merge_breakdowns, metrics
+from app.models import ExecuteRequest
+from app.profiling import merge_profiles, profiler
+from app.speculation import speculator
+from app.storage import get_task_store
+from app.workflows.coordinator_graph import get_coordinator_graph
+
+_store = get_task_store()
+# Dict-like views over the configured store (see app.storage). Assign records
+# back after changing them; in-place mutation is not persisted.
+TASKS = _store.tasks
+PLANS = _store.plans
+
+# Status to report once a node has finished, unless the node itself ended the run.
+STATUS_AFTER_NODE = {
+    "plan_node": "running_agents",
+    "approval_pause_node": "running_agents",
+    "run_agents_node": "merging",
+}
+TERMINAL_NODE_STATUSES = ("waiting_approval", "failed", "timed_out")
+
+# (coalesce key, leader task id, future of the leader's final state); see join_flight.
+Flight = Tuple[Any, str, Future]
+
+_coalesced = metrics.counter(
+    "it_agent_coalesced_total", "Submissions by role in single-flight coalescing (leader ran the graph)", ("role",)
+)
+
+
+def set_status(task_id: str, status: str, **fields: Any) -> None:
+    task = {**TASKS.get(task_id, {}), **fields, "status": status}
+    TASKS[task_id] = task
+    event_bus.publish(task_id, "status", status=status, error=fields.get("error"))
+
+
+def ticket_context(task_id: str, request: ExecuteRequest, bulk: bool = False) -> Dict[str, Any]:
+    """
+    The graph input for a submitted ticket. Bulk tickets (background or
+    batch-imported) default to the bulk LLM priority.
+    """
+    return {
+        "task_id": task_id,
+        "request": request.request,
+        "require_approval": request.require_approval,
+        "merge_mode": request.merge_mode,
+        "bypass_cache": request.bypass_cache,
+        "stream_tokens": request.stream_tokens,
+        "priority": request.priority or ("bulk" if bulk else "interactive"),
+        "speculative": settings.SPECULATIVE_EXECUTION if request.speculative is None else request.speculative,
+        "timeout_seconds": request.timeout_seconds,
+    }
+
+
+def task_metrics(task_id: str) -> Dict[str, Any]:
+    """
+    The task's stored per-node/agent/LLM breakdown plus what this process recorded since.
+    """
+    return merge_breakdowns(TASKS.get(task_id, {}).get("metrics"), metrics.pop_task(task_id))
+
+
+def record_outcome(task_id: str, state: Dict[str, Any]) -> None:
+    status = state["status"]
+    previous = TASKS.get(task_id, {})
+    request = state.get("request") or previous.get("request")
+    breakdown = task_metrics(task_id)
+    if status == "waiting_approval":
+        # Store in PLANS for approval
+        PLANS[task_id] = state
+        TASKS[task_id] = {"status": status, "plan": state.get("plan"), "request": request, "metrics": breakdown}
+        event_bus.publish(task_id, "status", status=status, plan=state.get("plan"))
+    else:
+        PLANS.pop(task_id, None)
+        TASKS[task_id] = {
+            "status": status,
+            "result": state.get("results"),
+            "error": state.get("error"),
+            "request": request,
+            "metrics": breakdown,
+        }
+        event_bus.publish(task_id, "status", status=status, result=state.get("results"), error=state.get("error"))
+
+
+async def run_graph(task_id: str, graph_input: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Runs the graph for ``task_id`` (or resumes it when ``graph_input`` is None),
+    updating the task's status as each node finishes. A run picked for
+    profiling (see app.profiling) stores its profile with the task, whatever
+    the outcome.
+
+    Returns:
+        Dict: The final graph state.
+    """
+    if not profiler.wanted():
+        return await _run_graph(task_id, graph_input)
+    previous = TASKS.get(task_id, {}).get("profile")
+    profile = profiler.start(task_id)
+    try:
+        return await _run_graph(task_id, graph_input)
+    finally:
+        TASKS[task_id] = {**TASKS.get(task_id, {}), "profile": merge_profiles(previous, profiler.stop(profile))}
+
+
+async def _run_graph(task_id: str, graph_input: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    graph = get_coordinator_graph()
+    config = {"configurable": {"thread_id": task_id}}
+    ticket = graph_input if graph_input is not None else PLANS.get(task_id, {})
+    timeout = ticket.get("timeout_seconds") or settings.REQUEST_TIMEOUT_SECONDS
+    set_status(task_id, "planning" if graph_input is not None else "running_agents")
+    try:
+        # Nodes wind down by themselves at the deadline; the grace period only
+        # catches work that cannot (e.g. a plan call that ignores its timeout).
+        async with asyncio.timeout(timeout + settings.DEADLINE_GRACE_SECONDS if timeout > 0 else None):
+            with request_options(deadline=deadline_in(timeout)):
+                async for update in graph.astream(graph_input, config=config, stream_mode="updates"):
+                    for node, values in update.items():
+                        node_status = values.get("status") if isinstance(values, dict) else None
+                        if node_status == "retrying":
+                            set_status(task_id, "retrying", error=values.get("error"))
+                        elif node in STATUS_AFTER_NODE and node_status not in TERMINAL_NODE_STATUSES:
+                            set_status(task_id, STATUS_AFTER_NODE[node])
+    except TimeoutError as exc:
+        return await stop_run(task_id, "timed_out", str(exc) or f"Run exceeded its {timeout:g}s deadline")
+    except asyncio.CancelledError:
+        await stop_run(task_id, "cancelled", "Cancelled before completion")
+        raise
+    except Exception as exc:
+        set_status(task_id, "failed", error=str(exc), metrics=task_metrics(task_id))
+        raise
+    state = (await graph.aget_state(config)).values
+    record_outcome(task_id, state)
+    _index_resolution(task_id, state)
+    _maybe_speculate(task_id, state)
+    if state.get("status") != "waiting_approval":
+        # Nothing will resume this thread again.
+        await asyncio.to_thread(_store.release, task_id)
+    _store.note_write()
+    return state
+
+
+def _streamed_outputs(task_id: str) -> Dict[str, Any]:
+    # Agent outputs of the interrupted node never reached a checkpoint, but
+    # each was published as soon as it existed.
+    return {event.data["agent"]: event.data["output"] for event in event_bus.history(task_id) if event.type == "agent_output"}
+
+
+async def stop_run(task_id: str, status: str, error: str) -> Dict[str, Any]:
+    """
+    Ends an interrupted run as ``status`` (timed_out or cancelled), keeping the
+    agent outputs produced so far, and releases its checkpoint.
+    """
+    config = {"configurable": {"thread_id": task_id}}
+    state = (await get_coordinator_graph().aget_state(config)).values or {}
+    outputs = {**_streamed_outputs(task_id), **(state.get("results") or {})}
+    results = {**merge_agent_outputs(outputs), "status": status} if outputs else None
+    state = {**state, "task_id": task_id, "status": status, "error": error, "results": results}
+    record_outcome(task_id, state)
+    await asyncio.to_thread(_store.release, task_id)
+    _store.note_write()
+    return state
+
+
+def join_flight(task_id: str, context: Dict[str, Any]) -> Optional[Flight]:
+    """
+    Joins the single flight of tickets identical to this one, or starts it
+    with ``task_id`` as its leader. None when the ticket does not coalesce.
+    """
+    if not settings.COALESCE_ENABLED or context.get("bypass_cache"):
+        return None
+    key = coalesce_key(context)
+    return (key, *single_flight.join(key, task_id))
+
+
+def leads(task_id: str, flight: Optional[Flight]) -> bool:
+    """
+    Whether ``task_id`` runs the graph itself (it leads its flight, or does not coalesce).
+    """
+    return flight is None or flight[1] == task_id
+
+
+def abandon_flight(task_id: str, flight: Optional[Flight], exc: BaseException) -> None:
+    """
+    Ends a flight whose leader will never run (e.g. refused admission), failing its followers with ``exc``.
+    """
+    if flight is not None and leads(task_id, flight):
+        single_flight.finish(flight[0], exc=exc)
+
+
+async def run_coalesced(task_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Like run_graph(task_id, context), but a ticket identical to one already in
+    flight waits for that run and adopts its outcome under its own task_id.
+    """
+    return await run_flight(task_id, context, join_flight(task_id, context))
+
+
+async def run_flight(
+    task_id: str, context: Dict[str, Any], flight: Optional[Flight], grant: Optional[Grant] = None
+) -> Dict[str, Any]:
+    """
+    Runs the ticket as the leader of ``flight`` (see join_flight), within
+    ``grant``'s admission slot, or waits for the leader's outcome as a
+    follower. Followers never hold a slot.
+    """
+    if leads(task_id, flight):
+        if flight is None:
+            async with grant or contextlib.nullcontext():
+                return await run_graph(task_id, context)
+        key = flight[0]
+        _coalesced.inc(role="leader")
+        try:
+            async with grant or contextlib.nullcontext():
+                state = await run_graph(task_id, context)
+        except Exception as exc:
+            single_flight.finish(key, exc=exc)
+            raise
+        except BaseException:
+            single_flight.finish(key, exc=RuntimeError(f"Coalesced run {task_id} was cancelled"))
+            raise
+        single_flight.finish(key, result=state)
+        return state
+
+    _, leader_id, future = flight
+    _coalesced.inc(role="follower")
+    event_bus.publish(task_id, "coalesced", leader=leader_id)
+    try:
+        state = await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Only this follower stops waiting; the leader's run goes on.
+        set_status(task_id, "cancelled", error="Cancelled before completion")
+        raise
+    except Exception as exc:
+        set_status(task_id, "failed", error=str(exc))
+        raise
+    return await adopt_outcome(task_id, state)
+
+
+async def adopt_outcome(task_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Records another task's final (or paused) state as this task's outcome. A
+    paused plan gets its own checkpoint thread so it can be approved or
+    rejected independently.
+    """
+    state = {**state, "task_id": task_id}
+    if state.get("status") == "waiting_approval":
+        config = {"configurable": {"thread_id": task_id}}
+        await get_coordinator_graph().aupdate_state(config, state, as_node="plan_node")
+    record_outcome(task_id, state)
+    _maybe_speculate(task_id, state)
+    _store.note_write()
+    return state
+
+
+def _index_resolution(task_id: str, state: Dict[str, Any]) -> None:
+    # Imported here so numpy loads with the index (at startup), not with this module.
+    from app.retrieval import index_resolution
+
+    index_resolution(task_id, state)
+
+
+def _maybe_speculate(task_id: str, state: Dict[str, Any]) -> None:
+    # Opted-in plans run their read-only agents while waiting; see app.speculation.
+    if state.get("status") == "waiting_approval" and state.get("speculative"):
+        speculator.start(task_id, state)
@@ -0,0 +1,232 @@
+"""
+Runtime settings, read once from the environment (and a .env file, loaded
+here and nowhere else).
+
+Modules read these through the module (``settings.NAME``) at call time so tests
+and benchmarks can override them with monkeypatch.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Agent execution ---
+# "concurrent" fans the planned agents out on a thread pool; "sequential" runs
+# them one after another.
+AGENT_EXECUTION_MODE = os.environ.get("AGENT_EXECUTION_MODE", "concurrent")
+# Maximum number of agents one ticket may run at the same time.
+AGENT_MAX_CONCURRENCY = int(os.environ.get("AGENT_MAX_CONCURRENCY", "3"))
+# Size of the process-wide thread pool shared by all tickets.
+AGENT_POOL_SIZE = int(os.environ.get("AGENT_POOL_SIZE", "32"))
+
+# Agent retries: attempts per agent run (1 = no retry) and the first backoff,
+# doubled per attempt. Only transient errors are retried (see
+# app.workflows.retry). AGENT_RETRY_POLICIES overrides per agent, as JSON:
+# {"automation": {"max_attempts": 3, "backoff_seconds": 1.0}}
+AGENT_RETRY_MAX_ATTEMPTS = int(os.environ.get("AGENT_RETRY_MAX_ATTEMPTS", "2"))
+AGENT_RETRY_BACKOFF_SECONDS = float(os.environ.get("AGENT_RETRY_BACKOFF_SECONDS", "0.5"))
+AGENT_RETRY_POLICIES = os.environ.get("AGENT_RETRY_POLICIES", "")
+
+# --- Deadlines ---
+# Wall-clock budget of one graph run (an inline /execute, a background job, or
+# the run after an approval); 0 disables it. Agents still running at the
+# deadline are cancelled and the ticket ends as timed_out with the results it
+# has. ExecuteRequest.timeout_seconds overrides it per ticket.
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "120"))
+# Budget of one agent run, LLM calls included; a run that overruns it counts
+# as a (retryable) timeout. AGENT_TIMEOUTS overrides per agent, as JSON:
+# {"writer": 30}
+AGENT_TIMEOUT_SECONDS = float(os.environ.get("AGENT_TIMEOUT_SECONDS", "60"))
+AGENT_TIMEOUTS = os.environ.get("AGENT_TIMEOUTS", "")
+# A run that has not wound down this long after its deadline is cancelled
+# outright (its partial results are still kept).
+DEADLINE_GRACE_SECONDS = float(os.environ.get("DEADLINE_GRACE_SECONDS", "5"))
+# How often an inline /execute checks whether its client has disconnected;
+# the run is then cancelled unless identical tickets are waiting on it.
+DISCONNECT_POLL_SECONDS = float(os.environ.get("DISCONNECT_POLL_SECONDS", "0.5"))
+
+# --- OpenAI HTTP client ---
+# Connection pool shared by every async LLM call in the process.
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "500"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("LLM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.environ.get("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+
+# --- Prompt construction ---
+# Token budget for the ticket-specific part of each prompt (the request,
+# pasted logs); longer text is condensed to its head and tail. JSON overrides
+# per agent: {"diagnostic": 4000}. See app.llm.prompts.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_TOKEN_BUDGETS = os.environ.get("PROMPT_TOKEN_BUDGETS", "")
+
+# --- Batch ingestion ---
+# POST /execute/batch runs at most BATCH_CONCURRENCY of its tickets at once.
+# Their agents' prompts of up to PACK_MAX_TICKET_TOKENS wait up to
+# PACK_WINDOW_SECONDS to share one LLM call with up to PACK_MAX_TICKETS-1
+# others (1 disables packing). See app.batch and app.llm.packing.
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "64"))
+PACK_MAX_TICKETS = int(os.environ.get("PACK_MAX_TICKETS", "8"))
+PACK_MAX_TICKET_TOKENS = int(os.environ.get("PACK_MAX_TICKET_TOKENS", "400"))
+PACK_WINDOW_SECONDS = float(os.environ.get("PACK_WINDOW_SECONDS", "0.05"))
+
+# --- Retrieval of past resolutions ---
+# Completed tickets are indexed (see app.retrieval). DiagnosticAgent returns a
+# past diagnosis as is at RETRIEVAL_REUSE_SIMILARITY or above, and otherwise
+# adds up to RETRIEVAL_TOP_K past tickets at RETRIEVAL_CONTEXT_SIMILARITY or
+# above to its prompt. RETRIEVAL_INDEX_PATH is a directory to persist the index
+# in (one per process); empty keeps it in memory. Past RETRIEVAL_MAX_ROWS
+# tickets the oldest are evicted, which bounds its memory (about 2 KB per row
+# at 512 dimensions, plus the payload).
+RETRIEVAL_ENABLED = os.environ.get("RETRIEVAL_ENABLED", "true").lower() == "true"
+RETRIEVAL_INDEX_PATH = os.environ.get("RETRIEVAL_INDEX_PATH", "")
+RETRIEVAL_DIMENSIONS = int(os.environ.get("RETRIEVAL_DIMENSIONS", "512"))
+RETRIEVAL_MAX_ROWS = int(os.environ.get("RETRIEVAL_MAX_ROWS", "100000"))
+RETRIEVAL_REUSE_SIMILARITY = float(os.environ.get("RETRIEVAL_REUSE_SIMILARITY", "0.95"))
+RETRIEVAL_CONTEXT_SIMILARITY = float(os.environ.get("RETRIEVAL_CONTEXT_SIMILARITY", "0.3"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
+
+# --- Model tiers ---
+# JSON overrides of the tier -> model map (default {"fast": "gpt-4o-mini",
+# "strong": "gpt-4o"}) and of the tiers each agent tries in order, e.g.
+# {"diagnostic": ["fast", "strong"], "writer": ["fast"]}. An agent moves to
+# its next tier only when an answer lacks the expected JSON shape; see
+# app.llm.tiers.
+LLM_MODEL_TIERS = os.environ.get("LLM_MODEL_TIERS", "")
+AGENT_MODEL_CASCADE = os.environ.get("AGENT_MODEL_CASCADE", "")
+
+# --- LLM rate limiting ---
+# Account quota in requests and tokens per minute; 0 means unlimited. Calls
+# are paced to LLM_RATE_LIMIT_HEADROOM of the quota, and at most
+# LLM_RATE_LIMIT_BURST_SECONDS worth of it can be spent at once.
+LLM_RATE_LIMIT_RPM = int(os.environ.get("LLM_RATE_LIMIT_RPM", "0"))
+LLM_RATE_LIMIT_TPM = int(os.environ.get("LLM_RATE_LIMIT_TPM", "0"))
+LLM_RATE_LIMIT_HEADROOM = float(os.environ.get("LLM_RATE_LIMIT_HEADROOM", "0.95"))
+LLM_RATE_LIMIT_BURST_SECONDS = float(os.environ.get("LLM_RATE_LIMIT_BURST_SECONDS", "10"))
+# Completion tokens assumed per call when reserving token quota up front.
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.environ.get("LLM_EXPECTED_COMPLETION_TOKENS", "400"))
+# Retries of a call answered with 429 (or a connection error), with jittered
+# exponential backoff that never undercuts the server's Retry-After.
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# --- Result merging ---
+# "local" assembles the final result from the agent outputs without an LLM
+# call; "narrative" asks the coordinator LLM to write it. ExecuteRequest.merge_mode
+# overrides this per request.
+MERGE_MODE = os.environ.get("MERGE_MODE", "local")
+
+# --- Planning ---
+# "auto" builds the plan locally (rule table or a cached plan for the same
+# normalized request) when that is confident enough, else asks the coordinator
+# LLM; "llm" always asks the LLM.
+PLANNER_MODE = os.environ.get("PLANNER_MODE", "auto")
+# Minimum confidence (0-1) for a locally built plan to be used.
+PLANNER_MIN_CONFIDENCE = float(os.environ.get("PLANNER_MIN_CONFIDENCE", "0.8"))
+# LLM-generated plans remembered by normalized request.
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", "1024"))
+
+# --- LLM response cache ---
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", "3600"))
+# SQLite file for the on-disk tier; empty keeps the cache in memory only.
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+# --- Background jobs ---
+# Worker coroutines that run queued graph executions, i.e. how many tickets a
+# process works on at once in background mode.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "16"))
+# Maximum number of queued (not yet started) jobs before submissions are refused.
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "1000"))
+
+# --- Admission control ---
+# Graph runs from /execute and plan approvals are admitted per class
+# (interactive, bulk): at most *_MAX_RUNNING at once, and further runs queue
+# only while their estimated wait stays under *_MAX_WAIT_SECONDS. Beyond that
+# the request is refused with 429 and a Retry-After. The wait is estimated from
+# recent per-node latencies, or ADMISSION_DEFAULT_RUN_SECONDS per run before any.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_INTERACTIVE_MAX_RUNNING = int(os.environ.get("ADMISSION_INTERACTIVE_MAX_RUNNING", "32"))
+ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS", "10"))
+ADMISSION_BULK_MAX_RUNNING = int(os.environ.get("ADMISSION_BULK_MAX_RUNNING", "16"))
+ADMISSION_BULK_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_BULK_MAX_WAIT_SECONDS", "300"))
+ADMISSION_DEFAULT_RUN_SECONDS = float(os.environ.get("ADMISSION_DEFAULT_RUN_SECONDS", "10"))
+# Weight of the newest node latency in its moving average.
+ADMISSION_LATENCY_SMOOTHING = float(os.environ.get("ADMISSION_LATENCY_SMOOTHING", "0.2"))
+
+# --- Profiling ---
+# A graph run is profiled (see app.profiling) when its request sends
+# PROFILE_HEADER with a true value, or with probability PROFILE_SAMPLE_RATE
+# (adjustable at runtime through PUT /admin/profiling). Stack samples are
+# taken every PROFILE_INTERVAL_SECONDS while a profiled run is in flight.
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Profile")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_SECONDS", "0.005"))
+
+# --- Script linting ---
+# Scripts from the automation agent are syntax-checked locally (bash -n and
+# shellcheck, pwsh's parser, a static Azure CLI command check) before they are
+# returned. Each check runs in a throwaway temp directory with a timeout; at
+# most SCRIPT_LINT_WORKERS run at once. Results are cached by script hash.
+SCRIPT_LINT_ENABLED = os.environ.get("SCRIPT_LINT_ENABLED", "true").lower() == "true"
+SCRIPT_LINT_WORKERS = int(os.environ.get("SCRIPT_LINT_WORKERS", "2"))
+SCRIPT_LINT_TIMEOUT_SECONDS = float(os.environ.get("SCRIPT_LINT_TIMEOUT_SECONDS", "10"))
+SCRIPT_LINT_CACHE_MAX_ENTRIES = int(os.environ.get("SCRIPT_LINT_CACHE_MAX_ENTRIES", "1024"))
+
+# --- Speculative execution ---
+# While a plan waits for approval, run its read-only agents (those with
+# speculative_safe = True) in the background so approval only has to merge.
+# Off by default; ExecuteRequest.speculative overrides per request.
+SPECULATIVE_EXECUTION = os.environ.get("SPECULATIVE_EXECUTION", "false").lower() == "true"
+# Maximum number of plans being speculated on at once, per process.
+SPECULATIVE_MAX_PENDING = int(os.environ.get("SPECULATIVE_MAX_PENDING", "32"))
+# Speculation claims the plan while it writes its outputs into the checkpoint;
+# approve/reject wait for the claim, which lapses after this long (a worker died mid-write).
+SPECULATIVE_WRITE_CLAIM_SECONDS = float(os.environ.get("SPECULATIVE_WRITE_CLAIM_SECONDS", "30"))
+
+# --- Request coalescing ---
+# Identical tickets (same normalized text, require_approval and merge_mode)
+# submitted while one is already running share that run instead of starting
+# their own. Per process; tickets with bypass_cache are never coalesced.
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "true").lower() == "true"
+
+# --- Metrics ---
+# Tasks whose per-task latency/token breakdown is kept until the runner stores
+# it with the task (least recently updated are dropped).
+METRICS_MAX_TASKS = int(os.environ.get("METRICS_MAX_TASKS", "1024"))
+
+# --- Progress events (SSE) ---
+# Recent events kept per task so late subscribers can catch up.
+EVENT_HISTORY_PER_TASK = int(os.environ.get("EVENT_HISTORY_PER_TASK", "64"))
+# Tasks whose event history is retained (least recently published are dropped).
+EVENT_HISTORY_TASKS = int(os.environ.get("EVENT_HISTORY_TASKS", "1024"))
+# Token events buffered per subscriber; beyond this a slow client misses tokens
+# (never node, agent or status events).
+EVENT_SUBSCRIBER_TOKEN_BUFFER = int(os.environ.get("EVENT_SUBSCRIBER_TOKEN_BUFFER", "256"))
+
+# --- Task / plan / checkpoint storage ---
+# "sqlite" persists tasks, pending approvals and graph checkpoints to STORE_PATH
+# (WAL mode); "memory" keeps them in bounded in-process structures.
+STORE_BACKEND = os.environ.get("STORE_BACKEND", "sqlite")
+STORE_PATH = os.environ.get("STORE_PATH", "it_support_agent.db")
+# Records kept in the in-memory LRU in front of SQLite (and the cap for the memory backend).
+STORE_CACHE_SIZE = int(os.environ.get("STORE_CACHE_SIZE", "1024"))
+STORE_MEMORY_MAX_ENTRIES = int(os.environ.get("STORE_MEMORY_MAX_ENTRIES", "100000"))
+# Finished tasks (completed/failed/rejected) are kept this long.
+TASK_RETENTION_SECONDS = float(os.environ.get("TASK_RETENTION_SECONDS", str(24 * 3600)))
+# Plans awaiting approval and unfinished tasks are kept this long.
+PLAN_RETENTION_SECONDS = float(os.environ.get("PLAN_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Expired records are swept after this many writes.
+STORE_SWEEP_EVERY = int(os.environ.get("STORE_SWEEP_EVERY", "500"))
+# Several processes (uvicorn --workers N) share STORE_PATH: every read goes to
+# SQLite instead of the per-process front cache, which another worker could
+# have made stale. On by default when WEB_CONCURRENCY > 1.
+STORE_SHARED = os.environ.get(
+    "STORE_SHARED", "true" if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 else "false"
+).lower() == "true"
+# How long a writer waits for another process's SQLite lock before failing.
+STORE_BUSY_TIMEOUT_MS = int(os.environ.get("STORE_BUSY_TIMEOUT_MS", "5000"))
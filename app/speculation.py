@@ -0,0 +1,167 @@
+"""
+Speculative agent runs while a plan waits for approval.
+
+When a ticket opts in, its read-only agents (speculative_safe = True: they
+only read the request and produce text or scripts, never execute anything)
+start on the background job queue as soon as the plan pauses. Their outputs
+are written into the paused checkpoint, so on approval run_agents_node finds
+them and only the remaining agents (if any) and the merge are left. Rejection
+cancels the run and the checkpoint is released with its outputs.
+
+The write is made under a claim on the plan (status "speculating", taken
+with a compare-and-set on its version like approve/reject), so it never lands
+after a rejection released the checkpoint or while an approval on another
+worker resumes the graph. Approve and reject wait for the claim to be
+released (see plan_is_claimed).
+
+Pending speculation is capped per process at SPECULATIVE_MAX_PENDING; plans
+beyond the cap (or a full job queue) just wait for approval as before.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app import settings
+from app.events import event_bus
+from app.jobs import JobQueueFull, get_job_queue
+from app.metrics import metrics
+from app.storage import get_task_store
+from app.workflows.coordinator_graph import get_coordinator_graph, speculate_agents
+
+
+# Plan status while speculation writes its outputs into the checkpoint.
+SPECULATING = "speculating"
+
+
+@dataclass
+class _Speculation:
+    # Resolved with whether outputs were stored, from the job queue's loop.
+    done: Future = field(default_factory=Future)
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    task: Optional[asyncio.Task] = None
+    cancelled: bool = False
+
+
+class Speculator:
+    def __init__(self):
+        self._pending: Dict[str, _Speculation] = {}
+        self._lock = threading.Lock()
+        self._outcomes = metrics.counter(
+            "it_agent_speculative_total", "Speculative runs by outcome", ("outcome",)
+        )
+
+    def start(self, task_id: str, state: Dict[str, Any]) -> bool:
+        """
+        Queues speculation on a paused plan. Returns False if it was not started.
+        """
+        with self._lock:
+            if task_id in self._pending:
+                return False
+            if len(self._pending) >= settings.SPECULATIVE_MAX_PENDING:
+                self._outcomes.inc(outcome="skipped")
+                return False
+            self._pending[task_id] = _Speculation()
+        try:
+            get_job_queue().submit(lambda: self._job(task_id, state))
+        except JobQueueFull:
+            with self._lock:
+                self._pending.pop(task_id).done.set_result(False)
+            self._outcomes.inc(outcome="skipped")
+            return False
+        self._outcomes.inc(outcome="started")
+        return True
+
+    async def _job(self, task_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            speculation = self._pending[task_id]
+            if not speculation.cancelled:
+                speculation.loop = asyncio.get_running_loop()
+                speculation.task = asyncio.ensure_future(self._run(task_id, state))
+        stored = False
+        try:
+            if speculation.task is not None:
+                # A separate task, so cancelling it never cancels the job worker.
+                await asyncio.gather(speculation.task, return_exceptions=True)
+                stored = not speculation.task.cancelled() and speculation.task.result()
+            if speculation.cancelled or (speculation.task is not None and speculation.task.cancelled()):
+                self._outcomes.inc(outcome="discarded")
+        finally:
+            # Also when the job itself is cancelled (the job queue stopping), so wait() never hangs.
+            with self._lock:
+                self._pending.pop(task_id, None)
+            speculation.done.set_result(stored)
+
+    async def _run(self, task_id: str, state: Dict[str, Any]) -> bool:
+        try:
+            event_bus.publish(task_id, "speculation", phase="started")
+            outputs, timings = await speculate_agents(state)
+            # A rejection (or an approval on another worker) may have claimed
+            # the plan in the meantime; then the outputs are dropped.
+            claimed = _claim_for_write(task_id) if outputs else None
+            if claimed is not None:
+                try:
+                    config = {"configurable": {"thread_id": task_id}}
+                    update = {"results": outputs, "agent_timings": timings}
+                    await get_coordinator_graph().aupdate_state(config, update, as_node="plan_node")
+                finally:
+                    get_task_store().plans[task_id] = {**claimed, "status": "waiting_approval", "claimed_until": None}
+                event_bus.publish(task_id, "speculation", phase="finished", agents=list(outputs))
+                return True
+        except Exception as exc:
+            self._outcomes.inc(outcome="failed")
+            event_bus.publish(task_id, "speculation", phase="failed", error=str(exc))
+        return False
+
+    async def wait(self, task_id: str) -> bool:
+        """
+        Waits for speculation on the plan to finish (from any event loop).
+        Returns True if its outputs are in the checkpoint.
+        """
+        with self._lock:
+            speculation = self._pending.get(task_id)
+        if speculation is None:
+            return False
+        stored = await asyncio.wrap_future(speculation.done)
+        if stored:
+            self._outcomes.inc(outcome="reused")
+        return stored
+
+    def cancel(self, task_id: str) -> None:
+        with self._lock:
+            speculation = self._pending.get(task_id)
+            if speculation is None:
+                return
+            speculation.cancelled = True
+            if speculation.task is not None:
+                speculation.loop.call_soon_threadsafe(speculation.task.cancel)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+
+speculator = Speculator()
+
+
+def _claim_for_write(task_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Claims a waiting plan for the checkpoint write, or None if it is no longer waiting.
+    """
+    plans = get_task_store().plans
+    try:
+        context, version = plans.get_versioned(task_id)
+    except KeyError:
+        return None
+    if context.get("status") != "waiting_approval":
+        return None
+    claimed = {**context, "status": SPECULATING, "claimed_until": time.time() + settings.SPECULATIVE_WRITE_CLAIM_SECONDS}
+    return claimed if plans.replace_if(task_id, claimed, version) else None
+
+
+def plan_is_claimed(context: Dict[str, Any]) -> bool:
+    """
+    Whether speculation is writing into the plan's checkpoint (and approve/reject must wait).
+    """
+    return context.get("status") == SPECULATING and (context.get("claimed_until") or 0) > time.time()
@@ -0,0 +1,93 @@
+"""
+Storage for tasks, plans awaiting approval and graph checkpoints.
+
+get_task_store() returns the process-wide store selected by
+settings.STORE_BACKEND: "sqlite" (default) survives restarts, "memory" does
+not. Either way memory use is bounded: finished tasks expire after
+TASK_RETENTION_SECONDS, pending plans after PLAN_RETENTION_SECONDS, and a
+task's checkpoint thread is deleted once the task no longer needs it.
+
+With STORE_SHARED the SQLite store is safe to share between uvicorn worker
+processes: reads skip the per-process cache and all workers see the same
+tasks, plans and checkpoints.
+"""
+import threading
+from functools import lru_cache
+from typing import List
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from app import settings
+from app.events import TERMINAL_STATUSES
+from app.storage.checkpoint import SqliteCheckpointer
+from app.storage.tables import MemoryTable, SQLiteTable, open_database
+
+
+def task_retention(record) -> float:
+    if record.get("status") in TERMINAL_STATUSES:
+        return settings.TASK_RETENTION_SECONDS
+    return settings.PLAN_RETENTION_SECONDS
+
+
+def plan_retention(record) -> float:
+    return settings.PLAN_RETENTION_SECONDS
+
+
+class TaskStore:
+    def __init__(self, tasks, plans, checkpointer):
+        self.tasks = tasks
+        self.plans = plans
+        self.checkpointer = checkpointer
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def release(self, task_id: str) -> None:
+        """
+        Drops the task's graph checkpoints once it can no longer be resumed.
+        """
+        self.checkpointer.delete_thread(task_id)
+
+    def sweep(self) -> List[str]:
+        """
+        Deletes expired tasks and plans together with their checkpoints.
+        """
+        expired = set(self.tasks.sweep()) | set(self.plans.sweep())
+        for task_id in expired:
+            self.release(task_id)
+        return sorted(expired)
+
+    def note_write(self) -> None:
+        with self._lock:
+            self._writes += 1
+            due = self._writes >= settings.STORE_SWEEP_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.sweep()
+
+
+def _build_task_store() -> TaskStore:
+    if settings.STORE_BACKEND == "memory":
+        return TaskStore(
+            tasks=MemoryTable(task_retention, settings.STORE_MEMORY_MAX_ENTRIES),
+            plans=MemoryTable(plan_retention, settings.STORE_MEMORY_MAX_ENTRIES),
+            checkpointer=MemorySaver(),
+        )
+    if settings.STORE_BACKEND != "sqlite":
+        raise ValueError(f"Unknown STORE_BACKEND: {settings.STORE_BACKEND}")
+
+    db = open_database(settings.STORE_PATH)
+    lock = threading.RLock()
+    checkpointer = SqliteCheckpointer(open_database(settings.STORE_PATH))
+    checkpointer.setup()
+    cache_size = 0 if settings.STORE_SHARED else settings.STORE_CACHE_SIZE
+    return TaskStore(
+        tasks=SQLiteTable(db, lock, "tasks", task_retention, cache_size),
+        plans=SQLiteTable(db, lock, "plans", plan_retention, cache_size),
+        checkpointer=checkpointer,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_task_store() -> TaskStore:
+    return _build_task_store()
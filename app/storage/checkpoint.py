@@ -0,0 +1,37 @@
+"""
+LangGraph checkpointers for the coordinator graph.
+
+SqliteSaver only implements the sync API; the graph is driven with
+ainvoke/astream, so the async methods here run the sync ones on a worker
+thread instead of raising NotImplementedError.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class SqliteCheckpointer(SqliteSaver):
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config,
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before=None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,214 @@
+"""
+Dict-like, bounded record tables for tasks and pending plans.
+
+Both implementations are MutableMappings of id -> JSON-serializable dict, so
+callers use them like the plain dicts they replace. Records returned by a
+read are shared with the front cache: to change a record, assign it back
+(``TASKS[id] = record``) rather than mutating it in place.
+
+Every record gets an expiry from the table's retention policy; expired records
+read as missing and are deleted by sweep().
+
+Records also carry a version that every write bumps. get_versioned() and
+replace_if() give optimistic concurrency for state transitions that must
+happen once, such as approving a plan, even across worker processes.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app import settings
+
+RetentionPolicy = Callable[[Dict[str, Any]], float]
+
+
+class MemoryTable(MutableMapping):
+    """
+    In-process table bounded by entry count (oldest evicted first) and retention.
+    """
+
+    def __init__(self, retention: RetentionPolicy, max_entries: int = 100000):
+        self.retention = retention
+        self.max_entries = max_entries
+        self._rows: "OrderedDict[str, Tuple[Dict[str, Any], float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Any], int]:
+        with self._lock:
+            record, expires_at, version = self._rows[key]
+            if expires_at < time.time():
+                del self._rows[key]
+                raise KeyError(key)
+            return record, version
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return self.get_versioned(key)[0]
+
+    def _write(self, key: str, record: Dict[str, Any], version: int) -> None:
+        self._rows[key] = (record, time.time() + self.retention(record), version)
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.max_entries:
+            self._rows.popitem(last=False)
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            current = self._rows.get(key)
+            self._write(key, record, current[2] + 1 if current else 1)
+
+    def replace_if(self, key: str, record: Dict[str, Any], version: int) -> bool:
+        """
+        Stores ``record`` only if the stored version is still ``version``.
+        """
+        with self._lock:
+            current = self._rows.get(key)
+            if current is None or current[2] != version or current[1] < time.time():
+                return False
+            self._write(key, record, version + 1)
+            return True
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            del self._rows[key]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def sweep(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._rows.items() if expires_at < now]
+            for key in expired:
+                del self._rows[key]
+        return expired
+
+
+class SQLiteTable(MutableMapping):
+    """
+    SQLite-backed table with a bounded LRU of recently used records in front.
+
+    With ``cache_size=0`` every read goes to SQLite, which is what several
+    worker processes sharing one database need.
+    """
+
+    def __init__(self, db: sqlite3.Connection, lock: threading.RLock, name: str, retention: RetentionPolicy, cache_size: int = 1024):
+        self.db = db
+        self.lock = lock
+        self.name = name
+        self.retention = retention
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        with self.lock:
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, status TEXT, updated_at REAL NOT NULL, "
+                "expires_at REAL NOT NULL, version INTEGER NOT NULL DEFAULT 1)"
+            )
+            columns = {row[1] for row in self.db.execute(f"PRAGMA table_info({name})")}
+            if "version" not in columns:
+                self.db.execute(f"ALTER TABLE {name} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {name}_expires_at ON {name} (expires_at)")
+
+    def _remember(self, key: str, record: Dict[str, Any], expires_at: float) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = (record, expires_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] >= now:
+                self._cache.move_to_end(key)
+                return cached[0]
+            row = self.db.execute(f"SELECT data, expires_at FROM {self.name} WHERE id = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self._cache.pop(key, None)
+                raise KeyError(key)
+            record = json.loads(row[0])
+            self._remember(key, record, row[1])
+            return record
+
+    def get_versioned(self, key: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Reads the record and its version straight from SQLite, bypassing the cache.
+        """
+        with self.lock:
+            row = self.db.execute(f"SELECT data, expires_at, version FROM {self.name} WHERE id = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            raise KeyError(key)
+        return json.loads(row[0]), row[2]
+
+    def __setitem__(self, key: str, record: Dict[str, Any]) -> None:
+        now = time.time()
+        expires_at = now + self.retention(record)
+        data = json.dumps(record, default=str)
+        with self.lock:
+            self.db.execute(
+                f"INSERT INTO {self.name} (id, data, status, updated_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, status = excluded.status, "
+                "updated_at = excluded.updated_at, expires_at = excluded.expires_at, version = version + 1",
+                (key, data, record.get("status"), now, expires_at),
+            )
+            self._remember(key, record, expires_at)
+
+    def replace_if(self, key: str, record: Dict[str, Any], version: int) -> bool:
+        """
+        Stores ``record`` only if the stored version is still ``version``.
+        """
+        now = time.time()
+        expires_at = now + self.retention(record)
+        with self.lock:
+            updated = self.db.execute(
+                f"UPDATE {self.name} SET data = ?, status = ?, updated_at = ?, expires_at = ?, version = version + 1 "
+                "WHERE id = ? AND version = ? AND expires_at >= ?",
+                (json.dumps(record, default=str), record.get("status"), now, expires_at, key, version, now),
+            ).rowcount
+            if updated:
+                self._remember(key, record, expires_at)
+            else:
+                self._cache.pop(key, None)
+        return bool(updated)
+
+    def __delitem__(self, key: str) -> None:
+        with self.lock:
+            self._cache.pop(key, None)
+            deleted = self.db.execute(f"DELETE FROM {self.name} WHERE id = ?", (key,)).rowcount
+        if not deleted:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            rows = self.db.execute(f"SELECT id FROM {self.name} WHERE expires_at >= ?", (time.time(),)).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM {self.name} WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+
+    def sweep(self) -> List[str]:
+        now = time.time()
+        with self.lock:
+            expired = [row[0] for row in self.db.execute(f"SELECT id FROM {self.name} WHERE expires_at < ?", (now,))]
+            self.db.execute(f"DELETE FROM {self.name} WHERE expires_at < ?", (now,))
+            for key in expired:
+                self._cache.pop(key, None)
+        return expired
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=settings.STORE_BUSY_TIMEOUT_MS / 1000)
+    db.execute(f"PRAGMA busy_timeout={settings.STORE_BUSY_TIMEOUT_MS}")
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
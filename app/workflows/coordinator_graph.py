@@ -1,11 +1,30 @@
 from langgraph.graph import StateGraph, START, END 
-from typing import Dict, Any, Literal, TypedDict, Optional
-from langgraph.checkpoint.memory import MemorySaver
+from typing import Dict, Any, Literal, TypedDict, Optional, Tuple
+from functools import lru_cache, wraps
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import contextvars
+import logging
+import time
+from langchain_core.runnables import RunnableLambda
 
+from app import settings
+from app.admission import get_admission_controller
 from app.agents import AGENT_REGISTRY
+from app.deadlines import DeadlineExceeded, agent_timeout, check_deadline, current_deadline, deadline_in, earliest, time_left
+from app.events import event_bus
+from app.llm import request_options
+from app.llm.context import current_options
+from app.metrics import metrics
+from app.storage import get_task_store
+from app.workflows.retry import policy_for, retry_delay
+
+logger = logging.getLogger(__name__)
 
 # --- NODE FUNCTIONS ---
 class CoordinatorState(TypedDict):
+    task_id: str
     request: str
     require_approval: Optional[bool]
     plan: dict
@@ -13,14 +32,47 @@ class CoordinatorState(TypedDict):
     results: dict
     error: Optional[str]
     retry_count: int
+    # Failed runs per agent key, and when the pending retry may start.
+    agent_attempts: Dict[str, int]
+    retry_at: float
+    agent_timings: Dict[str, float]
+    merge_mode: Optional[str]
+    bypass_cache: Optional[bool]
+    stream_tokens: Optional[bool]
+    priority: Optional[str]
+    speculative: Optional[bool]
+    # Bulk-imported: short LLM prompts may share a call (see app.llm.packing).
+    pack_prompts: Optional[bool]
+    # Budget of each run of this ticket; defaults to settings.REQUEST_TIMEOUT_SECONDS
+    # (the deadline itself travels in the request options, see app.deadlines).
+    timeout_seconds: Optional[float]
+    # Wall-clock bookkeeping for duration_seconds; time spent waiting for a
+    # human approval is excluded.
+    started_at: float
+    planned_at: float
+    paused_seconds: float
 
-checkpointer = MemorySaver()
+# Shared by every ticket; the per-ticket cap is settings.AGENT_MAX_CONCURRENCY.
+_agent_pool = ThreadPoolExecutor(max_workers=settings.AGENT_POOL_SIZE, thread_name_prefix="agent")
 
 
 
 def plan_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    state["started_at"] = time.time()
     coordinator = AGENT_REGISTRY["coordinator"]
     plan = coordinator.plan(state["request"], state.get("require_approval", False))
+    return _apply_plan(state, plan)
+
+async def aplan_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    state["started_at"] = time.time()
+    coordinator = AGENT_REGISTRY["coordinator"]
+    if hasattr(coordinator, "aplan"):
+        plan = await coordinator.aplan(state["request"], state.get("require_approval", False))
+    else:
+        plan = await asyncio.to_thread(coordinator.plan, state["request"], state.get("require_approval", False))
+    return _apply_plan(state, plan)
+
+def _apply_plan(state: Dict[str, Any], plan: Dict[str, Any]) -> Dict[str, Any]:
     # Defensive: fill keys if missing
     plan['agents'] = plan.get('agents', [])
     plan['steps'] = plan.get('steps', [])
@@ -31,57 +83,321 @@ def plan_node(state: Dict[str, Any]) -> Dict[str, Any]:
     plan['require_approval'] = state.get("require_approval", False)
     plan['status'] = status
     state['plan'] = plan
-    print("DEBUG: In plan_node, setting state['plan'] =", state['plan'])
+    state['planned_at'] = time.time()
+    logger.debug("plan_node: plan for %s is %s", state.get("task_id"), plan)
     return state
 
 def approval_pause_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Pauses for external approval. No-op until /approve is called.
     """
-    return state
+    # Runs when the graph resumes, so the approval wait ends here.
+    paused = time.time() - state.get("planned_at", time.time())
+    return {**state, "paused_seconds": state.get("paused_seconds", 0.0) + paused}
 
 def after_approval_pause_edge(state: Dict[str, Any]) -> Literal["run_agents_node", "merge_results_node"]:
     if state.get("status") == "rejected":
         return "merge_results_node"
     return "run_agents_node"
 
-def run_agents_node(state: Dict[str, Any], config=None) -> Dict[str, Any]:
-    plan = state.get("plan", {})
-    print("DEBUG: Entering run_agents_node with plan:", plan)
-    outputs: Dict[str, Any] = {}
-    request = state.get("request", "")
-    error = None
+def _agent_key(agent_name: str) -> str:
+    return agent_name.replace("Agent", "").lower()
+
+@contextmanager
+def _agent_scope(key: str):
+    """
+    Attributes the agent's LLM calls to it, narrows the deadline to the agent's
+    own budget and records its run time, failed or not.
+    """
+    task_id = current_options().get("task_id")
+    start = time.perf_counter()
+    failed = True
+    try:
+        with request_options(agent=key, deadline=earliest(current_deadline(), deadline_in(agent_timeout(key)))):
+            yield
+        failed = False
+    finally:
+        metrics.observe_agent(task_id, key, time.perf_counter() - start, failed)
+
+def _timed_run(key: str, agent, request: str) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    with _agent_scope(key):
+        # A thread cannot be interrupted; the deadline bounds the agent's LLM calls instead.
+        check_deadline(f"{key} agent")
+        output = agent.run(request)
+    return output, time.perf_counter() - start
+
+async def _atimed_run(key: str, agent, request: str) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    with _agent_scope(key):
+        if hasattr(agent, "arun"):
+            call = agent.arun(request)
+        else:
+            # Agents without an async path still must not block the event loop.
+            call = asyncio.to_thread(agent.run, request)
+        left = time_left()
+        try:
+            output = await (call if left is None else asyncio.wait_for(call, max(0.0, left)))
+        except asyncio.TimeoutError as exc:
+            left = time_left()
+            if left is None or left > 0:
+                # The agent's own timeout error, not ours.
+                raise
+            raise DeadlineExceeded(f"{key} agent: deadline exceeded") from exc
+    return output, time.perf_counter() - start
+
+def _record_output(task_id: Optional[str], key: str, output: Dict[str, Any], elapsed: float, outputs: Dict[str, Any], timings: Dict[str, float]) -> None:
+    outputs[key], timings[key] = output, elapsed
+    logger.debug("Output from %s for %s: %s", key, task_id, output)
+    # Streaming clients get each agent's output as soon as it exists.
+    event_bus.publish(task_id, "agent_output", agent=key, seconds=round(elapsed, 3), output=output)
+
+def _gives_up(key: str, exc: BaseException, attempts: Dict[str, int]) -> bool:
+    # Whether this failure ends the ticket, so the other agents need not finish.
+    return not policy_for(key).should_retry(exc, attempts.get(key, 0) + 1)
 
-    print(f"Run Agents Node: Plan is {plan}") 
+def _out_of_time(agent_names, failures: Dict[str, BaseException]) -> bool:
+    """
+    Whether the run's deadline has passed; if so the given agents, not yet
+    finished, are recorded as timed out.
+    """
+    left = time_left()
+    if left is None or left > 0:
+        return False
+    for agent_name in agent_names:
+        failures[agent_name] = DeadlineExceeded(f"{_agent_key(agent_name)} agent: deadline exceeded")
+    return True
 
-    for agent_name in plan.get("agents", []):
-        key = agent_name.replace("Agent", "").lower()
+def _run_sequential(task_id, agent_names, request: str, outputs: Dict[str, Any], timings: Dict[str, float],
+                    failures: Dict[str, BaseException], attempts: Dict[str, int]) -> None:
+    for index, agent_name in enumerate(agent_names):
+        if _out_of_time(agent_names[index:], failures):
+            return
+        key = _agent_key(agent_name)
         agent = AGENT_REGISTRY.get(key)
         try:
-            outputs[key] = agent.run(request)
-            print(f"Output from {key}: {outputs[key]}")  # Add this
+            output, elapsed = _timed_run(key, agent, request)
         except Exception as exc:
-            error = f"{agent_name} failed: {exc}"
-            print(error)  # Add this
-            return {
-                **state,
-                "error": error,
-                "status": "failed"
-            }
+            failures[agent_name] = exc
+            if _gives_up(key, exc, attempts):
+                return
+            continue
+        _record_output(task_id, key, output, elapsed, outputs, timings)
+
+def _run_concurrent(task_id, agent_names, request: str, outputs: Dict[str, Any], timings: Dict[str, float],
+                    failures: Dict[str, BaseException], attempts: Dict[str, int]) -> None:
+    """
+    Fans the agents out on the shared pool, at most settings.AGENT_MAX_CONCURRENCY
+    at a time. An agent failing for good cancels the agents that have not
+    started yet; after a retryable failure the others run on so their outputs
+    can be kept for the retry.
+    """
+    pending_names = list(agent_names)
+    in_flight = {}
+    limit = max(1, settings.AGENT_MAX_CONCURRENCY)
+
+    def submit_next():
+        while pending_names and len(in_flight) < limit:
+            agent_name = pending_names.pop(0)
+            key = _agent_key(agent_name)
+            # Copy the context so the agent sees this ticket's LLM request options.
+            ctx = contextvars.copy_context()
+            in_flight[_agent_pool.submit(ctx.run, _timed_run, key, AGENT_REGISTRY.get(key), request)] = agent_name
+
+    submit_next()
+    while in_flight:
+        done, _ = wait(in_flight, timeout=time_left(), return_when=FIRST_COMPLETED)
+        if not done and _out_of_time(list(in_flight.values()) + pending_names, failures):
+            # The threads finish in the background; their LLM calls are bounded by the deadline.
+            for other in in_flight:
+                other.cancel()
+            return
+        for future in done:
+            agent_name = in_flight.pop(future)
+            key = _agent_key(agent_name)
+            try:
+                output, elapsed = future.result()
+            except Exception as exc:
+                failures[agent_name] = exc
+                if _gives_up(key, exc, attempts):
+                    for other in in_flight:
+                        other.cancel()
+                    return
+                continue
+            _record_output(task_id, key, output, elapsed, outputs, timings)
+        submit_next()
+
+async def _arun_sequential(task_id, agent_names, request: str, outputs: Dict[str, Any], timings: Dict[str, float],
+                           failures: Dict[str, BaseException], attempts: Dict[str, int]) -> None:
+    for index, agent_name in enumerate(agent_names):
+        if _out_of_time(agent_names[index:], failures):
+            return
+        key = _agent_key(agent_name)
+        try:
+            output, elapsed = await _atimed_run(key, AGENT_REGISTRY.get(key), request)
+        except Exception as exc:
+            failures[agent_name] = exc
+            if _gives_up(key, exc, attempts):
+                return
+            continue
+        _record_output(task_id, key, output, elapsed, outputs, timings)
+
+async def _arun_concurrent(task_id, agent_names, request: str, outputs: Dict[str, Any], timings: Dict[str, float],
+                           failures: Dict[str, BaseException], attempts: Dict[str, int]) -> None:
+    """
+    Async counterpart of _run_concurrent: gathers the agents on the event loop,
+    at most settings.AGENT_MAX_CONCURRENCY at a time, and cancels the rest as
+    soon as one fails for good.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.AGENT_MAX_CONCURRENCY))
+
+    async def run_one(agent_name):
+        async with semaphore:
+            key = _agent_key(agent_name)
+            return await _atimed_run(key, AGENT_REGISTRY.get(key), request)
+
+    in_flight = {asyncio.ensure_future(run_one(name)): name for name in agent_names}
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, timeout=time_left(), return_when=asyncio.FIRST_COMPLETED)
+            if not done and _out_of_time(list(in_flight.values()), failures):
+                return
+            for task in done:
+                agent_name = in_flight.pop(task)
+                key = _agent_key(agent_name)
+                try:
+                    output, elapsed = task.result()
+                except Exception as exc:
+                    failures[agent_name] = exc
+                    if _gives_up(key, exc, attempts):
+                        return
+                    continue
+                _record_output(task_id, key, output, elapsed, outputs, timings)
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+def _pending_agents(state: Dict[str, Any]):
+    # Agents whose output a previous attempt already produced are not rerun.
+    done = state.get("results") or {}
+    return [name for name in state.get("plan", {}).get("agents", []) if _agent_key(name) not in done]
+
+def _agents_update(state: Dict[str, Any], outputs: Dict[str, Any], timings: Dict[str, float],
+                   failures: Dict[str, BaseException]) -> Dict[str, Any]:
+    results = {**(state.get("results") or {}), **outputs}
+    agent_timings = {**(state.get("agent_timings") or {}), **timings}
+    if not failures:
+        return {
+            **state,
+            "results": results,
+            "error": None,
+            "status": "completed",
+            "agent_timings": agent_timings,
+        }
 
+    error = "; ".join(f"{agent_name} failed: {exc}" for agent_name, exc in failures.items())
+    logger.warning("Task %s: %s", state.get("task_id"), error)
+    attempts = dict(state.get("agent_attempts") or {})
+    for agent_name in failures:
+        attempts[_agent_key(agent_name)] = attempts.get(_agent_key(agent_name), 0) + 1
+    update = {**state, "results": results, "error": error, "agent_timings": agent_timings, "agent_attempts": attempts}
+    delay = retry_delay({_agent_key(name): exc for name, exc in failures.items()}, attempts)
+    left = time_left()
+    if delay is not None and left is not None and delay >= left:
+        # No time left for another attempt: end with what we have.
+        return {**update, "status": "timed_out"}
+    if delay is None:
+        # Running out of time (the run's deadline or an agent's own budget)
+        # ends the ticket as timed_out, which still merges the partial results;
+        # any other failure fails it.
+        timed_out = all(isinstance(exc, DeadlineExceeded) for exc in failures.values())
+        return {**update, "status": "timed_out" if timed_out else "failed"}
+    event_bus.publish(state.get("task_id"), "agent_retry", agents=list(failures), error=error, delay=round(delay, 3))
     return {
-        **state,
-        "results": outputs,
-        "error": None,
-        "status": "completed"
+        **update,
+        "status": "retrying",
+        "retry_count": state.get("retry_count", 0) + 1,
+        "retry_at": time.time() + delay,
     }
 
+def run_agents_node(state: Dict[str, Any], config=None) -> Dict[str, Any]:
+    plan = state.get("plan", {})
+    time.sleep(max(0.0, state.get("retry_at", 0.0) - time.time()))
+    outputs: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    failures: Dict[str, BaseException] = {}
+    attempts = state.get("agent_attempts") or {}
+    request = state.get("request", "")
+    agent_names = _pending_agents(state)
+
+    logger.debug("run_agents_node: running %s for %s", agent_names, state.get("task_id"))
+
+    if settings.AGENT_EXECUTION_MODE == "sequential" or len(agent_names) <= 1:
+        _run_sequential(state.get("task_id"), agent_names, request, outputs, timings, failures, attempts)
+    else:
+        _run_concurrent(state.get("task_id"), agent_names, request, outputs, timings, failures, attempts)
+    return _agents_update(state, outputs, timings, failures)
+
+async def arun_agents_node(state: Dict[str, Any], config=None) -> Dict[str, Any]:
+    await asyncio.sleep(max(0.0, state.get("retry_at", 0.0) - time.time()))
+    outputs: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    failures: Dict[str, BaseException] = {}
+    attempts = state.get("agent_attempts") or {}
+    request = state.get("request", "")
+    agent_names = _pending_agents(state)
+
+    if settings.AGENT_EXECUTION_MODE == "sequential" or len(agent_names) <= 1:
+        await _arun_sequential(state.get("task_id"), agent_names, request, outputs, timings, failures, attempts)
+    else:
+        await _arun_concurrent(state.get("task_id"), agent_names, request, outputs, timings, failures, attempts)
+    return _agents_update(state, outputs, timings, failures)
+
+async def speculate_agents(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Runs the plan's speculative-safe agents ahead of approval, at bulk priority.
+    Returns the outputs and timings of those that succeeded; the others simply
+    run after approval.
+    """
+    agent_names = [
+        name for name in _pending_agents(state)
+        if getattr(AGENT_REGISTRY.get(_agent_key(name)), "speculative_safe", False)
+    ]
+    outputs: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    failures: Dict[str, BaseException] = {}
+    with _node_scope("speculative_agents", {**state, "priority": "bulk"}):
+        await _arun_concurrent(state.get("task_id"), agent_names, state.get("request", ""), outputs, timings, failures, {})
+    return outputs, timings
+
+def _merge_mode(state: Dict[str, Any]) -> Optional[str]:
+    # A timed-out ticket has no time for a narrative merge.
+    return "local" if state.get("status") == "timed_out" else state.get("merge_mode")
+
 def merge_results_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Merges outputs from all agents into a final structured response.
     """
     coordinator = AGENT_REGISTRY["coordinator"]
-    merged = coordinator.merge_results(state.get("results", {}))
+    merged = coordinator.merge_results(state.get("results", {}), mode=_merge_mode(state))
+    return _finish_merge(state, merged)
+
+async def amerge_results_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    coordinator = AGENT_REGISTRY["coordinator"]
+    if hasattr(coordinator, "amerge_results"):
+        merged = await coordinator.amerge_results(state.get("results", {}), mode=_merge_mode(state))
+    else:
+        merged = await asyncio.to_thread(coordinator.merge_results, state.get("results", {}), mode=_merge_mode(state))
+    return _finish_merge(state, merged)
+
+def _finish_merge(state: Dict[str, Any], merged: Dict[str, Any]) -> Dict[str, Any]:
+    if state.get("status") == "timed_out":
+        merged["status"] = "timed_out"
+    merged["agent_timings"] = state.get("agent_timings", {})
+    # Whole pipeline: plan through merge, minus any time parked for approval.
+    started_at = state.get("started_at")
+    if started_at is not None:
+        merged["duration_seconds"] = round(time.time() - started_at - state.get("paused_seconds", 0.0), 3)
     return {**state, "results": merged}
 
 # --- CONDITIONAL EDGE FUNCTIONS ---
@@ -91,23 +407,75 @@ def after_plan_edge(state: Dict[str, Any]) -> Literal["approval_pause_node", "ru
         return "approval_pause_node"
     return "run_agents_node"
 
-def after_run_agents_edge(state: Dict[str, Any]) -> Literal["run_agents_node", "merge_results_node"]:
+def after_run_agents_edge(state: Dict[str, Any]) -> Literal["run_agents_node", "merge_results_node", "__end__"]:
+    if state.get("status") == "retrying":
+        # Reruns only the agents that failed; see app.workflows.retry.
+        return "run_agents_node"
     if state.get("status") == "failed":
         return END
-    if state.get("error") and "AutomationAgent" in str(state.get("error")) and state.get("retry_count", 0) < 2:
-        return "run_agents_node"
+    # Completed, or timed out with partial results to merge.
     return "merge_results_node"
 
 # --- GRAPH BUILDER ---
 
-def build_coordinator_graph():
+@contextmanager
+def _node_scope(name: str, state: Dict[str, Any]):
+    """
+    Per-node context: the ticket's LLM request options (cache bypass, token
+    sink, ...), node started/finished progress events and node timing metrics.
+    LLM calls made outside an agent run are the coordinator's.
+    """
+    task_id = state.get("task_id")
+    options = {
+        "task_id": task_id,
+        "agent": "coordinator",
+        "bypass_cache": bool(state.get("bypass_cache")),
+        "pack_prompts": bool(state.get("pack_prompts")),
+        # An enclosing scope (e.g. an approval) may raise the ticket's priority.
+        "priority": current_options().get("priority") or state.get("priority") or "interactive",
+    }
+    if state.get("stream_tokens"):
+        options["token_sink"] = lambda agent, text: event_bus.publish(task_id, "token", agent=agent, text=text)
+    event_bus.publish(task_id, "node_started", node=name)
+    start = time.perf_counter()
+    try:
+        with request_options(**options):
+            yield
+    except Exception as exc:
+        metrics.observe_node(task_id, name, time.perf_counter() - start, failed=True)
+        event_bus.publish(task_id, "node_failed", node=name, error=str(exc))
+        raise
+    elapsed = time.perf_counter() - start
+    metrics.observe_node(task_id, name, elapsed)
+    get_admission_controller().observe_node(name, elapsed)
+    event_bus.publish(task_id, "node_finished", node=name, seconds=round(elapsed, 3))
+
+def _scoped(name: str, node):
+    if asyncio.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_wrapper(state, *args, **kwargs):
+            with _node_scope(name, state):
+                return await node(state, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(node)
+    def wrapper(state, *args, **kwargs):
+        with _node_scope(name, state):
+            return node(state, *args, **kwargs)
+    return wrapper
+
+def _node(name: str, func, afunc=None) -> RunnableLambda:
+    return RunnableLambda(_scoped(name, func), afunc=_scoped(name, afunc) if afunc else None, name=name)
+
+def build_coordinator_graph(checkpointer=None):
     builder = StateGraph(CoordinatorState)
 
-    # Add nodes
-    builder.add_node(plan_node)
-    builder.add_node(approval_pause_node)
-    builder.add_node(run_agents_node)  
-    builder.add_node(merge_results_node)
+    # Add nodes. Each node has a sync and an async implementation so the
+    # same compiled graph serves both invoke() and ainvoke().
+    builder.add_node("plan_node", _node("plan_node", plan_node, aplan_node))
+    builder.add_node("approval_pause_node", _node("approval_pause_node", approval_pause_node))
+    builder.add_node("run_agents_node", _node("run_agents_node", run_agents_node, arun_agents_node))
+    builder.add_node("merge_results_node", _node("merge_results_node", merge_results_node, amerge_results_node))
 
 
     # Entry
@@ -121,17 +489,20 @@ def build_coordinator_graph():
 
     return builder.compile(
         interrupt_before=["approval_pause_node"],
-        checkpointer=checkpointer
+        checkpointer=checkpointer or get_task_store().checkpointer
     )
 
-if __name__ == "__main__":
-    graph = build_coordinator_graph()
-    g = graph.get_graph().draw_mermaid_png()
+@lru_cache(maxsize=None)
+def get_coordinator_graph():
+    """
+    Returns the process-wide compiled coordinator graph, building it on first use.
 
-    base_filename = "coordinator_graph"
+    Compiling is not free and every request shares the same checkpointer, so the
+    API reuses a single compiled graph instead of rebuilding it per request.
+    """
+    return build_coordinator_graph()
 
-    png_filename = f"{base_filename}.png"
-    
-    with open(png_filename, "wb") as f:
-        f.write(g)
-    print(f"Saved PNG diagram to {png_filename}")
\ No newline at end of file
+if __name__ == "__main__":
+    from app.workflows.diagram import save_mermaid_diagram
+
+    save_mermaid_diagram(get_coordinator_graph(), base_filename="coordinator_graph")
@@ -0,0 +1,87 @@
+"""
+On-demand Mermaid export of the coordinator graph.
+
+Rendering is kept out of the request path: the diagram is produced only when
+someone asks for it (the /graph/diagram endpoint or this module's CLI) and the
+rendered output is cached, since the graph topology never changes at runtime.
+
+Usage:
+    python -m app.workflows.diagram --format png --output workflow
+"""
+import argparse
+import threading
+from typing import Dict, Tuple
+
+DIAGRAM_FORMATS = ("mermaid", "png")
+
+_CACHE: Dict[Tuple[int, str], bytes] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def render_diagram(graph, fmt: str = "mermaid") -> bytes:
+    """
+    Renders the graph as Mermaid source or PNG, caching the result per graph.
+
+    Args:
+        graph: The compiled LangGraph graph object
+        fmt: One of "mermaid" or "png"
+
+    Returns:
+        bytes: The rendered diagram (UTF-8 Mermaid text or PNG data)
+    """
+    if fmt not in DIAGRAM_FORMATS:
+        raise ValueError(f"Unsupported diagram format: {fmt}")
+    key = (id(graph), fmt)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    drawable = graph.get_graph()
+    if fmt == "png":
+        data = drawable.draw_mermaid_png()
+    else:
+        data = drawable.draw_mermaid().encode("utf-8")
+
+    with _CACHE_LOCK:
+        _CACHE[key] = data
+    return data
+
+
+def save_mermaid_diagram(graph, base_filename="workflow", fmt: str = "png") -> str:
+    """
+    Saves the Mermaid diagram of the given LangGraph graph to disk.
+
+    Args:
+        graph: The LangGraph graph object
+        base_filename: Base name for the output file (without extension)
+        fmt: One of "mermaid" (written as .md) or "png"
+
+    Returns:
+        str: The path of the written file
+    """
+    data = render_diagram(graph, fmt)
+    if fmt == "png":
+        filename = f"{base_filename}.png"
+    else:
+        filename = f"{base_filename}.md"
+        data = b"```mermaid\n" + data + b"\n```\n"
+    with open(filename, "wb") as f:
+        f.write(data)
+    print(f"Saved {fmt} diagram to {filename}")
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the coordinator graph diagram.")
+    parser.add_argument("--format", choices=DIAGRAM_FORMATS, default="png")
+    parser.add_argument("--output", default="workflow", help="Output file name without extension")
+    args = parser.parse_args(argv)
+
+    from app.workflows.coordinator_graph import get_coordinator_graph
+
+    save_mermaid_diagram(get_coordinator_graph(), base_filename=args.output, fmt=args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-agent retry policies for run_agents_node.
+
+When an agent fails with an error its policy considers transient, the node
+keeps the outputs of the agents that succeeded and the graph loops back to
+run_agents_node, which reruns only the agents without an output after the
+policy's backoff. Non-retryable errors, or running out of attempts, fail the
+ticket as before (with the partial results kept).
+"""
+import json
+import random
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple, Type
+
+import openai
+
+from app import settings
+
+# Errors worth another attempt: the API being briefly unavailable or slow, and
+# the model returning malformed JSON (a fresh sample is usually fine).
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+    ConnectionError,
+    json.JSONDecodeError,
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 2
+    backoff_seconds: float = 0.5
+    backoff_multiplier: float = 2.0
+    max_backoff_seconds: float = 10.0
+    retry_on: Tuple[Type[BaseException], ...] = field(default=TRANSIENT_ERRORS)
+
+    def should_retry(self, exc: BaseException, attempts: int) -> bool:
+        """
+        ``attempts`` is how many times the agent has failed so far, this failure included.
+        """
+        return attempts < self.max_attempts and isinstance(exc, self.retry_on)
+
+    def delay(self, attempts: int) -> float:
+        base = min(self.max_backoff_seconds, self.backoff_seconds * self.backoff_multiplier ** max(0, attempts - 1))
+        # Jitter keeps many tickets retrying the same outage from moving in lockstep.
+        return base * random.uniform(0.5, 1.0)
+
+
+# Code-level overrides by agent key; AGENT_RETRY_POLICIES in the environment wins.
+AGENT_RETRY_POLICIES: Dict[str, RetryPolicy] = {}
+
+
+def policy_for(agent_key: str) -> RetryPolicy:
+    policy = AGENT_RETRY_POLICIES.get(agent_key) or RetryPolicy(
+        max_attempts=settings.AGENT_RETRY_MAX_ATTEMPTS,
+        backoff_seconds=settings.AGENT_RETRY_BACKOFF_SECONDS,
+    )
+    overrides = _env_overrides().get(agent_key)
+    return replace(policy, **overrides) if overrides else policy
+
+
+def _env_overrides() -> Dict[str, Dict[str, float]]:
+    if not settings.AGENT_RETRY_POLICIES:
+        return {}
+    return json.loads(settings.AGENT_RETRY_POLICIES)
+
+
+def retry_delay(failures: Dict[str, BaseException], attempts: Dict[str, int]) -> Optional[float]:
+    """
+    Seconds to wait before rerunning the failed agents, or None if any of the
+    failures must not be retried.
+    """
+    delays = []
+    for key, exc in failures.items():
+        policy = policy_for(key)
+        if not policy.should_retry(exc, attempts.get(key, 0)):
+            return None
+        delays.append(policy.delay(attempts.get(key, 0)))
+    return max(delays, default=0.0)
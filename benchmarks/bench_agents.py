@@ -0,0 +1,41 @@
+"""
+Sequential vs. concurrent fan-out in run_agents_node.
+
+Each fake agent sleeps for --delay seconds to stand in for an OpenAI round trip.
+Concurrent latency should track the slowest agent rather than the sum.
+
+Usage:
+    python -m benchmarks.bench_agents --delay 0.5 --runs 5
+"""
+import argparse
+import time
+
+from benchmarks.common import install_fake_agents, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    from app import settings
+    from app.workflows.coordinator_graph import run_agents_node
+
+    install_fake_agents(args.delay)
+    state = {
+        "request": "Disk full on web01",
+        "plan": {"agents": ["DiagnosticAgent", "AutomationAgent", "WriterAgent"]},
+    }
+    for mode in ("sequential", "concurrent"):
+        settings.AGENT_EXECUTION_MODE = mode
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run_agents_node(dict(state))
+            samples.append(time.perf_counter() - start)
+        print(summarize(mode, samples))
+
+
+if __name__ == "__main__":
+    main()
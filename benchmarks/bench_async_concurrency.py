@@ -0,0 +1,70 @@
+"""
+Throughput of the async request path as the number of in-flight tickets grows.
+
+Starts the fake OpenAI endpoint (benchmarks.fake_llm) on a local port, points
+the shared AsyncOpenAI client at it and drives POST /api/v1/execute in-process
+over ASGI at increasing concurrency. With a non-blocking path, throughput grows
+roughly linearly with concurrency until the CPU saturates; a blocking path stays
+flat at about one ticket per pipeline latency.
+
+Usage:
+    python -m benchmarks.bench_async_concurrency --latency 0.1 --levels 1,10,50,100,200
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+from benchmarks.common import summarize
+from benchmarks.fake_llm import create_app, serve_in_thread
+
+
+async def drive(app, concurrency: int, tickets: int):
+    import httpx
+
+    samples = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(tickets):
+        queue.put_nowait({"request": "Server CPU utilization is consistently above 90%."})
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def worker():
+            while not queue.empty():
+                body = queue.get_nowait()
+                start = time.perf_counter()
+                resp = await client.post("/api/v1/execute", json=body)
+                samples.append(time.perf_counter() - start)
+                assert resp.status_code == 200, resp.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--levels", default="1,10,50,100,200", help="Comma-separated in-flight ticket counts")
+    parser.add_argument("--rounds", type=int, default=3, help="Tickets per in-flight slot at each level")
+    args = parser.parse_args(argv)
+
+    _, base_url = serve_in_thread(create_app(args.latency))
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from app.main import app
+
+    results = []
+    for level in (int(x) for x in args.levels.split(",")):
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            samples, elapsed = asyncio.run(drive(app, level, level * args.rounds))
+        results.append((level, samples, elapsed))
+
+    for level, samples, elapsed in results:
+        print(f"{summarize(f'in-flight={level}', samples)} throughput={len(samples) / elapsed:8.1f} tickets/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
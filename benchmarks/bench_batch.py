@@ -0,0 +1,97 @@
+"""
+A bulk import through POST /api/v1/execute/batch against one /execute call
+per ticket.
+
+Starts the fake OpenAI endpoint (benchmarks.fake_llm) on a local port, points
+the real agents at it and imports the same distinct tickets both ways, in-process
+over ASGI. Reports wall time, LLM calls per ticket and prompt tokens per ticket
+(~4 characters each, as sent to the endpoint). The batch path dedupes repeats
+and packs short prompts several per call (app.llm.packing), so both per-ticket
+figures should drop by about the pack size. Both ways keep about the same
+number of LLM calls in flight: the batch runs PACK_MAX_TICKETS times as many
+tickets at once. With a request quota (--rpm), wall time drops by about the
+pack size as well.
+
+Usage:
+    python -m benchmarks.bench_batch --tickets 1000 --latency 0.2 --concurrency 32 --rpm 3000
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+from benchmarks.fake_llm import create_app, serve_in_thread
+
+
+def tickets(count: int, offset: int):
+    # Distinct texts, so neither the response cache nor coalescing hides the work.
+    return [{"request": f"Server web{offset + i:04d} CPU utilization is consistently above 90%."} for i in range(count)]
+
+
+async def one_by_one(app, bodies, concurrency: int):
+    import httpx
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def worker():
+            while not queue.empty():
+                resp = await client.post("/api/v1/execute", json=queue.get_nowait())
+                assert resp.status_code == 200, resp.text
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def batched(app, bodies, concurrency: int):
+    import httpx
+
+    from app import settings
+
+    settings.BATCH_CONCURRENCY = concurrency * max(1, settings.PACK_MAX_TICKETS)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        resp = await client.post("/api/v1/execute/batch", json=bodies)
+        assert resp.status_code == 200, resp.text
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        assert len(lines) == len(bodies) and all(line["status"] == "completed" for line in lines), lines[:3]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=1000, help="Tickets per import")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--concurrency", type=int, default=32, help="LLM calls in flight at once, both ways")
+    parser.add_argument("--rpm", type=int, default=0, help="LLM requests per minute quota (0 = none)")
+    args = parser.parse_args(argv)
+    os.environ["LLM_RATE_LIMIT_RPM"] = str(args.rpm)
+
+    fake = create_app(args.latency)
+    _, base_url = serve_in_thread(fake)
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from app.main import app
+
+    results = []
+    for offset, (name, mode) in enumerate((("one-by-one", one_by_one), ("batch", batched))):
+        before = dict(fake.state.stats)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            asyncio.run(mode(app, tickets(args.tickets, offset * args.tickets), args.concurrency))
+        elapsed = time.perf_counter() - start
+        calls = fake.state.stats["requests"] - before["requests"]
+        chars = fake.state.stats["prompt_chars"] - before["prompt_chars"]
+        results.append((name, elapsed, calls, chars))
+
+    for name, elapsed, calls, chars in results:
+        print(
+            f"{name:>10}: {elapsed:8.2f}s wall  {calls / args.tickets:6.2f} LLM calls/ticket  "
+            f"{chars / 4 / args.tickets:8.0f} prompt tokens/ticket",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
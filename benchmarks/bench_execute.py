@@ -0,0 +1,72 @@
+"""
+Before/after latency benchmark for POST /api/v1/execute.
+
+"before" reproduces the old request path: the coordinator graph is rebuilt and
+its Mermaid diagram rendered and written to disk on every call. "after" is the
+current path, which reuses the graph compiled at startup. Agents are offline
+fakes, so the numbers isolate the per-request framework overhead.
+
+PNG rendering goes through the mermaid.ink web service, so the "before" path
+renders Mermaid source instead; the real cost of the old path was higher.
+
+Usage:
+    python -m benchmarks.bench_execute --requests 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.common import install_fake_agents, summarize
+
+
+def _legacy_graph_factory(output_dir: str):
+    from app.workflows.coordinator_graph import build_coordinator_graph
+
+    def build_and_render():
+        graph = build_coordinator_graph()
+        with open(os.path.join(output_dir, "workflow.md"), "w") as f:
+            f.write(graph.get_graph().draw_mermaid())
+        return graph
+
+    return build_and_render
+
+
+def run(client, requests: int, require_approval: bool = False):
+    samples = []
+    body = {"request": "Disk full on web01", "require_approval": require_approval}
+    for _ in range(requests):
+        start = time.perf_counter()
+        resp = client.post("/api/v1/execute", json=body)
+        samples.append(time.perf_counter() - start)
+        assert resp.status_code == 200, resp.text
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    install_fake_agents()
+    client = TestClient(app)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with mock.patch("app.api.get_coordinator_graph", _legacy_graph_factory(tmp)):
+            run(client, args.warmup)
+            before = run(client, args.requests)
+
+    run(client, args.warmup)
+    after = run(client, args.requests)
+
+    print(summarize("before (rebuild + render)", before))
+    print(summarize("after (shared graph)", after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start cost: how long a fresh interpreter takes to import the service.
+
+Each run imports the module (app.main by default) in a new ``python -X
+importtime`` process, so nothing is warm but the OS file cache. Reports the
+wall-time distribution, then the slowest imports of the last run by cumulative
+time; ``--max-seconds`` fails the run when the median exceeds a budget, so the
+autoscaler's cold start can be guarded in CI.
+
+Usage:
+    python -m benchmarks.bench_import --runs 5 --top 15
+    python -m benchmarks.bench_import --max-seconds 2.5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.common import summarize
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_once(module: str) -> Tuple[float, str]:
+    """
+    Imports ``module`` in a fresh interpreter; returns (wall seconds, -X importtime report).
+    """
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-offline-benchmark")}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, proc.stderr
+
+
+def slowest(report: str, top: int) -> List[Tuple[int, int, str]]:
+    """
+    (cumulative us, self us, module) of the ``top`` slowest imports, nested ones indented.
+    """
+    rows = []
+    for line in report.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(cumulative_us), int(self_us), f"{indent}{name}"))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail if the median import takes longer")
+    args = parser.parse_args(argv)
+
+    samples, report = [], ""
+    for _ in range(args.runs):
+        elapsed, report = import_once(args.module)
+        samples.append(elapsed)
+    print(summarize(f"import {args.module}", samples))
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in slowest(report, args.top):
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+
+    median = statistics.median(samples)
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"Median import time {median:.2f}s exceeds the {args.max_seconds:.2f}s budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Resident memory while pushing many tickets through the graph.
+
+With the bounded store, RSS should level off after warm-up instead of growing
+with the number of tickets processed. Agents are offline fakes.
+
+Usage:
+    python -m benchmarks.bench_memory --tickets 20000 --report-every 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import uuid
+
+from benchmarks.common import install_fake_agents, rss_mb
+
+
+async def run(tickets: int, report_every: int, concurrency: int):
+    from app.runner import run_graph
+
+    done = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal done
+        async with semaphore:
+            task_id = str(uuid.uuid4())
+            await run_graph(task_id, {"task_id": task_id, "request": f"Disk full on web{done % 50:02d}"})
+            done += 1
+            if done % report_every == 0:
+                print(f"tickets={done:>8} rss={rss_mb():8.1f} MiB", file=sys.stderr)
+
+    await asyncio.gather(*(one() for _ in range(tickets)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--report-every", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    install_fake_agents()
+    print(f"start rss={rss_mb():.1f} MiB", file=sys.stderr)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        asyncio.run(run(args.tickets, args.report_every, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
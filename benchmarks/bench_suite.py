@@ -0,0 +1,185 @@
+"""
+End-to-end load benchmark: /execute, the approval flow and /tasks/{id}.
+
+Runs fully offline. The fake OpenAI endpoint (benchmarks.fake_llm, with its
+latency, fault and cassette options) is started in-process and the real agents
+talk to it over HTTP, so every layer except OpenAI itself is measured. Each
+scenario is driven at the target concurrency and reports p50/p95/p99 latency,
+throughput, errors and RSS.
+
+Scenarios:
+    execute   POST /execute without approval
+    approve   POST /execute with require_approval, then POST /plans/{id}/approve
+    tasks     GET /tasks/{id} for tickets finished by the other scenarios
+
+By default the app runs in this process over ASGI; --url points the load at a
+running server instead (pass --pid to report that server's RSS). Save a run with
+--json and compare a later one with --compare to catch regressions:
+
+    python -m benchmarks.bench_suite --json baseline.json
+    python -m benchmarks.bench_suite --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.common import percentile, rss_mb, summarize
+from benchmarks.fake_llm import add_server_arguments, app_from_args, serve_in_thread
+
+SCENARIOS = ("execute", "approve", "tasks")
+REQUEST = "Server CPU utilization is consistently above 90%."
+
+
+async def run_scenario(client, name: str, concurrency: int, requests: int, finished: List[str], pid: Optional[int]) -> Dict:
+    samples: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    peak_rss = rss_mb(pid)
+
+    async def one(i: int) -> bool:
+        if name == "tasks":
+            resp = await client.get(f"/api/v1/tasks/{finished[i % len(finished)]}")
+            return resp.status_code == 200 and resp.json()["status"] == "completed"
+        resp = await client.post("/api/v1/execute", json={"request": REQUEST, "require_approval": name == "approve"})
+        if resp.status_code != 200:
+            return False
+        task_id = resp.json()["task_id"]
+        if name == "approve":
+            resp = await client.post(f"/api/v1/plans/{task_id}/approve")
+            if resp.status_code != 200:
+                return False
+        if resp.json()["status"] == "completed":
+            finished.append(task_id)
+            return True
+        return False
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                ok = await one(i)
+            except Exception:
+                ok = False
+            samples.append(time.perf_counter() - start)
+            errors += not ok
+
+    async def sample_rss(done: asyncio.Event):
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, rss_mb(pid))
+            await asyncio.sleep(0.1)
+
+    done = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(done))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+    return {
+        "scenario": name,
+        "requests": len(samples),
+        "errors": errors,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "rss_mb": rss_mb(pid),
+        "peak_rss_mb": peak_rss,
+        "_samples": samples,
+    }
+
+
+async def run_suite(client, scenarios: List[str], concurrency: int, requests: int, pid: Optional[int]) -> List[Dict]:
+    finished: List[str] = []
+    results = []
+    for name in scenarios:
+        if name == "tasks" and not finished:
+            # Give the status scenario something to read.
+            await run_scenario(client, "execute", concurrency, concurrency, finished, pid)
+        results.append(await run_scenario(client, name, concurrency, requests, finished, pid))
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if not before:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: throughput {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight per scenario")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="With --url: server process to report RSS for")
+    parser.add_argument("--json", metavar="PATH", help="Write the results here")
+    parser.add_argument("--compare", metavar="PATH", help="Fail if p95 or throughput regressed against this run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression for --compare")
+    add_server_arguments(parser)
+    parser.set_defaults(latency=0.05)
+    args = parser.parse_args(argv)
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        pid = args.pid
+    else:
+        _, llm_url = serve_in_thread(app_from_args(args))
+        os.environ["OPENAI_BASE_URL"] = llm_url
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+        pid = None
+
+    async def run():
+        async with client:
+            return await run_suite(client, scenarios, args.concurrency, args.requests, pid)
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        results = asyncio.run(run())
+
+    for result in results:
+        print(
+            f"{summarize(result['scenario'], result.pop('_samples'))} "
+            f"throughput={result['throughput']:8.1f}/s errors={result['errors']} "
+            f"rss={result['rss_mb']:.1f}MiB peak={result['peak_rss_mb']:.1f}MiB",
+            file=sys.stderr,
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"concurrency": args.concurrency, "latency": args.latency, "results": results}, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
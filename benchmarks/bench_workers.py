@@ -0,0 +1,128 @@
+"""
+Throughput of the API as the number of uvicorn worker processes grows.
+
+Starts the fake OpenAI endpoint (benchmarks.fake_llm) and, for each worker
+count, ``uvicorn app.main:app --workers N`` on a fresh shared SQLite store
+(STORE_SHARED=true). Drives a mix of one-shot tickets and approval flows over
+real HTTP; because the submit, approve and status calls land on whichever
+worker accepts the connection, the approval flow exercises cross-worker plan
+and checkpoint sharing. Every approval must complete exactly once.
+
+Throughput should scale with the worker count until the machine runs out of
+cores; on a single-core box the numbers stay flat.
+
+Usage:
+    python -m benchmarks.bench_workers --workers 1,2,4 --concurrency 32 --tickets 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import summarize
+from benchmarks.fake_llm import create_app, serve_in_thread
+
+
+def start_api(workers: int, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/v1/jobs/stats").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API at {base_url} did not start")
+
+
+async def drive(base_url: str, concurrency: int, tickets: int, approval_ratio: float):
+    import httpx
+
+    samples, conflicts = [], 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(tickets):
+        queue.put_nowait(i % round(1 / approval_ratio) == 0 if approval_ratio else False)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        async def worker():
+            nonlocal conflicts
+            while not queue.empty():
+                require_approval = queue.get_nowait()
+                start = time.perf_counter()
+                resp = await client.post(
+                    "/api/v1/execute",
+                    json={"request": "Server CPU utilization is consistently above 90%.", "require_approval": require_approval},
+                )
+                assert resp.status_code == 200, resp.text
+                task_id = resp.json()["task_id"]
+                if require_approval:
+                    resp = await client.post(f"/api/v1/plans/{task_id}/approve")
+                    conflicts += resp.status_code == 409
+                    assert resp.status_code in (200, 409), resp.text
+                status = (await client.get(f"/api/v1/tasks/{task_id}")).json()["status"]
+                assert status == "completed", status
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, elapsed, conflicts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated uvicorn worker counts")
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Client requests in flight")
+    parser.add_argument("--tickets", type=int, default=200, help="Tickets per worker count")
+    parser.add_argument("--approval-ratio", type=float, default=0.25, help="Share of tickets that go through approval")
+    parser.add_argument("--port", type=int, default=8910)
+    args = parser.parse_args(argv)
+
+    _, llm_url = serve_in_thread(create_app(args.latency))
+
+    results = []
+    for workers in (int(x) for x in args.workers.split(",")):
+        store_dir = tempfile.mkdtemp(prefix="it-agent-bench-")
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": llm_url,
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-bench-offline"),
+            "STORE_PATH": os.path.join(store_dir, "store.db"),
+            "STORE_SHARED": "true",
+        }
+        base_url = f"http://127.0.0.1:{args.port}"
+        proc = start_api(workers, args.port, env)
+        try:
+            wait_ready(base_url)
+            samples, elapsed, conflicts = asyncio.run(drive(base_url, args.concurrency, args.tickets, args.approval_ratio))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        results.append((workers, samples, elapsed, conflicts))
+
+    for workers, samples, elapsed, conflicts in results:
+        print(
+            f"{summarize(f'workers={workers}', samples)} throughput={len(samples) / elapsed:8.1f} tickets/s "
+            f"approve_conflicts={conflicts}",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Shared helpers for the offline benchmarks.
+
+The benchmarks never talk to OpenAI: the agents in AGENT_REGISTRY are swapped
+for fakes that sleep for a fixed time and return canned, well-formed output.
+"""
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ.setdefault("STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="it-agent-bench-"), "store.db"))
+
+
+class FakeCoordinatorAgent:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def plan(self, request: str, require_approval: bool = False) -> Dict:
+        time.sleep(self.delay)
+        return {
+            "agents": ["DiagnosticAgent", "AutomationAgent", "WriterAgent"],
+            "steps": ["Diagnose", "Generate script", "Draft email"],
+            "summary": "Benchmark plan",
+            "require_approval": require_approval,
+            "status": "waiting_approval" if require_approval else "active",
+            "task_id": str(uuid.uuid4()),
+        }
+
+    def merge_results(self, agent_outputs: Dict, mode: Optional[str] = None) -> Dict:
+        from app.agents.coordinator import merge_agent_outputs
+
+        if mode == "narrative":
+            time.sleep(self.delay)
+        return merge_agent_outputs(agent_outputs)
+
+
+class FakeAgent:
+    speculative_safe = True
+
+    def __init__(self, output: Dict, delay: float = 0.0):
+        self.output = output
+        self.delay = delay
+
+    def run(self, request: str) -> Dict:
+        time.sleep(self.delay)
+        return dict(self.output)
+
+
+def fake_registry(delay: float = 0.0) -> Dict:
+    return {
+        "coordinator": FakeCoordinatorAgent(delay),
+        "diagnostic": FakeAgent(
+            {"root_cause": "Runaway process", "evidence": ["perfmon"], "solutions": [{"title": "Kill it", "confidence": "high"}]},
+            delay,
+        ),
+        "automation": FakeAgent({"language": "bash", "code": "echo ok", "lint_passed": True}, delay),
+        "writer": FakeAgent({"email_draft": "CPU issue resolved."}, delay),
+    }
+
+
+def install_fake_agents(delay: float = 0.0) -> None:
+    """Replaces the real agents in AGENT_REGISTRY with offline fakes."""
+    from app.agents import AGENT_REGISTRY
+
+    AGENT_REGISTRY.update(fake_registry(delay))
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(label: str, samples: List[float]) -> str:
+    return (
+        f"{label:<28} n={len(samples):<5} "
+        f"mean={statistics.mean(samples) * 1000:8.2f}ms "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms "
+        f"p95={percentile(samples, 95) * 1000:8.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.2f}ms"
+    )
+
+
+def rss_mb(pid: Optional[int] = None) -> float:
+    """Resident set size of this process (or ``pid``) in MiB on Linux; elsewhere this process's peak RSS."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
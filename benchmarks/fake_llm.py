@@ -0,0 +1,355 @@
+"""
+Minimal OpenAI-compatible stand-in for offline tests and benchmarks.
+
+Serves POST /v1/chat/completions with canned JSON chosen from the prompt, after
+a delay drawn from a latency distribution, so the real OpenAI client code path
+(HTTP, connection pool, JSON parsing) is exercised without network access or
+API cost. It can also inject failures (500s and 429s with Retry-After) at a
+configurable rate, and record real completions to a cassette file once
+(--record, proxying to --upstream) and replay them later (--replay).
+
+Usage:
+    python -m benchmarks.fake_llm --port 8900 --latency 0.2 --latency-dist lognormal --latency-spread 0.5
+    python -m benchmarks.fake_llm --record cassette.jsonl --upstream https://api.openai.com/v1
+    python -m benchmarks.fake_llm --replay cassette.jsonl --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.llm.cache import make_cache_key
+
+CANNED_RESPONSES = [
+    ("merges the outputs", {
+        "status": "completed",
+        "diagnosis": {"root_cause": "A runaway process is saturating the CPU."},
+        "script": {"language": "bash", "code": "ps aux --sort=-%cpu | head -n 5", "lint_passed": True},
+        "email_draft": "CPU saturation was traced to a runaway process and remediated.",
+    }),
+    ("creates an execution plan", {
+        "agents": ["DiagnosticAgent", "AutomationAgent", "WriterAgent"],
+        "steps": ["Diagnose the issue", "Generate a remediation script", "Draft a summary email"],
+        "summary": "Diagnose, remediate and report.",
+    }),
+    ("IT diagnostics", {
+        "root_cause": "A runaway process is saturating the CPU.",
+        "evidence": ["perfmon shows sustained 95% CPU", "single process dominates"],
+        "solutions": [{"title": "Terminate the runaway process.", "confidence": "high"}],
+    }),
+    ("automation scripts", {
+        "language": "bash",
+        "code": "ps aux --sort=-%cpu | head -n 5",
+    }),
+    ("email drafts", {
+        "email_draft": "CPU saturation on the server was traced to a runaway process and remediated.",
+    }),
+]
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+class LatencyModel:
+    """
+    Per-call delay in seconds with the given mean, never negative.
+
+    ``spread`` is the half-width for uniform, the standard deviation for normal
+    and sigma for lognormal; fixed and exponential ignore it.
+    """
+
+    def __init__(self, mean: float = 0.2, distribution: str = "fixed", spread: float = 0.0, seed: Optional[int] = None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported latency distribution: {distribution}")
+        self.mean = mean
+        self.distribution = distribution
+        self.spread = spread
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            value = self._random.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.distribution == "normal":
+            value = self._random.gauss(self.mean, self.spread)
+        elif self.distribution == "lognormal":
+            value = self._random.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+        elif self.distribution == "exponential":
+            value = self._random.expovariate(1 / self.mean)
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+
+class Cassette:
+    """
+    Recorded completions in a JSONL file, keyed like the response cache
+    (model, messages, response_format), so a replay is byte-for-byte repeatable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["content"]
+
+    @staticmethod
+    def key(body: dict) -> str:
+        return make_cache_key(body.get("model", ""), body.get("messages", []), body.get("response_format"))
+
+    def get(self, body: dict) -> Optional[str]:
+        return self.entries.get(self.key(body))
+
+    def put(self, body: dict, content: str) -> None:
+        key = self.key(body)
+        entry = {"key": key, "model": body.get("model"), "messages": body.get("messages"), "content": content}
+        with self._lock:
+            self.entries[key] = content
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def load_responses(path: str) -> List[Tuple[str, dict]]:
+    """
+    Reads {"prompt marker": canned JSON, ...} from a file; these take precedence over the defaults.
+    """
+    with open(path) as f:
+        return list(json.load(f).items())
+
+
+# Marker of a packed call (app.llm.packing): several tickets, one answer each.
+PACK_MARKER = "several independent tickets"
+
+
+def canned_content(prompt: str, responses: Optional[List[Tuple[str, dict]]] = None) -> dict:
+    if PACK_MARKER in prompt:
+        # The tickets are the last message, a JSON list of {"id", "ticket"}.
+        answer = canned_content(prompt.replace(PACK_MARKER, ""), responses)
+        return {"results": {ticket["id"]: answer for ticket in json.loads(prompt.rsplit("\n", 1)[-1])}}
+    # Markers come from the agents' instruction text; the first match wins.
+    for marker, content in (responses or []) + CANNED_RESPONSES:
+        if marker in prompt:
+            return content
+    return {"message": "ok"}
+
+
+def _text(content: Union[str, dict]) -> str:
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+def completion_body(model: str, content: Union[str, dict]) -> dict:
+    text = _text(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(text),
+    }
+
+
+def _usage(text: str) -> dict:
+    return {"prompt_tokens": 100, "completion_tokens": len(text) // 4, "total_tokens": 100 + len(text) // 4}
+
+
+def completion_chunks(model: str, content: Union[str, dict], token_chars: int = 4, include_usage: bool = False):
+    """
+    Yields the answer as OpenAI streaming chunks (SSE lines), a few characters per token,
+    plus the final usage chunk when the client asked for it.
+    """
+    text = _text(content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    for start in range(0, len(text), token_chars):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": text[start:start + token_chars]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    if include_usage:
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [], "usage": _usage(text)}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def _error(status: int, message: str, kind: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": kind, "code": None}}, status_code=status, headers=headers)
+
+
+def create_app(
+    latency: Union[float, LatencyModel] = 0.2,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    retry_after: float = 1.0,
+    responses: Optional[List[Tuple[str, dict]]] = None,
+    cassette: Optional[Cassette] = None,
+    record_upstream: Optional[str] = None,
+    strict_replay: bool = False,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    """
+    Builds the fake endpoint.
+
+    Args:
+        latency: Fixed seconds per call, or a LatencyModel
+        error_rate: Share of calls answered with a 500
+        throttle_rate: Share of calls answered with a 429 and Retry-After
+        retry_after: Seconds advertised in Retry-After
+        responses: Extra (prompt marker, JSON) pairs checked before the defaults
+        cassette: Replay recorded completions from it (and, with record_upstream, record to it)
+        record_upstream: Base URL of a real OpenAI-compatible API to proxy and record
+        strict_replay: Answer 404 instead of canned JSON when the cassette has no match
+        seed: Seed for fault injection and latency sampling
+    """
+    app = FastAPI(title="Fake OpenAI")
+    app.state.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency, seed=seed)
+    app.state.requests = 0
+    app.state.stats = {"requests": 0, "errors": 0, "throttled": 0, "replayed": 0, "recorded": 0, "replay_misses": 0, "prompt_chars": 0}
+    faults = random.Random(seed)
+    upstream = None
+    if record_upstream:
+        import httpx
+
+        upstream = httpx.AsyncClient(base_url=record_upstream.rstrip("/"), timeout=120)
+
+    async def answer(body: dict, prompt: str) -> Optional[Union[str, dict]]:
+        if cassette is not None:
+            recorded = cassette.get(body)
+            if recorded is not None:
+                app.state.stats["replayed"] += 1
+                return recorded
+            if upstream is not None:
+                resp = await upstream.post(
+                    "/chat/completions",
+                    json={**body, "stream": False},
+                    headers={"Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY', '')}"},
+                )
+                resp.raise_for_status()
+                content = resp.json()["choices"][0]["message"]["content"]
+                cassette.put(body, content)
+                app.state.stats["recorded"] += 1
+                return content
+            app.state.stats["replay_misses"] += 1
+            if strict_replay:
+                return None
+        return canned_content(prompt, responses)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        app.state.stats["requests"] += 1
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        app.state.stats["prompt_chars"] += len(prompt)
+        await asyncio.sleep(app.state.latency.sample())
+        roll = faults.random()
+        if roll < throttle_rate:
+            app.state.stats["throttled"] += 1
+            return _error(429, "Rate limit reached (injected)", "rate_limit_exceeded", {"Retry-After": f"{retry_after:g}"})
+        if roll < throttle_rate + error_rate:
+            app.state.stats["errors"] += 1
+            return _error(500, "Internal server error (injected)", "server_error")
+        content = await answer(body, prompt)
+        if content is None:
+            return _error(404, "No recorded completion for this request", "cassette_miss")
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            chunks = completion_chunks(body.get("model", "fake"), content, include_usage=include_usage)
+            return StreamingResponse(chunks, media_type="text/event-stream")
+        return completion_body(body.get("model", "fake"), content)
+
+    @app.get("/v1/_stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+    """
+    Starts uvicorn in a daemon thread and returns (server, base_url) once it is accepting connections.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{bound_port}/v1"
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Latency, fault and cassette options, shared with the benchmarks that embed the fake.
+    """
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean seconds to wait before each response")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-spread", type=float, default=0.0,
+                        help="Uniform half-width, normal stddev or lognormal sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of calls answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--responses", help="JSON file of {prompt marker: canned JSON} overrides")
+    parser.add_argument("--record", metavar="CASSETTE", help="Proxy to --upstream and append completions here")
+    parser.add_argument("--upstream", help="Real OpenAI-compatible base URL to record from")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Serve completions recorded in this cassette")
+    parser.add_argument("--strict", action="store_true", help="404 on cassette misses instead of canned JSON")
+    parser.add_argument("--seed", type=int, help="Seed for latency sampling and fault injection")
+
+
+def app_from_args(args: argparse.Namespace) -> FastAPI:
+    if args.record and not args.upstream:
+        raise SystemExit("--record needs --upstream")
+    cassette_path = args.record or args.replay
+    return create_app(
+        LatencyModel(args.latency, args.latency_dist, args.latency_spread, seed=args.seed),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        responses=load_responses(args.responses) if args.responses else None,
+        cassette=Cassette(cassette_path) if cassette_path else None,
+        record_upstream=args.upstream if args.record else None,
+        strict_replay=args.strict,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    uvicorn.run(app_from_args(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
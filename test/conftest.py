@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# The OpenAI clients are created lazily, but the app's lifespan (entered by
+# TestClient) and the agents' first calls still construct them, and the SDK
+# refuses to without a key. Offline tests swap the agents for fakes or pass
+# stub clients, so any non-empty value will do.
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-offline")
+# Keep the task/checkpoint database out of the working tree.
+os.environ.setdefault("STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="it-agent-test-"), "store.db"))
+# FAKE_LLM=1 points the real agents at the offline OpenAI stand-in, so the
+# end-to-end tests in test_agentic_ai.py run without network access. Any other
+# value is a cassette to replay (see benchmarks/fake_llm.py).
+if os.environ.get("FAKE_LLM"):
+    from benchmarks.fake_llm import Cassette, create_app, serve_in_thread
+
+    _cassette = None if os.environ["FAKE_LLM"] == "1" else Cassette(os.environ["FAKE_LLM"])
+    os.environ["OPENAI_BASE_URL"] = serve_in_thread(create_app(0.0, cassette=_cassette))[1]
+
+
+@pytest.fixture
+def fake_agents(monkeypatch):
+    """Replaces every agent in AGENT_REGISTRY with an offline fake for the test."""
+    from app.agents import AGENT_REGISTRY
+    from benchmarks.common import fake_registry
+
+    registry = fake_registry()
+    for name, agent in registry.items():
+        monkeypatch.setitem(AGENT_REGISTRY, name, agent)
+    return registry
+
+
+class RecordingClient:
+    """Stands in for an OpenAI client: returns canned JSON and records each call."""
+
+    def __init__(self, content):
+        self.calls = []
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=json.dumps(self.content))
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture
+def recording_client():
+    return RecordingClient
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    from app.agents.fast_planner import get_fast_planner
+    from app.llm.cache import get_response_cache
+    from app.retrieval import get_retrieval_index
+
+    get_response_cache().clear()
+    get_fast_planner().clear()
+    get_retrieval_index().clear()
+    yield
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, Overloaded
+from app.main import app
+
+
+def _controller(max_running=1, max_wait=0.0):
+    return AdmissionController({"interactive": (max_running, max_wait), "bulk": (max_running, max_wait)}, default_run_seconds=4.0)
+
+
+def test_rejects_with_retry_after_once_the_wait_is_over_budget():
+    controller = _controller(max_running=1, max_wait=5.0)
+
+    async def scenario():
+        async with controller.admit("interactive"):
+            # One run ahead: a wait of one run (4s) is within budget.
+            queued = controller.admit("interactive")
+            with pytest.raises(Overloaded) as rejected:
+                controller.admit("interactive")
+            # Bulk has its own budget.
+            controller.admit("bulk").cancel()
+            queued.cancel()
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after == 3  # two runs ahead (8s) minus the 5s budget
+    stats = controller.stats()["classes"]
+    assert stats["interactive"]["rejected"] == 1 and stats["interactive"]["running"] == 0
+    assert stats["interactive"]["queued"] == 0 and stats["bulk"]["admitted"] == 1
+
+
+def test_wait_estimate_follows_recent_node_latencies():
+    controller = _controller()
+    controller.observe_node("plan_node", 1.0)
+    controller.observe_node("run_agents_node", 2.0)
+    assert controller.run_seconds() == 3.0
+    controller.observe_node("plan_node", 2.0)
+    assert controller.run_seconds() == pytest.approx(3.2)
+
+
+def test_queued_run_gets_the_slot_when_one_frees_up():
+    controller = _controller(max_running=1, max_wait=60.0)
+    order = []
+
+    async def run(name, grant, seconds):
+        async with grant:
+            order.append(f"{name} started")
+            await asyncio.sleep(seconds)
+        order.append(f"{name} done")
+
+    async def scenario():
+        first = asyncio.ensure_future(run("first", controller.admit("interactive"), 0.05))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(run("cancelled", controller.admit("interactive"), 0))
+        second = asyncio.ensure_future(run("second", controller.admit("interactive"), 0))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.gather(first, second, cancelled, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert order == ["first started", "first done", "second started", "second done"]
+    assert controller.stats()["classes"]["interactive"]["running"] == 0
+
+
+def test_execute_returns_429_and_health_reports_overload(fake_agents, monkeypatch):
+    controller = _controller(max_running=1, max_wait=0.0)
+    monkeypatch.setattr("app.api.get_admission_controller", lambda: controller)
+    client = TestClient(app)
+
+    holder = controller.admit("interactive")
+    asyncio.run(holder.__aenter__())
+    try:
+        resp = client.post("/api/v1/execute", json={"request": "VPN is down"})
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "4"
+        health = client.get("/api/v1/health").json()
+        assert health["status"] == "overloaded" and health["admission"]["classes"]["interactive"]["running"] == 1
+    finally:
+        asyncio.run(holder.__aexit__(None, None, None))
+
+    assert client.post("/api/v1/execute", json={"request": "VPN is down"}).json()["status"] == "completed"
+    assert client.get("/api/v1/health").json()["status"] == "ok"
+
+
+def test_identical_tickets_share_one_admitted_run(monkeypatch):
+    import httpx
+
+    from app.agents import AGENT_REGISTRY
+    from benchmarks.common import fake_registry
+
+    for name, agent in fake_registry(delay=0.1).items():
+        monkeypatch.setitem(AGENT_REGISTRY, name, agent)
+    controller = _controller(max_running=1, max_wait=0.0)
+    monkeypatch.setattr("app.api.get_admission_controller", lambda: controller)
+
+    async def burst():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/api/v1/execute", json={"request": "Email is down"}) for _ in range(5)))
+
+    responses = asyncio.run(burst())
+    assert [resp.status_code for resp in responses] == [200] * 5
+    assert all(resp.json()["status"] == "completed" for resp in responses)
+    stats = controller.stats()["classes"]["interactive"]
+    assert stats["admitted"] == 1 and stats["rejected"] == 0 and stats["running"] == 0
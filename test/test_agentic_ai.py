@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-import subprocess
+from app.agents.script_lint import get_script_linter
 
 client = TestClient(app)
 
@@ -94,13 +94,6 @@ def test_script_compiles():
     elif isinstance(script, str):
         code = script
     assert code.strip() != ""
-    # If powershell, test syntax using pwsh
-    if script.get("language", "").lower() == "powershell":
-        check = subprocess.run(["pwsh", "-Command", code], capture_output=True, text=True)
-
-        assert check.returncode == 0 or check.stderr
-    elif script.get("language", "").lower() == "bash":
-        with open("test_script.sh", "w") as f:
-            f.write(code)
-        check = subprocess.run(["bash", "-n", "test_script.sh"], capture_output=True, text=True)
-        assert check.returncode == 0
+    # Syntax-checked in a temp directory by the agent's own linter (pwsh only parses it).
+    lint = get_script_linter().lint(script.get("language"), code)
+    assert lint["passed"] is not False, lint["checks"]
@@ -0,0 +1,101 @@
+import shutil
+
+from app.agents.automation import AutomationAgent
+from app.agents.coordinator import CoordinatorAgent
+from app.agents.fast_planner import FastPlanner
+from app.agents.script_lint import ScriptLinter, check_azure_cli
+
+AGENT_OUTPUTS = {
+    "diagnostic": {"root_cause": "Disk full", "evidence": [], "solutions": []},
+    "automation": {"language": "bash", "code": "df -h", "lint_passed": True},
+    "writer": {"email_draft": "Disk usage was reduced."},
+}
+
+
+def test_local_merge_makes_no_llm_call(recording_client):
+    client = recording_client({})
+    merged = CoordinatorAgent(client).merge_results(AGENT_OUTPUTS, mode="local")
+    assert client.calls == []
+    assert merged == {
+        "status": "completed",
+        "diagnosis": AGENT_OUTPUTS["diagnostic"],
+        "script": AGENT_OUTPUTS["automation"],
+        "email_draft": "Disk usage was reduced.",
+    }
+
+
+def test_narrative_merge_fills_missing_keys(recording_client):
+    client = recording_client({"status": "completed", "email_draft": "Narrative summary."})
+    merged = CoordinatorAgent(client).merge_results(AGENT_OUTPUTS, mode="narrative")
+    assert len(client.calls) == 1
+    assert merged["email_draft"] == "Narrative summary."
+    assert merged["script"] == AGENT_OUTPUTS["automation"]
+
+
+def test_recognizable_request_is_planned_without_llm(recording_client):
+    client = recording_client({})
+    plan = CoordinatorAgent(client, fast_planner=FastPlanner()).plan(
+        "Diagnose high CPU on cpu01, write a PowerShell script to collect perfmon logs and draft an email", True
+    )
+    assert client.calls == []
+    assert plan["agents"] == ["DiagnosticAgent", "AutomationAgent", "WriterAgent"]
+    assert plan["planner"]["source"] == "rules" and plan["planner"]["confidence"] >= 0.8
+    assert plan["status"] == "waiting_approval" and "Pause and await approval" in plan["steps"]
+
+
+def test_broad_keywords_alone_are_not_confident():
+    planner = FastPlanner()
+    assert planner.plan("Users report errors in the email client") is None
+    assert planner.plan("Can you restart it?") is None
+
+
+def test_unsure_plans_fall_back_to_llm_and_are_cached(recording_client):
+    client = recording_client({"agents": ["WriterAgent"], "steps": ["Reply"], "summary": "Answer the user."})
+    planner = FastPlanner()
+    coordinator = CoordinatorAgent(client, fast_planner=planner)
+
+    assert coordinator.plan("Onboard the new hire on host lap-042")["planner"]["source"] == "llm"
+    again = coordinator.plan("Onboard the new hire on host lap-117")
+    assert len(client.calls) == 1
+    assert again["planner"] == {"source": "cache", "confidence": 1.0}
+    assert again["agents"] == ["WriterAgent"]
+    assert planner.stats()["cached_plans"] == 1
+
+
+def test_automation_output_is_linted_locally(recording_client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = recording_client({"language": "bash", "code": "if [ -f /tmp/x ]; then\n  echo hi\n"})
+    script = AutomationAgent(client).run("Write a bash script")
+    assert script["lint_passed"] is False
+    assert script["lint"]["checks"][0]["tool"] == "bash -n" and "syntax error" in script["lint"]["checks"][0]["output"]
+    # Linting happens in its own temp directory, never the working directory.
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lint_results_are_cached_by_script_hash(monkeypatch):
+    linter = ScriptLinter(workers=1, timeout=5)
+    runs = []
+    original = linter._run
+    monkeypatch.setattr(linter, "_run", lambda *args, **kw: runs.append(args) or original(*args, **kw))
+    first = linter.lint("bash", "echo ok")
+    second = linter.lint("sh", "echo ok")
+    assert first["passed"] is True and second["passed"] is True
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert len(runs) == len(first["checks"])
+
+
+def test_azure_cli_static_check():
+    good = "RG=prod\naz network nsg rule create --resource-group $RG \\\n  --nsg-name web-nsg --name rdp --priority 1001 --source-address-prefixes 10.0.0.0/24"
+    assert check_azure_cli(good) == []
+    problems = check_azure_cli("az vm\naz vm list ---output table\naz vm show --name 'unterminated")
+    assert problems == [
+        "line 1: 'az vm' needs a subcommand",
+        "line 2: malformed flag '---output'",
+        "line 3: No closing quotation",
+    ]
+
+
+def test_powershell_without_pwsh_is_unchecked(monkeypatch):
+    monkeypatch.setattr(shutil, "which", lambda name: None)
+    result = ScriptLinter(workers=1).lint("powershell", "Get-Process")
+    assert result["passed"] is None and result["checks"] == []
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from app.llm import request_options
+from app.main import app
+
+
+async def _post_batch(content, content_type):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.post("/api/v1/execute/batch", content=content, headers={"Content-Type": content_type})
+        assert resp.status_code == 200, resp.text
+        return [json.loads(line) for line in resp.text.splitlines()]
+
+
+def test_batch_dedupes_and_reports_every_ticket(fake_agents):
+    tickets = [{"request": "VPN is down"}, {"request": "Disk full on web01"}, {"request": "vpn is down!"}, {"require_approval": True}]
+    lines = asyncio.run(_post_batch(json.dumps(tickets), "application/json"))
+
+    by_index = {line["index"]: line for line in lines}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[0]["status"] == by_index[1]["status"] == "completed"
+    assert by_index[2]["duplicate_of"] == by_index[0]["task_id"]
+    assert by_index[2]["result"]["diagnosis"] and by_index[2]["task_id"] != by_index[0]["task_id"]
+    assert by_index[3]["status"] == "rejected" and by_index[3]["task_id"] is None
+
+    from fastapi.testclient import TestClient
+
+    status = TestClient(app).get(f"/api/v1/tasks/{by_index[2]['task_id']}").json()
+    assert status["status"] == "completed"
+
+
+def test_batch_accepts_ndjson(fake_agents):
+    body = "\n".join(json.dumps({"request": f"Printer {i} jammed"}) for i in range(3)) + "\n\n"
+    lines = asyncio.run(_post_batch(body, "application/x-ndjson"))
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert all(line["status"] == "completed" for line in lines)
+
+
+class PackingClient:
+    """Async client answering packed calls for every ticket but those listed in ``skip``."""
+
+    def __init__(self, skip=()):
+        self.calls = []
+        self.skip = set(skip)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        answer = {"root_cause": "Disk full", "evidence": ["df"], "solutions": []}
+        user = kwargs["messages"][-1]["content"]
+        if "several independent tickets" in kwargs["messages"][0]["content"]:
+            tickets = [t for t in json.loads(user) if t["ticket"] not in self.skip]
+            answer = {"results": {t["id"]: answer for t in tickets}}
+        message = SimpleNamespace(content=json.dumps(answer))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_short_prompts_share_one_call_and_misses_are_asked_alone():
+    from app.agents.diagnostic import DiagnosticAgent
+
+    client = PackingClient(skip={"Request:\nDisk full on web02"})
+    agent = DiagnosticAgent(None, client)
+
+    async def run_all():
+        with request_options(pack_prompts=True):
+            return await asyncio.gather(*(agent.arun(f"Disk full on web0{i}") for i in range(4)))
+
+    results = asyncio.run(run_all())
+    assert all(result["root_cause"] == "Disk full" for result in results)
+    packed, alone = client.calls
+    assert len(json.loads(packed["messages"][1]["content"])) == 4
+    assert alone["messages"][1]["content"] == "Request:\nDisk full on web02"
+
+
+def test_cancelled_caller_does_not_break_its_open_pack(monkeypatch):
+    from app import settings
+    from app.llm.packing import PromptPacker
+
+    monkeypatch.setattr(settings, "PACK_WINDOW_SECONDS", 0.01)
+    messages = [{"role": "system", "content": "Diagnose"}, {"role": "user", "content": "VPN is down"}]
+
+    async def scenario():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        call = asyncio.ensure_future(PromptPacker().complete(object(), agent="diagnostic", messages=messages, response_format={"type": "json_object"}))
+        await asyncio.sleep(0)
+        call.cancel()
+        await asyncio.sleep(0.05)
+        return errors
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+
+from app.main import app
+from app.metrics import metrics
+
+
+class CountingCoordinator:
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+        self.plans = 0
+
+    def plan(self, request, require_approval=False):
+        self.plans += 1
+        return self.coordinator.plan(request, require_approval)
+
+    def merge_results(self, agent_outputs, mode=None):
+        return self.coordinator.merge_results(agent_outputs, mode)
+
+
+async def _submit_together(body, n):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.post("/api/v1/execute", json=body) for _ in range(n)))
+        return [r.json() for r in responses]
+
+
+def test_identical_tickets_share_one_run(fake_agents, monkeypatch):
+    from app.agents import AGENT_REGISTRY
+
+    coordinator = CountingCoordinator(fake_agents["coordinator"])
+    monkeypatch.setitem(AGENT_REGISTRY, "coordinator", coordinator)
+    fake_agents["diagnostic"].delay = 0.2
+
+    results = asyncio.run(_submit_together({"request": "VPN is down!"}, 5))
+
+    assert coordinator.plans == 1
+    assert len({r["task_id"] for r in results}) == 5
+    assert all(r["status"] == "completed" and r["result"]["diagnosis"] for r in results)
+
+
+def test_coalesced_plans_are_approved_independently(fake_agents):
+    fake_agents["diagnostic"].delay = 0.1
+    body = {"request": "Open port 22 on bastion", "require_approval": True}
+
+    async def scenario():
+        first, second = await _submit_together(body, 2)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            approved = await client.post(f"/api/v1/plans/{first['task_id']}/approve")
+            rejected = await client.post(f"/api/v1/plans/{second['task_id']}/reject")
+            return first, second, approved.json(), rejected.json()
+
+    followers = metrics.counter("it_agent_coalesced_total", "", ("role",)).value(role="follower")
+    first, second, approved, rejected = asyncio.run(scenario())
+    assert metrics.counter("it_agent_coalesced_total", "", ("role",)).value(role="follower") == followers + 1
+    assert first["status"] == second["status"] == "waiting_approval"
+    assert approved["status"] == "completed"
+    assert rejected["status"] == "rejected"
@@ -0,0 +1,72 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.agents.writer import WriterAgent
+from app.main import app
+
+client = TestClient(app)
+
+EMAIL = 'Disk on web01 is "full".\nLogs were rotated.'
+
+
+class StreamingAsyncClient:
+    """AsyncOpenAI stand-in that streams a JSON answer a few characters at a time."""
+
+    def __init__(self, content, delay=0.02):
+        self.text = json.dumps(content)
+        self.delay = delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, stream=False, **kwargs):
+        assert stream
+
+        async def chunks():
+            for start in range(0, len(self.text), 5):
+                await asyncio.sleep(self.delay)
+                delta = SimpleNamespace(content=self.text[start:start + 5])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+        return chunks()
+
+
+def _read_events(task_id):
+    events = []
+    with client.stream("GET", f"/api/v1/tasks/{task_id}/stream") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event_type = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event_type = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event_type, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_stream_reports_nodes_agent_outputs_and_tokens(fake_agents, monkeypatch):
+    from app.agents import AGENT_REGISTRY
+
+    monkeypatch.setitem(AGENT_REGISTRY, "writer", WriterAgent(None, StreamingAsyncClient({"email_draft": EMAIL})))
+    fake_agents["coordinator"].delay = 0.2
+    r = client.post(
+        "/api/v1/execute",
+        json={"request": "Disk full on web01", "background": True, "stream_tokens": True, "bypass_cache": True},
+    )
+    events = _read_events(r.json()["task_id"])
+    types = [event_type for event_type, _ in events]
+
+    assert ("node_started", {"node": "plan_node"}) in events
+    assert {data["agent"] for t, data in events if t == "agent_output"} == {"diagnostic", "automation", "writer"}
+    assert "".join(data["text"] for t, data in events if t == "token") == EMAIL
+    writer_output = next(i for i, (t, data) in enumerate(events) if t == "agent_output" and data["agent"] == "writer")
+    assert types.index("token") < writer_output
+    assert events[-1][0] == "status" and events[-1][1]["status"] == "completed"
+
+
+def test_stream_of_finished_task_replays_history(fake_agents):
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01"})
+    events = _read_events(r.json()["task_id"])
+    assert events[-1][1]["status"] == "completed"
+    assert any(t == "agent_output" for t, _ in events)
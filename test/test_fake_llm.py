@@ -0,0 +1,49 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_llm import Cassette, LatencyModel, create_app
+
+BODY = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "You are an expert in IT diagnostics."}]}
+
+
+def test_latency_distributions_keep_their_mean():
+    for distribution in ("fixed", "uniform", "normal", "lognormal", "exponential"):
+        model = LatencyModel(0.1, distribution, spread=0.03, seed=7)
+        samples = [model.sample() for _ in range(5000)]
+        assert min(samples) >= 0
+        assert abs(sum(samples) / len(samples) - 0.1) < 0.01, distribution
+
+
+def test_injected_faults():
+    throttled = TestClient(create_app(0.0, throttle_rate=1.0, retry_after=2))
+    resp = throttled.post("/v1/chat/completions", json=BODY)
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+
+    failing = TestClient(create_app(0.0, error_rate=1.0))
+    assert failing.post("/v1/chat/completions", json=BODY).status_code == 500
+    assert failing.get("/v1/_stats").json()["errors"] == 1
+
+
+def test_cassette_replay(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette.jsonl"))
+    cassette.put(BODY, '{"root_cause": "recorded"}')
+
+    replay = TestClient(create_app(0.0, cassette=Cassette(cassette.path), strict_replay=True))
+    resp = replay.post("/v1/chat/completions", json=BODY)
+    assert resp.json()["choices"][0]["message"]["content"] == '{"root_cause": "recorded"}'
+    other = {**BODY, "messages": [{"role": "user", "content": "something else"}]}
+    assert replay.post("/v1/chat/completions", json=other).status_code == 404
+
+
+def test_packed_prompts_get_one_answer_per_ticket():
+    from app.llm.packing import PACK_INSTRUCTIONS
+
+    messages = [
+        {"role": "system", "content": f"You are an expert in IT diagnostics.\n\n{PACK_INSTRUCTIONS.strip()}"},
+        {"role": "user", "content": '[{"id":"0","ticket":"Request:\\nVPN down"},{"id":"1","ticket":"Request:\\nDisk full"}]'},
+    ]
+    resp = TestClient(create_app(0.0)).post("/v1/chat/completions", json={**BODY, "messages": messages})
+    results = json.loads(resp.json()["choices"][0]["message"]["content"])["results"]
+    assert sorted(results) == ["0", "1"] and results["0"]["root_cause"]
@@ -0,0 +1,205 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.workflows.coordinator_graph import get_coordinator_graph
+
+client = TestClient(app)
+
+
+def test_graph_is_compiled_once(fake_agents):
+    graph = get_coordinator_graph()
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01"})
+    assert r.status_code == 200
+    assert r.json()["status"] == "completed"
+    assert get_coordinator_graph() is graph
+
+
+def test_graph_diagram_endpoint():
+    r = client.get("/api/v1/graph/diagram")
+    assert r.status_code == 200
+    assert "plan_node" in r.text
+    assert client.get("/api/v1/graph/diagram?format=svg").status_code == 400
+
+
+def _agents_state():
+    return {
+        "request": "Disk full on web01",
+        "plan": {"agents": ["DiagnosticAgent", "AutomationAgent", "WriterAgent"]},
+    }
+
+
+def test_run_agents_node_runs_concurrently(fake_agents, monkeypatch):
+    import time
+    from app import settings
+    from app.workflows.coordinator_graph import run_agents_node
+
+    monkeypatch.setattr(settings, "AGENT_EXECUTION_MODE", "concurrent")
+    for name in ("diagnostic", "automation", "writer"):
+        fake_agents[name].delay = 0.3
+    start = time.perf_counter()
+    state = run_agents_node(_agents_state())
+    elapsed = time.perf_counter() - start
+
+    assert state["status"] == "completed"
+    assert set(state["results"]) == {"diagnostic", "automation", "writer"}
+    assert set(state["agent_timings"]) == {"diagnostic", "automation", "writer"}
+    assert elapsed < 0.6
+
+
+def test_run_agents_node_fails_fast(fake_agents, monkeypatch):
+    from app.workflows.coordinator_graph import run_agents_node
+
+    def boom(request):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(fake_agents["automation"], "run", boom)
+    fake_agents["writer"].delay = 0.3
+    state = run_agents_node(_agents_state())
+    assert state["status"] == "failed"
+    assert "AutomationAgent failed: LLM unavailable" in state["error"]
+
+
+def test_async_agents_node_awaits_arun(fake_agents, monkeypatch):
+    import asyncio
+    import time
+    from app.agents import AGENT_REGISTRY
+    from app.workflows.coordinator_graph import arun_agents_node
+
+    class AsyncAgent:
+        async def arun(self, request):
+            await asyncio.sleep(0.3)
+            return {"email_draft": request}
+
+    monkeypatch.setitem(AGENT_REGISTRY, "writer", AsyncAgent())
+    for name in ("diagnostic", "automation"):
+        fake_agents[name].delay = 0.3
+
+    start = time.perf_counter()
+    state = asyncio.run(arun_agents_node(_agents_state()))
+    assert time.perf_counter() - start < 0.6
+    assert state["status"] == "completed"
+    assert state["results"]["writer"] == {"email_draft": "Disk full on web01"}
+
+
+def test_duration_covers_whole_pipeline(fake_agents):
+    for agent in fake_agents.values():
+        agent.delay = 0.1
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01"})
+    result = r.json()["result"]
+    # plan (0.1s) + concurrent agents (0.1s); the local merge adds no LLM call.
+    assert 0.2 <= result["duration_seconds"] < 0.4
+    assert result["email_draft"] == "CPU issue resolved."
+
+
+class FlakyAgent:
+    """Fails with the given errors first, then answers."""
+
+    def __init__(self, errors, output):
+        self.errors = list(errors)
+        self.output = output
+        self.calls = 0
+
+    def run(self, request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return dict(self.output)
+
+
+def test_transient_failure_reruns_only_the_failed_agent(fake_agents, monkeypatch):
+    from app import settings
+    from app.agents import AGENT_REGISTRY
+
+    monkeypatch.setattr(settings, "AGENT_RETRY_BACKOFF_SECONDS", 0.01)
+    flaky = FlakyAgent([TimeoutError("LLM timed out")], {"language": "bash", "code": "df -h", "lint_passed": True})
+    monkeypatch.setitem(AGENT_REGISTRY, "automation", flaky)
+    calls = {"n": 0}
+    original_run = fake_agents["diagnostic"].run
+
+    def counted_run(request):
+        calls["n"] += 1
+        return original_run(request)
+
+    monkeypatch.setattr(fake_agents["diagnostic"], "run", counted_run)
+
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01"})
+    assert r.json()["status"] == "completed"
+    assert r.json()["result"]["script"]["code"] == "df -h"
+    assert flaky.calls == 2 and calls["n"] == 1
+
+
+def test_exhausted_retries_keep_partial_results(fake_agents, monkeypatch):
+    from app import settings
+    from app.agents import AGENT_REGISTRY
+
+    monkeypatch.setattr(settings, "AGENT_RETRY_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "AGENT_RETRY_POLICIES", '{"automation": {"max_attempts": 3}}')
+    flaky = FlakyAgent([TimeoutError("down")] * 3, {})
+    monkeypatch.setitem(AGENT_REGISTRY, "automation", flaky)
+
+    task_id = client.post("/api/v1/execute", json={"request": "Disk full on web01"}).json()["task_id"]
+    task = client.get(f"/api/v1/tasks/{task_id}").json()
+    assert task["status"] == "failed" and "AutomationAgent failed: down" in task["error"]
+    assert flaky.calls == 3
+    from app.runner import TASKS
+
+    assert set(TASKS[task_id]["result"]) == {"diagnostic", "writer"}
+
+
+class SlowAsyncAgent:
+    async def arun(self, request):
+        import asyncio
+
+        await asyncio.sleep(1.0)
+        return {"email_draft": "Too late."}
+
+
+def test_deadline_ends_run_as_timed_out_with_partial_results(fake_agents, monkeypatch):
+    from app.agents import AGENT_REGISTRY
+
+    monkeypatch.setitem(AGENT_REGISTRY, "writer", SlowAsyncAgent())
+    start = time.perf_counter()
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01", "timeout_seconds": 0.3})
+    assert time.perf_counter() - start < 0.9
+    result = r.json()["result"]
+    assert r.json()["status"] == "timed_out" and result["status"] == "timed_out"
+    assert result["diagnosis"]["root_cause"] == "Runaway process" and result["email_draft"] is None
+    task = client.get(f"/api/v1/tasks/{r.json()['task_id']}").json()
+    assert task["status"] == "timed_out" and "writer agent: deadline exceeded" in task["error"]
+
+
+def test_cancelled_run_keeps_partial_results(fake_agents, monkeypatch):
+    import asyncio
+
+    from app.agents import AGENT_REGISTRY
+    from app.runner import TASKS, run_graph
+
+    monkeypatch.setitem(AGENT_REGISTRY, "writer", SlowAsyncAgent())
+    task_id = "cancel-me"
+
+    async def cancel_midway():
+        run = asyncio.ensure_future(run_graph(task_id, {"task_id": task_id, "request": "Disk full on web01"}))
+        await asyncio.sleep(0.3)
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+
+    asyncio.run(cancel_midway())
+    assert TASKS[task_id]["status"] == "cancelled"
+    assert TASKS[task_id]["result"]["diagnosis"]["root_cause"] == "Runaway process"
+
+
+def test_agent_timeout_without_a_deadline_is_reraised():
+    import asyncio
+
+    import pytest
+
+    from app.workflows.coordinator_graph import _atimed_run
+
+    class TimingOutAgent:
+        async def arun(self, request):
+            raise asyncio.TimeoutError("upstream read timed out")
+
+    with pytest.raises(asyncio.TimeoutError, match="upstream read timed out"):
+        asyncio.run(_atimed_run("diagnostic", TimingOutAgent(), "VPN is down"))
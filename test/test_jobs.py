@@ -0,0 +1,53 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.jobs import JobQueue, JobQueueFull
+from app.main import app
+
+client = TestClient(app)
+
+
+def _poll(task_id, until, timeout=5.0):
+    seen = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/v1/tasks/{task_id}").json()["status"]
+        if not seen or seen[-1] != status:
+            seen.append(status)
+        if status in until:
+            return seen
+        time.sleep(0.01)
+    raise AssertionError(f"task stuck, saw {seen}")
+
+
+def test_background_execute_returns_202_and_reports_progress(fake_agents):
+    for name in ("diagnostic", "automation", "writer"):
+        fake_agents[name].delay = 0.3
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01", "background": True})
+    assert r.status_code == 202
+    assert r.json()["status"] == "queued"
+
+    seen = _poll(r.json()["task_id"], until=("completed", "failed"))
+    assert "running_agents" in seen
+    assert seen[-1] == "completed"
+    assert client.get("/api/v1/jobs/stats").json()["completed"] >= 1
+
+
+def test_job_queue_refuses_work_beyond_capacity():
+    import asyncio
+
+    queue = JobQueue(workers=1, max_queued=1)
+    gate = asyncio.Event()
+
+    async def blocked():
+        await gate.wait()
+
+    queue.submit(blocked)  # picked up by the only worker
+    time.sleep(0.05)
+    queue.submit(blocked)  # waits in the queue
+    with pytest.raises(JobQueueFull):
+        queue.submit(blocked)
+    assert queue.stats()["rejected"] == 1
+    queue.stop()
@@ -0,0 +1,163 @@
+import time
+
+from app.llm import complete, request_options
+from app.llm.cache import ResponseCache, get_response_cache
+
+MESSAGES = [{"role": "user", "content": "Reset password for alice"}]
+
+
+def test_repeat_prompt_is_served_from_cache(recording_client):
+    client = recording_client({"email_draft": "done"})
+    first = complete(client, model="gpt-4o-mini", messages=MESSAGES, response_format={"type": "json_object"})
+    second = complete(client, model="gpt-4o-mini", messages=MESSAGES, response_format={"type": "json_object"})
+    assert first == second
+    assert len(client.calls) == 1
+    stats = get_response_cache().stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_bypass_cache_option(recording_client):
+    client = recording_client({"email_draft": "done"})
+    complete(client, model="gpt-4o-mini", messages=MESSAGES)
+    with request_options(bypass_cache=True):
+        complete(client, model="gpt-4o-mini", messages=MESSAGES)
+    assert len(client.calls) == 2
+    assert get_response_cache().stats()["bypasses"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+    time.sleep(0.25)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    ResponseCache(path=path).set("key", "value")
+    restarted = ResponseCache(path=path)
+    assert restarted.get("key") == "value"
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_rate_limited_call_is_retried_after_retry_after(recording_client, monkeypatch):
+    import httpx
+    import openai
+
+    from app import settings
+
+    monkeypatch.setattr(settings, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    client = recording_client({"email_draft": "done"})
+    create = client.chat.completions.create
+    throttled = httpx.Response(429, headers={"retry-after": "0.1"}, request=httpx.Request("POST", "http://llm"))
+
+    def flaky_create(**kwargs):
+        if not client.calls:
+            client.calls.append(kwargs)
+            raise openai.RateLimitError("slow down", response=throttled, body=None)
+        return create(**kwargs)
+
+    client.chat.completions.create = flaky_create
+    start = time.monotonic()
+    assert complete(client, model="gpt-4o-mini", messages=MESSAGES) == '{"email_draft": "done"}'
+    assert len(client.calls) == 2
+    assert time.monotonic() - start >= 0.1
+
+
+def test_rate_limiter_paces_calls_and_serves_interactive_first():
+    import threading
+
+    from app.llm.ratelimit import RateLimiter
+
+    # 10 requests/s with room for a single request at a time.
+    limiter = RateLimiter(rpm=600, burst_seconds=0.1)
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire(tokens=10)
+    assert time.monotonic() - start >= 0.25
+
+    order = []
+    bulk = threading.Thread(target=lambda: (limiter.acquire(10, "bulk"), order.append("bulk")))
+    bulk.start()
+    time.sleep(0.02)
+    limiter.acquire(10, "interactive")
+    order.append("interactive")
+    bulk.join()
+    assert order == ["interactive", "bulk"]
+
+
+def test_deadline_bounds_llm_calls(recording_client):
+    import pytest
+
+    from app.deadlines import DeadlineExceeded
+
+    client = recording_client({"email_draft": "done"})
+    with request_options(deadline=time.time() + 5, bypass_cache=True):
+        complete(client, model="gpt-4o-mini", messages=MESSAGES)
+    assert 4 < client.calls[0]["timeout"] <= 5
+    with request_options(deadline=time.time() - 1, bypass_cache=True):
+        with pytest.raises(DeadlineExceeded):
+            complete(client, model="gpt-4o-mini", messages=MESSAGES)
+    assert len(client.calls) == 1
+
+
+def test_cascade_escalates_only_on_wrong_shape(recording_client, monkeypatch):
+    from app import settings
+    from app.agents.diagnostic import DiagnosticAgent
+    from app.llm.tiers import tier_stats
+
+    monkeypatch.setattr(settings, "LLM_MODEL_TIERS", '{"fast": "small-model", "strong": "big-model"}')
+    good = {"root_cause": "Disk full", "evidence": ["df"], "solutions": []}
+    client = recording_client(good)
+    assert DiagnosticAgent(client).run("Disk full on web01") == good
+    assert [call["model"] for call in client.calls] == ["small-model"]
+
+    client = recording_client({"root_cause": "", "evidence": "df"})
+    DiagnosticAgent(client).run("Disk full on web02")
+    assert [call["model"] for call in client.calls] == ["small-model", "big-model"]
+    fast = tier_stats()["diagnostic"]["fast"]
+    assert fast["model"] == "small-model" and fast["escalated"] >= 1 and fast["escalation_rate"] > 0
+
+
+def test_cascade_is_configurable_per_agent(recording_client, monkeypatch):
+    from app import settings
+    from app.agents.writer import WriterAgent
+
+    monkeypatch.setattr(settings, "AGENT_MODEL_CASCADE", '{"writer": ["strong"]}')
+    client = recording_client({"email_draft": "Done."})
+    WriterAgent(client).run("Tell the team the disk is fixed")
+    assert [call["model"] for call in client.calls] == ["gpt-4o"]
+
+
+def test_long_logs_keep_head_and_tail_within_budget():
+    from app.llm.prompts import count_tokens, fit_text
+
+    log = "\n".join(["boot ok"] + [f"12:00:{i:02d} retry {i} failed" for i in range(400)] + [f"line {c}" * 20 for c in "abcdefghij"] + ["FATAL: disk full"])
+    fitted = fit_text(log, 80)
+    assert fitted.startswith("boot ok") and fitted.endswith("FATAL: disk full")
+    assert "similar lines" in fitted and "omitted" in fitted
+    assert count_tokens(fitted) <= 100
+    assert fit_text("short", 80) == "short"
+
+
+def test_prompt_prefix_is_stable_and_savings_are_reported(recording_client):
+    from app.agents.diagnostic import DiagnosticAgent
+    from app.metrics import metrics
+
+    client = recording_client({"root_cause": "Disk full", "evidence": ["df"], "solutions": []})
+    with request_options(task_id="prompt-task"):
+        DiagnosticAgent(client).run("Disk full on web01\n" + "\n".join(f"write failed errno {i}" for i in range(2000)))
+    DiagnosticAgent(client).run("VPN drops every hour")
+    first, second = (call["messages"] for call in client.calls)
+    assert first[0] == second[0] and first[0]["role"] == "system"
+    assert "VPN drops every hour" in second[1]["content"]
+    prompt = metrics.pop_task("prompt-task")["prompt"]["diagnostic"]
+    assert prompt["tokens_saved"] > prompt["tokens_sent"] > 0
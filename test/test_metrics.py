@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from app.llm import complete, request_options
+from app.main import app
+from app.metrics import metrics
+
+client = TestClient(app)
+
+
+def test_task_status_includes_node_and_agent_breakdown(fake_agents):
+    task_id = client.post("/api/v1/execute", json={"request": "Disk full on web01"}).json()["task_id"]
+    breakdown = client.get(f"/api/v1/tasks/{task_id}").json()["metrics"]
+
+    assert set(breakdown["nodes"]) == {"plan_node", "run_agents_node", "merge_results_node"}
+    assert set(breakdown["agents"]) == {"diagnostic", "automation", "writer"}
+    assert breakdown["agents"]["writer"]["runs"] == 1
+
+
+def test_llm_calls_report_tokens_and_cache_hits(recording_client):
+    llm = recording_client({"root_cause": "disk"})
+    messages = [{"role": "user", "content": "metrics test prompt"}]
+    with request_options(task_id="t-metrics", agent="diagnostic"):
+        complete(llm, model="gpt-4o-mini", messages=messages)
+        complete(llm, model="gpt-4o-mini", messages=messages)
+
+    usage = metrics.pop_task("t-metrics")["llm"]["diagnostic"]
+    assert usage["calls"] == 2 and usage["cache_hits"] == 1
+    assert usage["prompt_tokens"] == 120 and usage["completion_tokens"] == 30 and usage["cached_tokens"] == 64
+
+    text = client.get("/api/v1/metrics").text
+    assert 'it_agent_llm_calls_total{agent="diagnostic",model="gpt-4o-mini",cache="hit"}' in text
+    assert "# TYPE it_agent_node_seconds histogram" in text
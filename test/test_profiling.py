@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.profiling import collapsed, profiler, speedscope
+
+
+def _slow_agents(monkeypatch):
+    from app.agents import AGENT_REGISTRY
+    from benchmarks.common import fake_registry
+
+    for name, agent in fake_registry(delay=0.05).items():
+        monkeypatch.setitem(AGENT_REGISTRY, name, agent)
+
+
+def test_samples_running_threads_and_suspended_tasks(monkeypatch):
+    monkeypatch.setattr("app.settings.PROFILE_INTERVAL_SECONDS", 0.002)
+
+    def blocking_call():
+        time.sleep(0.05)
+
+    async def waiting_child():
+        await asyncio.sleep(0.05)
+
+    async def run():
+        profile = profiler.start("t1")
+        try:
+            await asyncio.gather(asyncio.to_thread(blocking_call), waiting_child())
+        finally:
+            result = profiler.stop(profile)
+        return result, asyncio.get_running_loop().get_task_factory()
+
+    profile, factory_after = asyncio.run(run())
+    stacks = list(profile["samples"])
+    # The executor thread, while in time.sleep inside blocking_call.
+    assert any(stack.rsplit(";", 1)[-1].startswith("test_samples_running_threads_and_suspended_tasks.<locals>.blocking_call") for stack in stacks)
+    assert any("waiting_child" in stack and "<await" in stack for stack in stacks)
+    assert factory_after is None
+
+
+def test_sampler_survives_a_failing_sweep(monkeypatch):
+    from app import profiling
+
+    monkeypatch.setattr("app.settings.PROFILE_INTERVAL_SECONDS", 0.002)
+    await_stack, calls = profiling._await_stack, []
+
+    def flaky_await_stack(task):
+        calls.append(task)
+        if len(calls) == 1:
+            raise RuntimeError("task changed under the sampler")
+        return await_stack(task)
+
+    monkeypatch.setattr(profiling, "_await_stack", flaky_await_stack)
+
+    async def run():
+        profile = profiler.start("t1")
+        await asyncio.sleep(0.05)
+        return profiler.stop(profile)
+
+    assert any("<await" in stack for stack in asyncio.run(run())["samples"])
+    deadline = time.monotonic() + 1
+    while profiler._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert profiler._thread is None
+
+
+def test_profile_header_stores_downloadable_profile(monkeypatch):
+    _slow_agents(monkeypatch)
+    client = TestClient(app)
+
+    task_id = client.post("/api/v1/execute", json={"request": "Disk full on web01"}, headers={"X-Profile": "1"}).json()["task_id"]
+    assert client.get(f"/api/v1/tasks/{task_id}").json()["profiled"] is True
+
+    text = client.get(f"/api/v1/tasks/{task_id}/profile", params={"format": "collapsed"}).text
+    assert "run_agents_node" in text and all(line.rsplit(" ", 1)[1].isdigit() for line in text.splitlines())
+
+    document = client.get(f"/api/v1/tasks/{task_id}/profile").json()
+    sampled = document["profiles"][0]
+    assert len(sampled["samples"]) == len(sampled["weights"])
+    assert max(max(stack) for stack in sampled["samples"]) < len(document["shared"]["frames"])
+
+
+def test_unprofiled_runs_store_nothing_until_asked_for(fake_agents):
+    client = TestClient(app)
+
+    task_id = client.post("/api/v1/execute", json={"request": "Printer jammed"}).json()["task_id"]
+    assert client.get(f"/api/v1/tasks/{task_id}").json()["profiled"] is False
+    assert client.get(f"/api/v1/tasks/{task_id}/profile").status_code == 404
+
+    try:
+        assert client.put("/api/v1/admin/profiling", json={"next_runs": 1}).json()["next_runs"] == 1
+        first = client.post("/api/v1/execute", json={"request": "Printer 2 jammed"}).json()["task_id"]
+        second = client.post("/api/v1/execute", json={"request": "Printer 3 jammed"}).json()["task_id"]
+    finally:
+        profiler.configure(next_runs=0)
+    assert client.get(f"/api/v1/tasks/{first}/profile").status_code == 200
+    assert client.get(f"/api/v1/tasks/{second}/profile").status_code == 404
+
+
+def test_exports_agree_on_sample_counts():
+    profile = {"interval_seconds": 0.01, "seconds": 0.05, "sample_count": 5, "samples": {"a;b": 3, "a;c": 2}}
+    assert collapsed(profile) == "a;b 3\na;c 2\n"
+    document = speedscope(profile, "t")
+    assert [frame["name"] for frame in document["shared"]["frames"]] == ["a", "b", "c"]
+    assert document["profiles"][0]["samples"] == [[0, 1], [0, 2]]
+    assert document["profiles"][0]["endValue"] == 0.05
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+from app import retrieval
+from app.llm import request_options
+from app.retrieval import RetrievalIndex, get_retrieval_index
+
+DIAGNOSIS = {"root_cause": "Log rotation stopped", "evidence": ["/var/log at 100%"], "solutions": [{"title": "Rotate logs", "confidence": "high"}]}
+
+
+def test_index_grows_and_reopens_without_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "INITIAL_CAPACITY", 4)
+    index = RetrievalIndex(str(tmp_path))
+    for i in range(10):
+        index.add(f"t{i}", f"Service number {i} keeps crashing on host app{i}", {"diagnosis": {"root_cause": f"cause {i}"}})
+    index.add("disk", "Disk full on web01, /var/log at 100%", {"diagnosis": DIAGNOSIS})
+
+    reopened = RetrievalIndex(str(tmp_path))
+    assert len(reopened) == 11
+    score, payload = reopened.search("disk full on web01 /var/log at 100%", k=1)[0]
+    assert payload["task_id"] == "disk" and payload["diagnosis"] == DIAGNOSIS and score > 0.95
+    assert reopened.search("service number 7 keeps crashing on host app7", k=2)[0][1]["task_id"] == "t7"
+
+
+def test_oldest_tickets_are_evicted_at_the_row_cap(tmp_path):
+    for path in ("", str(tmp_path)):
+        index = RetrievalIndex(path, max_rows=3)
+        for i in range(5):
+            index.add(f"t{i}", f"Service number {i} keeps crashing on host app{i}", {"diagnosis": {"root_cause": f"cause {i}"}})
+        if path:
+            index = RetrievalIndex(path, max_rows=3)
+        assert len(index) == 3 and len(index._vectors) == 3
+        found = {payload["task_id"] for _, payload in index.search("service keeps crashing on host", k=5)}
+        assert found == {"t2", "t3", "t4"}
+        # Document frequencies only count the tickets still indexed.
+        assert index._df.max() == 3
+
+
+def test_diagnostic_agent_reuses_or_grounds_on_past_resolutions(recording_client):
+    from app.agents.diagnostic import DiagnosticAgent
+
+    get_retrieval_index().add("past", "Disk full on web01, /var/log at 100%", {"diagnosis": DIAGNOSIS})
+    client = recording_client({"root_cause": "Disk full", "evidence": ["df"], "solutions": []})
+    agent = DiagnosticAgent(client)
+
+    reused = agent.run("Disk full on web01, /var/log at 100%")
+    assert reused["retrieved_from"] == "past" and reused["root_cause"] == DIAGNOSIS["root_cause"]
+    assert client.calls == []
+
+    agent.run("Disk full on db03, /var/lib at 95%")
+    assert "Log rotation stopped" in client.calls[-1]["messages"][1]["content"]
+
+    with request_options(bypass_cache=True):
+        agent.run("Disk full on web01, /var/log at 100%")
+    assert len(client.calls) == 2
+
+
+def test_completed_tasks_are_indexed(fake_agents):
+    from app.main import app
+
+    resp = TestClient(app).post("/api/v1/execute", json={"request": "VPN drops every hour"})
+    assert resp.json()["status"] == "completed"
+    _, payload = get_retrieval_index().search("VPN drops every hour", k=1)[0]
+    assert payload["task_id"] == resp.json()["task_id"] and payload["diagnosis"]["root_cause"]
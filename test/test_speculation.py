@@ -0,0 +1,119 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.speculation import speculator
+
+client = TestClient(app)
+
+
+def _count_runs(fake_agents, monkeypatch):
+    runs = []
+    for name in ("diagnostic", "automation", "writer"):
+        agent = fake_agents[name]
+        original = agent.run
+
+        def run(request, name=name, original=original):
+            runs.append(name)
+            return original(request)
+
+        monkeypatch.setattr(agent, "run", run)
+    return runs
+
+
+def test_approval_reuses_speculative_outputs(fake_agents, monkeypatch):
+    runs = _count_runs(fake_agents, monkeypatch)
+    fake_agents["diagnostic"].delay = 0.2
+    body = {"request": "Open port 22 on bastion", "require_approval": True, "speculative": True}
+    task_id = client.post("/api/v1/execute", json=body).json()["task_id"]
+
+    deadline = time.monotonic() + 5
+    while speculator.pending() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sorted(runs) == ["automation", "diagnostic", "writer"]
+
+    start = time.perf_counter()
+    assert client.post(f"/api/v1/plans/{task_id}/approve").json()["status"] == "completed"
+    assert time.perf_counter() - start < 0.2
+    assert len(runs) == 3
+    assert client.get(f"/api/v1/tasks/{task_id}").json()["diagnosis"]
+
+
+def test_speculation_respects_cap(fake_agents, monkeypatch):
+    from app import settings
+
+    runs = _count_runs(fake_agents, monkeypatch)
+    monkeypatch.setattr(settings, "SPECULATIVE_MAX_PENDING", 0)
+    body = {"request": "Restart the print spooler", "require_approval": True, "speculative": True}
+    task_id = client.post("/api/v1/execute", json=body).json()["task_id"]
+    assert speculator.pending() == 0 and runs == []
+    assert client.post(f"/api/v1/plans/{task_id}/reject").json()["status"] == "rejected"
+
+
+def test_cancelled_speculation_job_releases_waiters():
+    import asyncio
+
+    from app.speculation import _Speculation
+
+    async def scenario():
+        speculator._pending["cancelled-job"] = _Speculation()
+        job = asyncio.ensure_future(speculator._job("cancelled-job", {}))
+        waiter = asyncio.ensure_future(speculator.wait("cancelled-job"))
+        await asyncio.sleep(0)
+        job.cancel()
+        await asyncio.gather(job, return_exceptions=True)
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) is False
+    assert "cancelled-job" not in speculator._pending
+
+
+def test_rejection_waits_for_an_in_progress_speculative_write(fake_agents, monkeypatch):
+    import asyncio
+    import threading
+
+    from app import speculation
+    from app.runner import PLANS
+    from app.workflows.coordinator_graph import get_coordinator_graph
+
+    task_id = client.post("/api/v1/execute", json={"request": "Reset MFA for bob", "require_approval": True}).json()["task_id"]
+    graph = get_coordinator_graph()
+    rejected = {}
+
+    async def speculate(state):
+        return {"diagnostic": {"root_cause": "stale token"}}, {"diagnostic": 0.1}
+
+    class Graph:
+        async def aupdate_state(self, *args, **kwargs):
+            # A rejection arrives between the outputs and the checkpoint write.
+            rejecting = threading.Thread(target=lambda: rejected.update(client.post(f"/api/v1/plans/{task_id}/reject").json()))
+            rejecting.start()
+            await asyncio.sleep(0.2)
+            rejected["waited"] = rejecting.is_alive()
+            await graph.aupdate_state(*args, **kwargs)
+            rejected["thread"] = rejecting
+
+    monkeypatch.setattr(speculation, "speculate_agents", speculate)
+    monkeypatch.setattr(speculation, "get_coordinator_graph", lambda: Graph())
+    assert asyncio.run(speculator._run(task_id, PLANS[task_id])) is True
+    rejected.pop("thread").join(5)
+
+    assert rejected == {"waited": True, "status": "rejected", "error": None}
+    # The rejection released the checkpoint after the write, not before it.
+    assert not graph.get_state({"configurable": {"thread_id": task_id}}).values
+
+
+def test_approval_waits_for_a_speculative_write(fake_agents):
+    import threading
+
+    from app.runner import PLANS
+
+    task_id = client.post("/api/v1/execute", json={"request": "Unlock account for ann", "require_approval": True}).json()["task_id"]
+    waiting = PLANS[task_id]
+    PLANS[task_id] = {**waiting, "status": "speculating", "claimed_until": time.time() + 30}
+    threading.Timer(0.2, lambda: PLANS.__setitem__(task_id, {**waiting, "status": "waiting_approval"})).start()
+
+    start = time.perf_counter()
+    assert client.post(f"/api/v1/plans/{task_id}/approve").json()["status"] == "completed"
+    assert time.perf_counter() - start >= 0.2
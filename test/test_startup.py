@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+CHECK = """
+import sys
+import app.main
+from app.llm.client import _async_clients, get_client
+dev_only = sorted(m for m in sys.modules if m.split(".")[0] in ("IPython", "matplotlib", "PIL"))
+assert not dev_only, dev_only
+assert get_client.cache_info().currsize == 0 and not _async_clients, "OpenAI client built at import"
+"""
+
+
+def test_import_skips_dev_only_modules_and_builds_no_client():
+    # A fresh interpreter, since this test session has imported everything already.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-c", CHECK], capture_output=True, text=True, cwd=root)
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_agents_share_one_lazily_built_client():
+    from app.agents import AGENT_REGISTRY
+    from app.llm import get_client
+
+    assert all(getattr(agent, "llm_client", getattr(agent, "client", None)) is None for agent in AGENT_REGISTRY.values())
+    assert get_client() is get_client()
@@ -0,0 +1,91 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app import settings
+from app.main import app
+from app.storage import _build_task_store
+from app.storage.tables import SQLiteTable, open_database
+from app.workflows.coordinator_graph import build_coordinator_graph
+
+client = TestClient(app)
+
+
+def test_pending_approval_survives_restart(fake_agents, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORE_PATH", str(tmp_path / "store.db"))
+    store = _build_task_store()
+    config = {"configurable": {"thread_id": "t-restart"}}
+    state = build_coordinator_graph(store.checkpointer).invoke(
+        {"task_id": "t-restart", "request": "Open port 22 on bastion", "require_approval": True}, config
+    )
+    assert state["status"] == "waiting_approval"
+    store.plans["t-restart"] = state
+
+    restarted = _build_task_store()
+    assert restarted.plans["t-restart"]["plan"]["agents"]
+    resumed = build_coordinator_graph(restarted.checkpointer).invoke(None, config)
+    assert resumed["status"] == "completed"
+
+
+def test_expired_records_and_checkpoints_are_swept(fake_agents, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORE_PATH", str(tmp_path / "store.db"))
+    monkeypatch.setattr(settings, "PLAN_RETENTION_SECONDS", 0.1)
+    store = _build_task_store()
+    config = {"configurable": {"thread_id": "t-expire"}}
+    state = build_coordinator_graph(store.checkpointer).invoke(
+        {"task_id": "t-expire", "request": "Open port 22", "require_approval": True}, config
+    )
+    store.plans["t-expire"] = state
+    store.tasks["t-expire"] = {"status": "waiting_approval"}
+    time.sleep(0.15)
+
+    assert "t-expire" not in store.plans
+    assert store.sweep() == ["t-expire"]
+    assert store.checkpointer.get_tuple(config) is None
+
+
+def test_front_cache_is_bounded(tmp_path):
+    import threading
+
+    table = SQLiteTable(open_database(str(tmp_path / "t.db")), threading.RLock(), "tasks", lambda r: 60, cache_size=2)
+    for i in range(10):
+        table[f"t{i}"] = {"status": "completed", "n": i}
+    assert len(table._cache) == 2
+    assert table["t0"] == {"status": "completed", "n": 0}
+    assert len(table) == 10
+
+
+def test_finished_task_releases_its_checkpoint(fake_agents):
+    from app.storage import get_task_store
+
+    r = client.post("/api/v1/execute", json={"request": "Disk full on web01"})
+    task_id = r.json()["task_id"]
+    assert client.get(f"/api/v1/tasks/{task_id}").json()["status"] == "completed"
+    assert get_task_store().checkpointer.get_tuple({"configurable": {"thread_id": task_id}}) is None
+
+
+def test_compare_and_set_across_connections(tmp_path):
+    import threading
+
+    path = str(tmp_path / "shared.db")
+    worker_a = SQLiteTable(open_database(path), threading.RLock(), "plans", lambda r: 60, cache_size=0)
+    worker_b = SQLiteTable(open_database(path), threading.RLock(), "plans", lambda r: 60, cache_size=0)
+    worker_a["p1"] = {"status": "waiting_approval"}
+
+    _, version_a = worker_a.get_versioned("p1")
+    _, version_b = worker_b.get_versioned("p1")
+    assert worker_a.replace_if("p1", {"status": "approving"}, version_a)
+    assert not worker_b.replace_if("p1", {"status": "approving"}, version_b)
+    assert worker_b["p1"] == {"status": "approving"}
+
+
+def test_plan_cannot_be_approved_twice(fake_agents):
+    from app.runner import PLANS
+
+    task_id = client.post("/api/v1/execute", json={"request": "Open port 22", "require_approval": True}).json()["task_id"]
+    # Another worker claims the plan first.
+    plan, version = PLANS.get_versioned(task_id)
+    assert PLANS.replace_if(task_id, {**plan, "status": "approving"}, version)
+
+    assert client.post(f"/api/v1/plans/{task_id}/approve").status_code == 409
+    assert client.post(f"/api/v1/plans/{task_id}/reject").status_code == 409